@@ -1,43 +1,40 @@
 import asyncio
-import atexit
 import signal
-import sys
+
+import discord
 
 from data.configs import botConfig
-from data.discord_command import discordClient, status_channel
-from data.entities.constants import Constants
-
-# シャットダウン時の処理
-def send_shutdown_notification():
-    """ボットのシャットダウン時に通知を送信"""
-    if status_channel:
-        # 非同期関数を同期的に実行するための処理
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # ループが実行中の場合はタスクとして登録
-            loop.create_task(status_channel.send(Constants.bot_stopping_message))
-            # 少し待ってメッセージが送信されるのを待つ
-            loop.run_until_complete(asyncio.sleep(1))
-        else:
-            # ループが実行されていない場合は新しく作成して実行
-            asyncio.run(status_channel.send(Constants.bot_stopping_message))
-
-# シグナルハンドラの設定
-def signal_handler(sig, frame):
-    """シグナル受信時のハンドラ"""
-    print(f"Signal {sig} received, shutting down...")
-    send_shutdown_notification()
-    # クライアントをクローズ
-    if not discordClient.is_closed():
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(discordClient.close())
-    sys.exit(0)
-
-# 終了時とシグナル受信時のハンドラを登録
-atexit.register(send_shutdown_notification)
-signal.signal(signal.SIGINT, signal_handler)  # Ctrl+C
-signal.signal(signal.SIGTERM, signal_handler)  # termination
+from data.discord_command import discordClient, reload_configuration, shutdownCoordinator
+from data.outbox import outbox
+
+
+async def run():
+    """
+    Bot を起動し、SIGINT / SIGTERM を受けたら実行中のコマンドを待ってから停止する
+
+    SIGHUP を受けたら再起動せずに設定を再読み込みする
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, shutdownCoordinator.request_shutdown, sig.name)
+    loop.add_signal_handler(signal.SIGHUP, reload_configuration, "SIGHUP")
+    # 前回の起動で送信できなかった Issue やステータス通知は on_ready で送信を再開する
+    outbox.open(botConfig.outbox_path)
+
+    async with discordClient:
+        try:
+            await discordClient.start(botConfig.discord_token)
+        finally:
+            # 接続エラーなどでクライアントが先に停止した場合も後始末を行う (停止処理は 1 度だけ実行される)
+            await shutdownCoordinator.shutdown("client stopped")
+
+
+def main():
+    # Client.run() と同じログ設定
+    discord.utils.setup_logging()
+    asyncio.run(run())
+
 
 # メインエントリーポイント
 if __name__ == "__main__":
-    discordClient.run(token=botConfig.discord_token)
+    main()
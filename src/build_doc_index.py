@@ -0,0 +1,46 @@
+import argparse
+import time
+
+from data.doc_index import DocIndex, build_index
+
+# ドキュメントの検索インデックスの作成
+#
+# VRChat / UdonSharp の Markdown とコード (.cs / .shader / .hlsl など) のディレクトリから BM25 のインデックスを作成する。
+# 作成したファイルを TEL_GPT_DOC_INDEX_PATH (デフォルト: var/udon_docs.idx) に置くと、
+# /ai-question-dev-vrc 系のコマンドの質問に関連するドキュメントが添えられる。Bot の起動中に作り直した場合は再起動で反映される。
+# 例: python build_doc_index.py docs/udon var/udon_docs.idx --query "SendCustomNetworkEvent"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build a BM25 index from a directory of Markdown docs and code.")
+    parser.add_argument("source", help="directory of Markdown docs and code snippets")
+    parser.add_argument("output", help="index file to write")
+    parser.add_argument("--k1", type=float, default=1.2, help="BM25 term frequency saturation")
+    parser.add_argument("--b", type=float, default=0.75, help="BM25 length normalization")
+    parser.add_argument("--query", action="append", default=[], help="query to try after building (repeatable)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    count = build_index(args.source, args.output, k1=args.k1, b=args.b)
+    print(f"Indexed {count} passages into {args.output} in {time.perf_counter() - start:.2f}s")
+
+    if not args.query:
+        return
+    doc_index = DocIndex(args.output)
+    try:
+        for query in args.query:
+            start = time.perf_counter()
+            results = doc_index.search(query)
+            print(f"\n{query} ({(time.perf_counter() - start) * 1000:.2f}ms)")
+            for result in results:
+                print(f"  {result.score:7.3f}  {result.passage.source} - {result.passage.title}")
+    finally:
+        doc_index.close()
+
+
+# メインエントリーポイント
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import discord
+from discord import app_commands
+
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+def command_tree_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """
+    コマンドツリーのスキーマ (Discord に送信される内容) のハッシュを計算する
+    """
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command["type"], command["name"])
+    )
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _load_state(path: str) -> dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read command sync state: {e}")
+        return {}
+
+
+def _save_state(path: str, state: dict[str, str]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # 書き込み途中のファイルを読まないように一時ファイルから置き換える
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temporary_path, path)
+
+
+async def sync_commands(
+    tree: app_commands.CommandTree,
+    state_path: str,
+    dev_guild_id: Optional[int] = None,
+    force: bool = False
+) -> bool:
+    """
+    コマンドツリーのスキーマが前回の同期から変わっている場合のみ Discord に同期する
+
+    dev_guild_id を指定した場合は、グローバルコマンドをそのギルドにコピーしてギルドに同期する
+    (ギルドコマンドはすぐに反映されるため開発時に使う)
+
+    Args:
+        tree: コマンドツリー
+        state_path: 同期したスキーマのハッシュを保存するファイル
+        dev_guild_id: 開発用ギルドのID
+        force: ハッシュが同じでも同期するか
+
+    Returns:
+        bool: 同期した場合は True
+    """
+    guild = None
+    scope = f"{tree.client.application_id}:global"
+    if dev_guild_id is not None:
+        guild = discord.Object(id=dev_guild_id)
+        tree.copy_global_to(guild=guild)
+        scope = f"{tree.client.application_id}:guild:{dev_guild_id}"
+
+    digest = command_tree_hash(tree, guild)
+    state = _load_state(state_path)
+    if not force and state.get(scope) == digest:
+        metrics.increment("commands.sync_skipped")
+        logger.info(f"Command tree unchanged ({scope}), skipped sync")
+        return False
+
+    start = time.perf_counter()
+    synced = await tree.sync(guild=guild)
+    elapsed = time.perf_counter() - start
+    metrics.increment("commands.sync")
+    metrics.observe("commands.sync", elapsed)
+    logger.info(f"Synced {len(synced)} commands ({scope}) in {elapsed:.2f}s")
+
+    state[scope] = digest
+    _save_state(state_path, state)
+    return True
@@ -1,6 +1,7 @@
 import requests
 
 from .configs import botConfig
+from .deadline import provider_timeout
 
 
 def download_image(url: str, save_file_path: str):
@@ -11,26 +12,26 @@ def download_image(url: str, save_file_path: str):
 
 # 英語をDeepLで日本語に翻訳
 def translate_text(text: str) -> str:
-    url = "https://api-free.deepl.com/v2/translate"
+    url = f"{botConfig.deepl_base_url}/v2/translate"
     params = {
         "auth_key": botConfig.deepl_api_key,
         "text": text,
         "source_lang": "EN",
         "target_lang": "JA",
     }
-    response = requests.post(url, data=params)
+    response = requests.post(url, data=params, timeout=provider_timeout())
     result = response.json()
     return result['translations'][0]['text']
 
 # 日本語をDeepLで英語に翻訳
 def translate_text_en(text: str) -> str:
-    url = "https://api-free.deepl.com/v2/translate"
+    url = f"{botConfig.deepl_base_url}/v2/translate"
     params = {
         "auth_key": botConfig.deepl_api_key,
         "text": text,
         "source_lang": "JA",
         "target_lang": "EN",
     }
-    response = requests.post(url, data=params)
+    response = requests.post(url, data=params, timeout=provider_timeout())
     result = response.json()
     return result['translations'][0]['text']
@@ -0,0 +1,97 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Mapping, Optional
+
+from .configs import BotConfig, botConfig, load_environ
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# 再起動せずに差し替えられる設定 (リクエストごとに読み込まれるか、config_listeners で反映される)
+# トークン・接続先・保存先・シャーディングなどは接続やファイルを開き直す必要があるため再起動が必要
+RELOADABLE_FIELDS = frozenset({
+    "openai_chat_model",
+    "openai_image_model",
+    "gemini_chat_model",
+    "gemini_image_model",
+    "claude_model",
+    "stable_diffusion_model",
+    "disabled_providers",
+    "max_split_messages",
+    "conversation_history_limit",
+    "conversation_compaction_tokens",
+    "image_providers",
+    "image_provider_timeout",
+    "image_provider_cooldown",
+    "image_lineage_capacity",
+    "model_routing_enabled",
+    "model_tier_overrides",
+    "user_daily_quota_usd",
+    "guild_daily_quota_usd",
+    "doc_top_k",
+    "doc_token_budget",
+    "trace_sample_rate",
+    "question_all_timeout",
+    "command_timeout",
+    "provider_timeout",
+    "sd_prompt_cache_ttl",
+})
+
+# 設定を差し替えた後に呼ばれる関数 (作成時に設定値を受け取ったコンポーネントに反映する)
+config_listeners: list[Callable[[BotConfig], None]] = []
+
+_reload_lock = threading.Lock()
+
+
+@dataclass
+class ReloadResult:
+    """
+    設定の再読み込みの結果
+    """
+    changed: list[str] = field(default_factory=list)  # 差し替えた設定
+    restart_required: list[str] = field(default_factory=list)  # 変更されたが再起動するまで反映されない設定
+
+
+def reload_config(environ: Optional[Mapping[str, str]] = None) -> ReloadResult:
+    """
+    環境変数と TEL_GPT_CONFIG_FILE から設定を読み込み直し、検証してから botConfig の値を差し替える
+
+    差し替えは 1 回の dict.update で行うため、実行中のコマンドやワーカースレッドから途中の状態は見えない。
+
+    Args:
+        environ: 設定を読み込む環境変数 (None の場合はプロセスの環境変数)
+
+    Returns:
+        ReloadResult: 差し替えた設定と、再起動が必要な設定
+
+    Raises:
+        ValueError: 設定ファイルや設定値が不正な場合 (botConfig は変更しない)
+    """
+    with _reload_lock:
+        try:
+            config = BotConfig(load_environ(environ))
+            config.validate()
+        except ValueError:
+            metrics.increment("config.reload_failed")
+            raise
+        current = vars(botConfig)
+        values = vars(config)
+        changed = sorted(name for name in RELOADABLE_FIELDS if values[name] != current[name])
+        restart_required = sorted(
+            name for name, value in values.items() if name not in RELOADABLE_FIELDS and value != current.get(name)
+        )
+        current.update({name: values[name] for name in changed})
+
+        for listener in config_listeners:
+            try:
+                listener(botConfig)
+            except Exception as e:
+                logger.exception(f"Failed to apply reloaded config: {e}")
+
+    metrics.increment("config.reloaded")
+    logger.info(
+        f"Config reloaded: changed={','.join(changed) or '-'} restart_required={','.join(restart_required) or '-'}"
+    )
+    return ReloadResult(changed=changed, restart_required=restart_required)
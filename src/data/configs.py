@@ -1,13 +1,71 @@
 import os
 from dataclasses import dataclass
-from typing import Final
+from typing import Final, Mapping, Optional
 
 from .entities.claude_model import ClaudeModel  # 追加
 from .entities.gemini_model import GeminiChatModel, GeminiImageModel
+from .entities.model_tier import ModelTier
 from .entities.openai_chat_model import OpenAIChatModel
 from .entities.openai_image_model import OpenAIImageModel
 from .entities.stable_diffusion_model import StableDiffusionModel  # 追加
 
+# キルスイッチで停止できるプロバイダと、画像生成のプロバイダ
+PROVIDERS: Final[frozenset[str]] = frozenset({"openai", "gemini", "claude", "stability", "github"})
+# google-generativeai には Imagen のクライアントがないため、Gemini は画像生成のプロバイダに含めない
+IMAGE_PROVIDERS: Final[frozenset[str]] = frozenset({"openai", "stability"})
+# Gateway の Intents の選び方
+INTENTS_PROFILES: Final[frozenset[str]] = frozenset({"minimal", "default"})
+
+
+def parse_tier_overrides(value: Optional[str]) -> dict[str, ModelTier]:
+    """
+    "openai_question=flagship,claude_question=fast" 形式のコマンドごとのモデル階層の指定を読み込む
+    """
+    overrides: dict[str, ModelTier] = {}
+    if not value:
+        return overrides
+    for item in value.split(","):
+        command, _, tier = item.partition("=")
+        if command.strip() and tier.strip():
+            overrides[command.strip()] = ModelTier(tier.strip())
+    return overrides
+
+
+def base_url(value: Optional[str], default: Optional[str]) -> Optional[str]:
+    """
+    環境変数の接続先の URL を末尾の / を除いて読み込む
+    """
+    value = (value or "").rstrip("/")
+    return value or default
+
+
+def read_config_file(path: str) -> dict[str, str]:
+    """
+    KEY=VALUE 形式 (.env と同じ形式) の設定ファイルを読み込む. 空行と # で始まる行は無視する
+    """
+    values: dict[str, str] = {}
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, separator, value = line.partition("=")
+            if not separator or not key.strip():
+                raise ValueError(f"{path}:{number}: expected KEY=VALUE")
+            values[key.strip()] = value.strip().strip('"').strip("'")
+    return values
+
+
+def load_environ(environ: Optional[Mapping[str, str]] = None) -> dict[str, str]:
+    """
+    環境変数に TEL_GPT_CONFIG_FILE の設定ファイルの値を重ねる (設定ファイルの値を優先する)
+    """
+    values = dict(os.environ if environ is None else environ)
+    path = values.get("TEL_GPT_CONFIG_FILE")
+    if path and os.path.exists(path):
+        values.update(read_config_file(path))
+    return values
+
 
 @dataclass
 class BotConfig:
@@ -21,34 +79,280 @@ class BotConfig:
     stability_api_key: str  # 追加: Stability AI API キー
     status_channel_id: str  # 追加：ステータス通知チャンネルID
 
+    openai_base_url: Optional[str]  # OpenAI API の接続先 (None の場合は SDK の既定値)
+    anthropic_base_url: Optional[str]  # Anthropic API の接続先 (None の場合は SDK の既定値)
+    gemini_base_url: Optional[str]  # Gemini API の接続先 (None の場合は SDK の既定値)
+    stability_base_url: str  # Stability AI API の接続先
+    deepl_base_url: str  # DeepL API の接続先
+    github_api_base_url: str  # GitHub API の接続先
+
     openai_chat_model: OpenAIChatModel
     openai_image_model: OpenAIImageModel
     gemini_chat_model: GeminiChatModel
     gemini_image_model: GeminiImageModel
     claude_model: ClaudeModel  # 追加
     stable_diffusion_model: StableDiffusionModel  # 追加: Stable Diffusionモデル
+    disabled_providers: frozenset[str]  # 一時的に停止するプロバイダ
+
+    message_chunk_size: int  # 1 メッセージあたりの最大文字数
+    max_split_messages: int  # これを超える分割数になる回答は .md ファイルとして添付する
+
+    sharding_enabled: bool  # AutoShardedClient を利用するか
+    shard_count: Optional[int]  # 全体のシャード数 (None の場合は Discord の推奨値)
+    shard_ids: Optional[list[int]]  # このプロセスが担当するシャードID (None の場合はすべて)
+    shard_processes: int  # シャードランチャーが起動するプロセス数
+
+    intents_profile: str  # "minimal" (ハンドラが使うイベントのみ) / "default" (discord.Intents.default())
+    max_messages: Optional[int]  # discord.py がキャッシュするメッセージ数 (None の場合はキャッシュしない)
+    member_cache_enabled: bool  # discord.py のメンバーキャッシュを使うか
+    chunk_guilds_at_startup: bool  # 起動時にギルドのメンバーを取得するか
+    tracemalloc_enabled: bool  # 起動時から tracemalloc でメモリの確保を記録するか
+    tracemalloc_frames: int  # tracemalloc が記録するスタックの深さ
+
+    data_dir: str  # SQLite などのローカルデータの保存先
+    worker_mode_enabled: bool  # コマンドをジョブキュー経由でワーカープロセスに実行させるか
+    job_queue_path: str  # ジョブキューの SQLite ファイル
+    worker_count: int  # ワーカープロセス数
+
+    conversation_store_path: str  # 会話履歴の SQLite ファイル
+    conversation_history_limit: int  # 会話で AI に送信する直近のメッセージ数
+    conversation_retention_days: float  # 会話履歴の保存期間 (日)
+    conversation_max_messages_per_thread: int  # スレッドごとに保存する最大メッセージ数
+    conversation_compaction_tokens: int  # 要約していない会話がこのトークン数を超えたら古いターンを要約する
+    conversation_compaction_keep_recent: int  # 要約せずにそのまま送信する直近のメッセージ数
+    conversation_summary_model: OpenAIChatModel  # 要約に使う軽量なモデル
+
+    doc_index_path: str  # VRChat 開発のドキュメントの検索インデックス (build_doc_index.py で作成する)
+    doc_top_k: int  # VRChat 開発の質問に添えるドキュメントの最大件数
+    doc_token_budget: int  # VRChat 開発の質問に添えるドキュメントの最大トークン数
+
+    command_timeout: float  # コマンドの期限 (秒). 過ぎたコマンドはキャンセルする
+    provider_timeout: float  # プロバイダの呼び出し 1 回のタイムアウト (秒, コマンドの残り時間の方が短い場合はそちら)
+
+    outbox_path: str  # GitHub の Issue 作成・ステータス通知など外部への送信を記録する SQLite ファイル
+
+    trace_path: Optional[str]  # 匿名化したトレースを記録する JSONL ファイル (None の場合は記録しない)
+    trace_sample_rate: float  # トレースを記録するインタラクションの割合
+
+    image_providers: list[str]  # 画像生成で切り替えるプロバイダ (失敗時に順に試す)
+    image_provider_timeout: float  # 画像生成のプロバイダごとのタイムアウト (秒)
+    image_provider_cooldown: float  # エラーが続いたプロバイダを後回しにする時間 (秒)
+
+    image_lineage_capacity: int  # メモリに保持する画像の生成履歴の件数
+    image_lineage_path: Optional[str]  # 画像の生成履歴の SQLite ファイル (None の場合は保存しない)
+
+    model_routing_enabled: bool  # 質問の難しさに応じてモデルを振り分けるか
+    model_tier_overrides: dict[str, ModelTier]  # コマンドごとに固定するモデル階層
+
+    command_sync_state_path: str  # 同期したコマンドツリーのハッシュの保存先
+    dev_guild_id: Optional[int]  # コマンドを同期する開発用ギルド (None の場合はグローバルに同期)
+    force_command_sync: bool  # ハッシュが同じでもコマンドを同期するか
 
-    def __init__(self):
+    def __init__(self, environ: Optional[Mapping[str, str]] = None):
+        """
+        Args:
+            environ: 設定を読み込む環境変数 (None の場合はプロセスの環境変数)
+        """
+        getenv = (os.environ if environ is None else environ).get
         self.discord_assistant_name = 'TelGPT'
 
-        self.discord_token = os.getenv("TEL_GPT_DISCORD_TOKEN")
-        self.openai_api_key = os.getenv("TEL_GPT_OPEN_AI_TOKEN")
-        self.deepl_api_key = os.getenv("TEL_GPT_DEEPL_TOKEN")
-        self.gemini_api_key = os.getenv("TEL_GPT_GEMINI_TOKEN")
-        self.github_pat = os.getenv("GITHUB_ISSUE_PAT")
-        self.claude_api_key = os.getenv("TEL_GPT_CLAUDE_TOKEN")  # 追加
-        self.stability_api_key = os.getenv("TEL_GPT_STABILITY_TOKEN")  # 追加: Stability AI APIキー
+        self.discord_token = getenv("TEL_GPT_DISCORD_TOKEN")
+        self.openai_api_key = getenv("TEL_GPT_OPEN_AI_TOKEN")
+        self.deepl_api_key = getenv("TEL_GPT_DEEPL_TOKEN")
+        self.gemini_api_key = getenv("TEL_GPT_GEMINI_TOKEN")
+        self.github_pat = getenv("GITHUB_ISSUE_PAT")
+        self.claude_api_key = getenv("TEL_GPT_CLAUDE_TOKEN")  # 追加
+        self.stability_api_key = getenv("TEL_GPT_STABILITY_TOKEN")  # 追加: Stability AI APIキー
 
         # ステータス通知チャンネルIDの設定（環境変数から取得、未設定の場合はNone）
-        self.status_channel_id = os.getenv("TEL_GPT_STATUS_CHANNEL_ID")
+        self.status_channel_id = getenv("TEL_GPT_STATUS_CHANNEL_ID")
+
+        # プロバイダの接続先 (TEL_GPT_PROVIDER_BASE_URL でスタブサーバーなどにまとめて向け、個別の指定で上書きする)
+        provider_base_url = (getenv("TEL_GPT_PROVIDER_BASE_URL") or "").rstrip("/") or None
+        self.openai_base_url = base_url(
+            getenv("TEL_GPT_OPENAI_BASE_URL"), f"{provider_base_url}/v1" if provider_base_url else None
+        )
+        self.anthropic_base_url = base_url(getenv("TEL_GPT_ANTHROPIC_BASE_URL"), provider_base_url)
+        self.gemini_base_url = base_url(getenv("TEL_GPT_GEMINI_BASE_URL"), provider_base_url)
+        self.stability_base_url = base_url(
+            getenv("TEL_GPT_STABILITY_BASE_URL"), provider_base_url or "https://api.stability.ai"
+        )
+        self.deepl_base_url = base_url(getenv("TEL_GPT_DEEPL_BASE_URL"), provider_base_url or "https://api-free.deepl.com")
+        self.github_api_base_url = base_url(
+            getenv("TEL_GPT_GITHUB_BASE_URL"), provider_base_url or "https://api.github.com"
+        )
+
+        # 使用するモデル (モデル ID で上書きできる)
+        self.openai_chat_model = OpenAIChatModel(getenv("TEL_GPT_OPENAI_CHAT_MODEL", OpenAIChatModel.GPT_4_1.value))
+        self.openai_image_model = OpenAIImageModel(
+            getenv("TEL_GPT_OPENAI_IMAGE_MODEL", OpenAIImageModel.DALL_E_3.value)
+        )
+        self.gemini_chat_model = GeminiChatModel(
+            getenv("TEL_GPT_GEMINI_CHAT_MODEL", GeminiChatModel.GEMINI_2_5_FLASH.value)
+        )
+        self.gemini_image_model = GeminiImageModel(
+            getenv("TEL_GPT_GEMINI_IMAGE_MODEL", GeminiImageModel.IMAGEN_3_0_GENERATE_001.value)
+        )
+        self.claude_model = ClaudeModel(getenv("TEL_GPT_CLAUDE_MODEL", ClaudeModel.CLAUDE_4_0_SONNET.value))
+        self.stable_diffusion_model = StableDiffusionModel(
+            getenv("TEL_GPT_STABLE_DIFFUSION_MODEL", StableDiffusionModel.SDXL_1_0.value)
+        )
+
+        # 一時的に停止するプロバイダ (障害時のキルスイッチ. このプロバイダを使うコマンドは実行しない)
+        self.disabled_providers = frozenset(
+            provider.strip() for provider in getenv("TEL_GPT_DISABLED_PROVIDERS", "").split(",") if provider.strip()
+        )
+
+        # 長い回答の送信設定
+        self.message_chunk_size = 1800
+        self.max_split_messages = int(getenv("TEL_GPT_MAX_SPLIT_MESSAGES", "4"))
+
+        # シャーディングの設定 (TEL_GPT_SHARD_COUNT か TEL_GPT_SHARDING=1 で有効)
+        shard_count = getenv("TEL_GPT_SHARD_COUNT")
+        shard_ids = getenv("TEL_GPT_SHARD_IDS")
+        self.shard_count = int(shard_count) if shard_count else None
+        self.shard_ids = [int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None
+        self.sharding_enabled = getenv("TEL_GPT_SHARDING") == "1" or self.shard_count is not None
+        self.shard_processes = int(getenv("TEL_GPT_SHARD_PROCESSES", "1"))
+
+        # discord.py のキャッシュの設定 (ハンドラはメッセージ・メンバーのキャッシュを参照しないため既定では持たない)
+        max_messages = int(getenv("TEL_GPT_MAX_MESSAGES", "0"))
+        self.intents_profile = getenv("TEL_GPT_INTENTS", "minimal")
+        self.max_messages = max_messages if max_messages > 0 else None
+        self.member_cache_enabled = getenv("TEL_GPT_MEMBER_CACHE") == "1"
+        self.chunk_guilds_at_startup = getenv("TEL_GPT_CHUNK_GUILDS") == "1"
+        self.tracemalloc_enabled = getenv("TEL_GPT_TRACEMALLOC") == "1"
+        self.tracemalloc_frames = int(getenv("TEL_GPT_TRACEMALLOC_FRAMES", "1"))
+
+        # ローカルデータとワーカーの設定
+        self.data_dir = getenv("TEL_GPT_DATA_DIR", "var")
+        self.worker_mode_enabled = getenv("TEL_GPT_WORKER_MODE") == "1"
+        self.job_queue_path = os.path.join(self.data_dir, "jobs.sqlite3")
+        self.worker_count = int(getenv("TEL_GPT_WORKER_COUNT", "2"))
+
+        # 会話履歴の保存設定
+        self.conversation_store_path = os.path.join(self.data_dir, "conversations.sqlite3")
+        self.conversation_history_limit = int(getenv("TEL_GPT_CONVERSATION_HISTORY_LIMIT", "10"))
+        self.conversation_retention_days = float(getenv("TEL_GPT_CONVERSATION_RETENTION_DAYS", "30"))
+        self.conversation_max_messages_per_thread = 200
+        self.conversation_compaction_tokens = int(getenv("TEL_GPT_CONVERSATION_COMPACTION_TOKENS", "4000"))
+        self.conversation_compaction_keep_recent = 6
+        self.conversation_summary_model = OpenAIChatModel.GPT_4_O_MINI
+
+        # 画像生成のプロバイダの切り替え設定
+        self.image_providers = [
+            provider.strip()
+            for provider in getenv("TEL_GPT_IMAGE_PROVIDERS", "openai,stability").split(",")
+            if provider.strip()
+        ]
+        self.image_provider_timeout = float(getenv("TEL_GPT_IMAGE_PROVIDER_TIMEOUT", "60"))
+        self.image_provider_cooldown = float(getenv("TEL_GPT_IMAGE_PROVIDER_COOLDOWN", "60"))
+
+        # 画像の生成履歴の保存設定 (TEL_GPT_IMAGE_LINEAGE_PERSIST=0 の場合はメモリにのみ保持する)
+        self.image_lineage_capacity = int(getenv("TEL_GPT_IMAGE_LINEAGE_CAPACITY", "2048"))
+        self.image_lineage_path = (
+            os.path.join(self.data_dir, "image_lineage.sqlite3")
+            if getenv("TEL_GPT_IMAGE_LINEAGE_PERSIST", "1") == "1" else None
+        )
+
+        # モデルの振り分け設定 (VRChat 開発の質問は専門的なためフラッグシップモデルに固定)
+        self.model_routing_enabled = getenv("TEL_GPT_MODEL_ROUTING", "1") == "1"
+        self.model_tier_overrides = {
+            "openai_question_udon": ModelTier.FLAGSHIP,
+            "gemini_question_udon": ModelTier.FLAGSHIP,
+            "claude_question_udon": ModelTier.FLAGSHIP,
+            **parse_tier_overrides(getenv("TEL_GPT_MODEL_TIER_OVERRIDES")),
+        }
+
+        # スラッシュコマンドの同期設定
+        dev_guild_id = getenv("TEL_GPT_DEV_GUILD_ID")
+        self.command_sync_state_path = os.path.join(self.data_dir, "command_tree.json")
+        self.dev_guild_id = int(dev_guild_id) if dev_guild_id else None
+        self.force_command_sync = getenv("TEL_GPT_FORCE_COMMAND_SYNC") == "1"
+
+        # プロバイダの使用量の台帳と、ユーザー・ギルドごとの 1 日の利用上限 (USD, 未設定の場合は無制限)
+        user_daily_quota_usd = getenv("TEL_GPT_USER_DAILY_QUOTA_USD")
+        guild_daily_quota_usd = getenv("TEL_GPT_GUILD_DAILY_QUOTA_USD")
+        self.usage_ledger_path = os.path.join(self.data_dir, "usage.sqlite3")
+        self.user_daily_quota_usd = float(user_daily_quota_usd) if user_daily_quota_usd else None
+        self.guild_daily_quota_usd = float(guild_daily_quota_usd) if guild_daily_quota_usd else None
+
+        # コマンドの期限とプロバイダの呼び出しのタイムアウト
+        self.command_timeout = float(getenv("TEL_GPT_COMMAND_TIMEOUT", "600"))
+        self.provider_timeout = float(getenv("TEL_GPT_PROVIDER_TIMEOUT", "120"))
+
+        # コマンドの応答を待たずにバックグラウンドで行う外部への送信の記録
+        self.outbox_path = os.path.join(self.data_dir, "outbox.sqlite3")
+
+        # VRChat 開発の質問に添えるドキュメントの検索設定 (インデックスがない場合は検索しない)
+        self.doc_index_path = getenv("TEL_GPT_DOC_INDEX_PATH") or os.path.join(self.data_dir, "udon_docs.idx")
+        self.doc_top_k = int(getenv("TEL_GPT_DOC_TOP_K", "4"))
+        self.doc_token_budget = int(getenv("TEL_GPT_DOC_TOKEN_BUDGET", "1500"))
+
+        # 負荷の再現用のトレースの記録 (TEL_GPT_TRACE_PATH を設定した場合のみ記録する)
+        self.trace_path = getenv("TEL_GPT_TRACE_PATH") or None
+        self.trace_sample_rate = float(getenv("TEL_GPT_TRACE_SAMPLE_RATE", "1.0"))
+
+        # /ai-question-all で各プロバイダの回答を待つ最大時間 (秒)
+        self.question_all_timeout = float(getenv("TEL_GPT_QUESTION_ALL_TIMEOUT", "90"))
+
+        # Stable Diffusion 用のプロンプト変換の設定
+        self.sd_prompt_model = OpenAIChatModel.GPT_4_O_MINI
+        self.sd_prompt_max_tokens = 200
+        self.sd_prompt_cache_ttl = float(getenv("TEL_GPT_SD_PROMPT_CACHE_TTL", "3600"))
+
+        # 停止時に実行中のコマンドの完了を待つ最大時間 (秒)
+        self.shutdown_drain_timeout = float(getenv("TEL_GPT_SHUTDOWN_DRAIN_TIMEOUT", "60"))
+
+    @property
+    def is_primary_process(self) -> bool:
+        """
+        起動・停止通知やコマンド同期を行うプロセスか (シャード 0 を担当するプロセスのみ)
+        """
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    def validate(self):
+        """
+        設定値の範囲を確認する
 
-        self.openai_chat_model = OpenAIChatModel.GPT_4_1
-        self.openai_image_model = OpenAIImageModel.DALL_E_3
-        self.gemini_chat_model = GeminiChatModel.GEMINI_2_5_FLASH
-        self.gemini_image_model = GeminiImageModel.IMAGEN_3_0_GENERATE_001
-        self.claude_model = ClaudeModel.CLAUDE_4_0_SONNET
-        self.stable_diffusion_model = StableDiffusionModel.SDXL_1_0
+        Raises:
+            ValueError: 不正な設定値がある場合 (すべての問題をまとめて報告する)
+        """
+        problems = []
+        if not 1 <= self.message_chunk_size <= 2000:
+            problems.append("message_chunk_size must be between 1 and 2000")
+        for name in ("max_split_messages", "conversation_history_limit", "conversation_compaction_tokens",
+                     "image_lineage_capacity", "doc_top_k"):
+            if getattr(self, name) < 1:
+                problems.append(f"{name} must be at least 1")
+        for name in ("image_provider_timeout", "image_provider_cooldown", "question_all_timeout",
+                     "shutdown_drain_timeout", "command_timeout", "provider_timeout"):
+            if getattr(self, name) <= 0:
+                problems.append(f"{name} must be positive")
+        if self.intents_profile not in INTENTS_PROFILES:
+            problems.append(f"intents_profile must be one of {sorted(INTENTS_PROFILES)}")
+        if self.tracemalloc_frames < 1:
+            problems.append("tracemalloc_frames must be at least 1")
+        if self.doc_token_budget < 0:
+            problems.append("doc_token_budget must not be negative")
+        if self.sd_prompt_cache_ttl < 0:
+            problems.append("sd_prompt_cache_ttl must not be negative")
+        if not 0.0 <= self.trace_sample_rate <= 1.0:
+            problems.append("trace_sample_rate must be between 0.0 and 1.0")
+        for name in ("user_daily_quota_usd", "guild_daily_quota_usd"):
+            if getattr(self, name) is not None and getattr(self, name) < 0:
+                problems.append(f"{name} must not be negative")
+        unknown_image_providers = set(self.image_providers) - IMAGE_PROVIDERS
+        if unknown_image_providers or not self.image_providers:
+            problems.append(f"image_providers must be a non-empty subset of {sorted(IMAGE_PROVIDERS)}")
+        unknown_providers = self.disabled_providers - PROVIDERS
+        if unknown_providers:
+            problems.append(f"disabled_providers has unknown providers: {', '.join(sorted(unknown_providers))}")
+        if problems:
+            raise ValueError("; ".join(problems))
 
 
-# Bot の設定
-botConfig: Final[BotConfig] = BotConfig()
+# Bot の設定 (再読み込みでは値だけを差し替え、インスタンスは変わらない)
+botConfig: Final[BotConfig] = BotConfig(load_environ())
+# 起動時の設定も再読み込みと同じく検証し、不正な値があれば起動しない
+botConfig.validate()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from .conversation_store import ConversationStore, StoredMessage, ThreadSummary
+from .entities.entity import Message
+from .entities.openai_chat_model import OpenAIChatModel
+from .metrics import metrics
+from .openai_api import OpenAIAPI
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# 要約を作成する際の指示
+SUMMARY_INSTRUCTION = (
+    "You summarize the earlier part of a conversation between a user and an assistant in a Discord thread. "
+    "Merge the previous summary (if any) with the new messages into a single concise summary in Japanese. "
+    "Keep facts, decisions, code identifiers, and open questions that later turns may refer to. "
+    "Respond with the summary only."
+)
+
+# AI に送信する際に要約の前に付ける説明
+SUMMARY_PREFIX = "Summary of the earlier conversation in this thread:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を概算する
+
+    英数字はおよそ 4 文字で 1 トークン、日本語などの非 ASCII 文字はおよそ 1 文字で 1 トークンとして数える
+    """
+    ascii_count = sum(1 for character in text if character.isascii())
+    return ascii_count // 4 + (len(text) - ascii_count)
+
+
+class ConversationCompactor:
+    """
+    長い会話の古いターンをバックグラウンドで要約し、要約と直近のターンだけを AI に送信する
+
+    要約していないメッセージのトークン数が閾値を超えると、直近 keep_recent 件より古いメッセージを
+    軽量なモデルで要約する。要約はスレッドごとにキャッシュして会話ストアにも保存するため、
+    スレッドがどれだけ長くなっても 1 ターンあたりのプロンプトの大きさはほぼ一定になる。
+    キャッシュは最近使った summary_capacity スレッド分だけ保持し、溢れた要約は会話ストアから読み直す。
+    """
+
+    def __init__(
+        self,
+        openai_api: OpenAIAPI,
+        store: ConversationStore,
+        model: OpenAIChatModel,
+        threshold_tokens: int,
+        keep_recent: int,
+        max_raw_messages: int = 100,
+        summary_capacity: int = 1024
+    ):
+        self.openai_api = openai_api
+        self.store = store
+        self.model = model
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent = keep_recent
+        self.max_raw_messages = max_raw_messages
+        self.summary_capacity = summary_capacity
+        self._summaries: OrderedDict[int, Optional[ThreadSummary]] = OrderedDict()
+        # 実行中の要約のみ保持する (終わったタスクは _task_done で取り除く)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def get_summary(self, thread_id: int) -> Optional[ThreadSummary]:
+        """
+        スレッドの要約を取得する (キャッシュに無い場合は会話ストアから読み込む)
+        """
+        if thread_id in self._summaries:
+            self._summaries.move_to_end(thread_id)
+            return self._summaries[thread_id]
+        summary = await self.store.summary(thread_id)
+        self._remember(thread_id, summary)
+        return summary
+
+    def _remember(self, thread_id: int, summary: Optional[ThreadSummary]):
+        self._summaries[thread_id] = summary
+        self._summaries.move_to_end(thread_id)
+        while len(self._summaries) > self.summary_capacity:
+            self._summaries.popitem(last=False)
+
+    async def build_prompts(self, thread_id: int) -> list[Message]:
+        """
+        要約と、要約されていない直近のメッセージから AI に送信する会話履歴を作成する
+
+        Args:
+            thread_id: スレッドID
+
+        Returns:
+            list[Message]: AI に送信する会話履歴
+        """
+        summary = await self.get_summary(thread_id)
+        after = summary.covered_until if summary else 0.0
+        messages = await self.store.since(thread_id, after, self.max_raw_messages)
+
+        tokens = sum(estimate_tokens(message.content) for message in messages)
+        if tokens > self.threshold_tokens and len(messages) > self.keep_recent:
+            self.schedule(thread_id, summary, messages[:-self.keep_recent])
+
+        prompts = []
+        if summary:
+            prompts.append(Message(role="system", content=SUMMARY_PREFIX + summary.text))
+        prompts.extend(Message(role=message.role, content=message.content) for message in messages)
+        return prompts
+
+    def schedule(self, thread_id: int, summary: Optional[ThreadSummary], older: list[StoredMessage]):
+        """
+        古いメッセージの要約をバックグラウンドで開始する (同じスレッドで実行中の場合は何もしない)
+        """
+        task = self._tasks.get(thread_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self.compact(thread_id, summary, older))
+        task.add_done_callback(lambda done: self._task_done(thread_id, done))
+        self._tasks[thread_id] = task
+
+    def _task_done(self, thread_id: int, task: asyncio.Task):
+        if self._tasks.get(thread_id) is task:
+            del self._tasks[thread_id]
+
+    async def wait(self):
+        """
+        実行中の要約が終わるまで待つ
+        """
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def compact(self, thread_id: int, summary: Optional[ThreadSummary], older: list[StoredMessage]):
+        """
+        前回の要約と古いメッセージをまとめて新しい要約を作成する
+        """
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in older)
+        if summary:
+            transcript = f"Previous summary:\n{summary.text}\n\nNew messages:\n{transcript}"
+
+        with metrics.timer("conversation.compaction"):
+            result = await asyncio.to_thread(
+                self.openai_api.conversation,
+                self.model,
+                [
+                    Message(role="system", content=SUMMARY_INSTRUCTION),
+                    Message(role="user", content=transcript),
+                ]
+            )
+        if not result.ok:
+            logger.error(f"Failed to summarize thread {thread_id}: {result.error.message}")
+            return
+
+        new_summary = ThreadSummary(
+            thread_id=thread_id,
+            text=result.payload,
+            covered_until=older[-1].created_at,
+        )
+        self._remember(thread_id, new_summary)
+        await self.store.save_summary(new_summary)
+        metrics.increment("conversation.compactions")
+        logger.info(f"Compacted {len(older)} messages in thread {thread_id}")
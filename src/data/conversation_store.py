@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from .entities.entity import Message
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+@dataclass
+class ThreadSummary:
+    """
+    スレッドの古い会話を要約したもの
+
+    covered_until までに作成されたメッセージの内容を含む
+    """
+    thread_id: int
+    text: str
+    covered_until: float
+
+
+@dataclass
+class StoredMessage:
+    """
+    会話ストアに保存するスレッド内のメッセージ
+    """
+    thread_id: int
+    message_id: int
+    role: str
+    content: str
+    created_at: float
+
+
+class ConversationStore:
+    """
+    Bot のスレッドの会話履歴を保存する SQLite (WAL) のストア
+
+    本文は zlib で圧縮し、(thread_id, created_at) のインデックスで 1 回のクエリで読み出す。
+    書き込みはメモリに溜めてからバックグラウンドでまとめて行うため、会話の処理を待たせない。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retention_days: float = 30.0,
+        max_messages_per_thread: int = 200,
+        retention_interval: float = 3600.0
+    ):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_messages_per_thread = max_messages_per_thread
+        self.retention_interval = retention_interval
+        self._pending: list[StoredMessage] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_retention = 0.0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 書き込みはワーカースレッドから行うため、同一スレッドの制約を外してロックで保護する
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                message_id INTEGER PRIMARY KEY,
+                thread_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                body BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS messages_thread_created ON messages (thread_id, created_at)"
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                thread_id INTEGER PRIMARY KEY,
+                body BLOB NOT NULL,
+                covered_until REAL NOT NULL
+            )
+            """
+        )
+
+    def append(self, message: StoredMessage):
+        """
+        メッセージを保存する. 書き込みはバックグラウンドで行われる
+        """
+        self._pending.append(message)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def extend(self, messages: list[StoredMessage]):
+        for message in messages:
+            self.append(message)
+
+    async def flush(self):
+        """
+        溜まっているメッセージを書き込む (書き込み中のものがあれば完了まで待つ)
+        """
+        async with self._flush_lock:
+            while self._pending:
+                rows, self._pending = self._pending, []
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                except Exception as e:
+                    logger.error(f"Failed to write conversation messages: {e}")
+
+    def _write(self, rows: list[StoredMessage]):
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO messages (message_id, thread_id, role, body, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (row.message_id, row.thread_id, row.role, zlib.compress(row.content.encode("utf-8")),
+                         row.created_at)
+                        for row in rows
+                    ]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        if time.time() - self._last_retention > self.retention_interval:
+            self.apply_retention()
+
+    async def has_thread(self, thread_id: int) -> bool:
+        """
+        スレッドの履歴が保存されているか
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._has_thread, thread_id)
+
+    def _has_thread(self, thread_id: int) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM messages WHERE thread_id = ? LIMIT 1", (thread_id,)
+            ).fetchone()
+        return row is not None
+
+    async def recent(self, thread_id: int, limit: int) -> list[Message]:
+        """
+        スレッドの直近のメッセージを古い順に取得する
+
+        Args:
+            thread_id: スレッドID
+            limit: 取得する最大件数
+
+        Returns:
+            list[Message]: 会話履歴
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._recent, thread_id, limit)
+
+    def _recent(self, thread_id: int, limit: int) -> list[Message]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT role, body FROM messages WHERE thread_id = ? ORDER BY created_at DESC LIMIT ?",
+                (thread_id, limit)
+            ).fetchall()
+        rows.reverse()
+        return [Message(role=role, content=zlib.decompress(body).decode("utf-8")) for role, body in rows]
+
+    async def since(self, thread_id: int, after: float, limit: int) -> list[StoredMessage]:
+        """
+        after より後に作成されたメッセージのうち直近の limit 件を古い順に取得する
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._since, thread_id, after, limit)
+
+    def _since(self, thread_id: int, after: float, limit: int) -> list[StoredMessage]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT message_id, role, body, created_at FROM messages "
+                "WHERE thread_id = ? AND created_at > ? ORDER BY created_at DESC LIMIT ?",
+                (thread_id, after, limit)
+            ).fetchall()
+        rows.reverse()
+        return [
+            StoredMessage(
+                thread_id=thread_id,
+                message_id=message_id,
+                role=role,
+                content=zlib.decompress(body).decode("utf-8"),
+                created_at=created_at,
+            )
+            for message_id, role, body, created_at in rows
+        ]
+
+    async def summary(self, thread_id: int) -> Optional[ThreadSummary]:
+        """
+        スレッドの要約を取得する
+        """
+        return await asyncio.to_thread(self._summary, thread_id)
+
+    def _summary(self, thread_id: int) -> Optional[ThreadSummary]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, covered_until FROM summaries WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return ThreadSummary(thread_id=thread_id, text=zlib.decompress(row[0]).decode("utf-8"), covered_until=row[1])
+
+    async def save_summary(self, summary: ThreadSummary):
+        """
+        スレッドの要約を保存する
+        """
+        await asyncio.to_thread(self._save_summary, summary)
+
+    def _save_summary(self, summary: ThreadSummary):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO summaries (thread_id, body, covered_until) VALUES (?, ?, ?)",
+                (summary.thread_id, zlib.compress(summary.text.encode("utf-8")), summary.covered_until)
+            )
+
+    def apply_retention(self):
+        """
+        保存期間を過ぎたメッセージと、スレッドごとの上限を超えた古いメッセージを削除する
+        """
+        self._last_retention = time.time()
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM messages WHERE created_at < ?",
+                (time.time() - self.retention_days * 24 * 60 * 60,)
+            )
+            self._connection.execute(
+                """
+                DELETE FROM messages WHERE message_id IN (
+                    SELECT message_id FROM (
+                        SELECT message_id, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id ORDER BY created_at DESC
+                        ) AS position FROM messages
+                    ) WHERE position > ?
+                )
+                """,
+                (self.max_messages_per_thread,)
+            )
+            # メッセージがすべて削除されたスレッドの要約も削除する
+            self._connection.execute(
+                "DELETE FROM summaries WHERE thread_id NOT IN (SELECT DISTINCT thread_id FROM messages)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
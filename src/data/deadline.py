@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Coroutine, Iterator, Optional
+
+from .configs import botConfig
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# インタラクションのトークンの有効期限 (15分) より少し短い時間
+INTERACTION_TOKEN_LIFETIME = 14 * 60
+# トークンの期限が切れた Webhook への送信で返されるエラーコード
+INVALID_WEBHOOK_TOKEN = 50027
+# 期限の直前でもプロバイダの呼び出しに与える最低限のタイムアウト (秒)
+MIN_PROVIDER_TIMEOUT = 1.0
+
+# コマンドの実行結果
+OUTCOME_DONE = "done"
+OUTCOME_TIMED_OUT = "timed_out"
+OUTCOME_CANCELLED = "cancelled"
+
+# 実行中のコマンドの期限 (time.monotonic() の値). asyncio.to_thread やタスクにも引き継がれる
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    コマンドの期限を過ぎてからプロバイダを呼び出そうとした
+    """
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[float]:
+    """
+    with ブロック内の処理の期限を seconds 秒後にする (外側の期限の方が早い場合はそちらを使う)
+    """
+    deadline = time.monotonic() + seconds
+    outer = current_deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """
+    実行中のコマンドの残り時間 (秒, 期限がない場合は None)
+    """
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def provider_timeout(default: Optional[float] = None) -> float:
+    """
+    プロバイダの呼び出しに渡すタイムアウト (秒)
+
+    default (省略時は botConfig.provider_timeout) とコマンドの残り時間の短い方を返す
+
+    Raises:
+        DeadlineExceeded: コマンドの期限を過ぎている場合 (プロバイダを呼び出さずに失敗させる)
+    """
+    timeout = botConfig.provider_timeout if default is None else default
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        metrics.increment("deadline.provider_skipped")
+        raise DeadlineExceeded("the command deadline has passed")
+    return max(min(timeout, remaining), MIN_PROVIDER_TIMEOUT)
+
+
+def is_token_expired(created_at: float) -> bool:
+    """
+    インタラクションのトークンの期限が切れて followup で返信できないか
+
+    Args:
+        created_at: インタラクションの作成日時 (UNIX 時間)
+    """
+    return time.time() - created_at > INTERACTION_TOKEN_LIFETIME
+
+
+class CommandCancellation:
+    """
+    コマンドに期限を付けて実行し、元のメッセージの削除やスレッドのアーカイブで取り消す
+
+    コマンドは子タスクで実行し、メッセージ ID・チャンネル ID に紐付けて記録する。
+    期限を過ぎるか cancel_message / cancel_channel が呼ばれると子タスクをキャンセルする。
+    プロバイダの呼び出し中のスレッドは止められないため、呼び出しは provider_timeout のタイムアウトで打ち切られる。
+    """
+
+    def __init__(self):
+        self._tasks: dict[tuple[str, int], set[asyncio.Task]] = defaultdict(set)
+        self._reasons: dict[asyncio.Task, str] = {}
+
+    @property
+    def running_count(self) -> int:
+        return len({task for tasks in self._tasks.values() for task in tasks})
+
+    async def run(
+        self,
+        command: str,
+        coroutine: Coroutine,
+        timeout: float,
+        message_id: Optional[int] = None,
+        channel_id: Optional[int] = None
+    ) -> str:
+        """
+        期限付きでコマンドを実行する
+
+        Args:
+            command: コマンド名 (メトリクス用)
+            coroutine: コマンドの処理
+            timeout: 期限 (秒). プロバイダの呼び出しのタイムアウトにも使われる
+            message_id: 削除されたら取り消すメッセージ
+            channel_id: アーカイブ・削除されたら取り消すスレッド (チャンネル)
+
+        Returns:
+            str: OUTCOME_DONE / OUTCOME_TIMED_OUT / OUTCOME_CANCELLED
+        """
+        with deadline_scope(timeout) as deadline:
+            # 子タスクは作成時のコンテキスト (期限・使用量の記録先など) を引き継ぐ
+            task = asyncio.create_task(coroutine)
+        keys = [key for key in (("message", message_id), ("channel", channel_id)) if key[1] is not None]
+        for key in keys:
+            self._tasks[key].add(task)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=max(deadline - time.monotonic(), 0))
+            if not done:
+                task.cancel()
+                await asyncio.wait({task})
+                metrics.increment("commands.timed_out")
+                metrics.increment(f"commands.timed_out.{command}")
+                logger.info(f"Command {command} timed out after {timeout:.0f}s")
+                return OUTCOME_TIMED_OUT
+            if task.cancelled():
+                reason = self._reasons.get(task, "unknown")
+                metrics.increment("commands.cancelled")
+                metrics.increment(f"commands.cancelled.{reason}")
+                logger.info(f"Command {command} cancelled ({reason})")
+                return OUTCOME_CANCELLED
+            # コマンドの例外はそのまま呼び出し元に伝える
+            task.result()
+            return OUTCOME_DONE
+        except asyncio.CancelledError:
+            # 呼び出し元 (停止処理など) がキャンセルされた場合はコマンドもキャンセルする
+            task.cancel()
+            raise
+        finally:
+            for key in keys:
+                self._tasks[key].discard(task)
+                if not self._tasks[key]:
+                    del self._tasks[key]
+            self._reasons.pop(task, None)
+
+    def _cancel(self, key: tuple[str, int], reason: str) -> int:
+        tasks = [task for task in self._tasks.get(key, ()) if not task.done()]
+        for task in tasks:
+            self._reasons.setdefault(task, reason)
+            task.cancel()
+        return len(tasks)
+
+    def cancel_message(self, message_id: int, reason: str = "message_deleted") -> int:
+        """
+        メッセージから始まったコマンドを取り消す
+
+        Returns:
+            int: 取り消したコマンドの数
+        """
+        return self._cancel(("message", message_id), reason)
+
+    def cancel_channel(self, channel_id: int, reason: str) -> int:
+        """
+        スレッド (チャンネル) で実行中のコマンドを取り消す
+
+        Returns:
+            int: 取り消したコマンドの数
+        """
+        return self._cancel(("channel", channel_id), reason)
+
+
+# プロセス全体で共有するコマンドの取り消し
+commandCancellation = CommandCancellation()
@@ -1,29 +1,208 @@
+import asyncio
+import io
+import logging
+import time
 from typing import Final, Optional
 
 import discord
 from discord import app_commands
 
+from .command_sync import sync_commands
+from .config_reload import config_listeners, reload_config
 from .configs import botConfig
-from .tel_discord_command import TelDiscordCommand
+from .deadline import OUTCOME_TIMED_OUT, commandCancellation
+from .job_queue import JobQueue
+from .job_worker import enqueue_interaction
+from .memory_profiler import discord_cache_sizes, memoryProfiler
+from .metrics import metrics
+from .model_router import COMMAND_PROVIDERS
+from .outbox import KIND_STATUS_MESSAGE, PermanentDeliveryError, outbox
+from .sharding import ShardMonitor, build_intents, create_discord_client
+from .shutdown_coordinator import ShutdownCoordinator
+from .single_flight import normalize_prompt
+from .trace_recorder import traceRecorder
+from .usage_ledger import usageLedger, usage_scope
+from .tel_discord_command import TelDiscordCommand, truncate_text
 from .entities.constants import Constants
 
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# 起動時間の計測用
+process_started_at = time.perf_counter()
+
+# 起動時からメモリの確保を記録する場合は、クライアントを作成する前に開始する
+if botConfig.tracemalloc_enabled:
+    memoryProfiler.frames = botConfig.tracemalloc_frames
+    memoryProfiler.start()
+
 # Discord Bot の設定
-discordIntents = discord.Intents.default()
-discordIntents.message_content = True
-discordClient: Final[discord.Client] = discord.Client(intents=discordIntents)
+discordIntents = build_intents(botConfig.intents_profile)
+discordClient: Final[discord.Client] = create_discord_client(discordIntents)
 discordCommand: Final[app_commands.CommandTree] = app_commands.CommandTree(discordClient)
 
 telDiscordCommand: Final[TelDiscordCommand] = TelDiscordCommand(
     discord_client=discordClient,
 )
+config_listeners.append(telDiscordCommand.apply_config)
+
+# ワーカーモードではコマンドをジョブキューに登録してワーカープロセスに実行させる
+jobQueue: Final[Optional[JobQueue]] = JobQueue(botConfig.job_queue_path) if botConfig.worker_mode_enabled else None
+
+# シャードごとのイベントレートとレイテンシの監視
+shardMonitor: Final[ShardMonitor] = ShardMonitor(discordClient)
+
+# 停止時に実行中のコマンドの完了を待ってから後始末を行う
+shutdownCoordinator: Final[ShutdownCoordinator] = ShutdownCoordinator(
+    drain_timeout=botConfig.shutdown_drain_timeout,
+)
 
 # ステータス通知用の変数
 status_channel: Optional[discord.TextChannel] = None
+# on_ready は再接続時にも呼ばれるため、起動時の処理を 1 度だけ行うためのフラグ
+is_started: bool = False
+
+async def run_command(interaction: discord.Interaction, command: str, **arguments):
+    """
+    コマンドを実行する. ワーカーモードの場合はジョブキューに登録するだけで応答を返す
+
+    Args:
+        interaction: Discord のインタラクション
+        command: 実行する TelDiscordCommand のメソッド名
+        arguments: コマンドの引数
+    """
+    # キルスイッチで停止しているプロバイダを使うコマンドは実行しない
+    if COMMAND_PROVIDERS.get(command) in botConfig.disabled_providers:
+        metrics.increment(f"kill_switch.{COMMAND_PROVIDERS[command]}")
+        await interaction.response.send_message(Constants.provider_disabled_message, ephemeral=True)
+        return
+    # プロバイダを呼び出す前に利用上限を確認する
+    quota_message = await usageLedger.check_quota(interaction.user.id, interaction.guild_id)
+    if quota_message is not None:
+        await interaction.response.send_message(quota_message, ephemeral=True)
+        return
+    if jobQueue is not None:
+        # ジョブキューは永続化されていてワーカーが実行するため、停止処理中でも登録してよい
+        async with shutdownCoordinator.track(command, interaction):
+            await enqueue_interaction(jobQueue, interaction, command, **arguments)
+        return
+    if shutdownCoordinator.is_draining:
+        metrics.increment("shutdown.rejected")
+        await interaction.response.send_message(Constants.bot_draining_message, ephemeral=True)
+        return
+    # 同じユーザーが同じ内容のコマンドを二重に送信した場合は 2 回目を実行しない
+    submission_key = (
+        interaction.user.id,
+        command,
+        tuple(sorted((name, normalize_prompt(str(value))) for name, value in arguments.items())),
+    )
+    with telDiscordCommand.singleFlight.submission(submission_key) as is_accepted:
+        if not is_accepted:
+            await interaction.response.send_message(Constants.duplicate_command_message, ephemeral=True)
+            return
+        async with shutdownCoordinator.track(command, interaction):
+            with usage_scope(interaction.user.id, interaction.guild_id, command), \
+                    traceRecorder.trace(command, arguments):
+                # 期限を過ぎるかスレッドがアーカイブ・削除されたらコマンドを取り消す
+                outcome = await commandCancellation.run(
+                    command,
+                    getattr(telDiscordCommand, command)(interaction, **arguments),
+                    timeout=botConfig.command_timeout,
+                    channel_id=interaction.channel_id,
+                )
+            if outcome == OUTCOME_TIMED_OUT:
+                try:
+                    await telDiscordCommand.send_followup(interaction, content=Constants.command_timeout_message)
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to send timeout message for {command}: {e}")
+
+
+async def ensure_administrator(interaction: discord.Interaction) -> bool:
+    """
+    サーバ管理者か確認し、管理者でなければその旨を返信する
+    """
+    permissions = getattr(interaction.user, "guild_permissions", None)
+    if permissions is None or not permissions.administrator:
+        await interaction.response.send_message(Constants.admin_only_message, ephemeral=True)
+        return False
+    return True
+
+
+def reload_configuration(source: str) -> str:
+    """
+    設定を再読み込みする (SIGHUP と /admin-reload-config から呼ばれる)
+
+    Args:
+        source: 再読み込みのきっかけ (ログ用)
+
+    Returns:
+        str: 結果のメッセージ
+    """
+    try:
+        result = reload_config()
+    except (OSError, ValueError) as e:
+        logger.error(f"Config reload ({source}) rejected, keeping current config: {e}")
+        return f"設定が不正なため、現在の設定のまま動作します: {e}"
+    message = f"設定を再読み込みしました。変更: {', '.join(result.changed) or 'なし'}"
+    if result.restart_required:
+        message += f"\n再起動するまで反映されない設定: {', '.join(result.restart_required)}"
+    return message
+
+
+async def deliver_status_messages(payloads: list[dict]) -> str:
+    """
+    outbox に登録されたステータス通知を送信する (同じチャンネルへの通知は 1 つのメッセージにまとめる)
+
+    Returns:
+        str: 送信したメッセージのID
+    """
+    channel_id = payloads[0]["channel_id"]
+    try:
+        channel = discordClient.get_channel(channel_id) or await discordClient.fetch_channel(channel_id)
+        message = await channel.send("\n".join(payload["content"] for payload in payloads))
+    except (discord.NotFound, discord.Forbidden) as e:
+        raise PermanentDeliveryError(f"Cannot send to status channel {channel_id}: {e}") from e
+    return str(message.id)
+
+
+async def send_stop_notification():
+    """
+    停止通知を outbox に登録する (停止処理の中で 1 度だけ呼ばれ、outbox を閉じる際に送信される)
+    """
+    if status_channel is None:
+        return
+    await outbox.enqueue(KIND_STATUS_MESSAGE, {"channel_id": status_channel.id, "content": Constants.bot_stopping_message})
+
+
+# ステータス通知は outbox から送信し、送信できなかった通知は次に起動したときに送信する
+outbox.register(KIND_STATUS_MESSAGE, deliver_status_messages, batch_by="channel_id")
+
+
+# 停止時の後始末 (登録順に実行される)
+shutdownCoordinator.add_cleanup("shard monitor", shardMonitor.stop)
+shutdownCoordinator.add_cleanup("conversation store and api clients", telDiscordCommand.close)
+shutdownCoordinator.add_cleanup("metrics", metrics.log_report)
+shutdownCoordinator.add_cleanup("stop notification", send_stop_notification)
+shutdownCoordinator.add_cleanup("outbox", outbox.close)
+shutdownCoordinator.add_cleanup("discord client", discordClient.close)
+
 
 @discordClient.event
 async def on_ready():
-    global status_channel
-    
+    global status_channel, is_started
+
+    shardMonitor.start()
+    usageLedger.start()
+    traceRecorder.start()
+    outbox.start(discordClient)
+    if is_started:
+        return
+    is_started = True
+
+    # シャードを複数プロセスで動かしている場合、通知と同期はシャード 0 のプロセスのみ行う
+    if not botConfig.is_primary_process:
+        return
+
     # # ステータス通知チャンネルの取得
     if botConfig.status_channel_id:
         try:
@@ -31,19 +210,90 @@ async def on_ready():
             status_channel = discordClient.get_channel(channel_id)
             # 起動通知の送信
             if status_channel:
-                await status_channel.send(Constants.bot_started_message)
+                await outbox.enqueue(
+                    KIND_STATUS_MESSAGE, {"channel_id": channel_id, "content": Constants.bot_started_message}
+                )
             else:
                 print(f"Warning: Could not find status channel with ID {channel_id}")
         except ValueError:
             print(f"Error: Invalid status channel ID format: {botConfig.status_channel_id}")
         except Exception as e:
             print(f"Error sending status notification: {str(e)}")
-    await discordCommand.sync()
+
+    # スキーマが変わっている場合のみコマンドを同期する
+    await sync_commands(
+        discordCommand,
+        state_path=botConfig.command_sync_state_path,
+        dev_guild_id=botConfig.dev_guild_id,
+        force=botConfig.force_command_sync,
+    )
+    logger.info(f"Bot started in {time.perf_counter() - process_started_at:.2f}s")
 
 
 @discordClient.event
 async def on_message(message: discord.Message):
-    await telDiscordCommand.on_message(message)
+    shardMonitor.record_event(message.guild.id if message.guild else None)
+    if shutdownCoordinator.is_draining:
+        return
+    async with shutdownCoordinator.track("on_message"):
+        with usage_scope(message.author.id, message.guild.id if message.guild else None, "on_message"):
+            # 元のメッセージが削除されたら返信を生成する必要はないため取り消す
+            outcome = await commandCancellation.run(
+                "on_message",
+                telDiscordCommand.on_message(message),
+                timeout=botConfig.command_timeout,
+                message_id=message.id,
+                channel_id=message.channel.id,
+            )
+        if outcome == OUTCOME_TIMED_OUT:
+            try:
+                await message.channel.send(Constants.command_timeout_message, reference=message)
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to send timeout message for message {message.id}: {e}")
+
+
+async def cancel_channel_commands(channel_id: int, reason: str):
+    """
+    スレッド (チャンネル) で実行中のコマンドと、ワーカーモードの実行待ちのジョブを取り消す
+    """
+    cancelled = commandCancellation.cancel_channel(channel_id, reason)
+    if jobQueue is not None:
+        cancelled += await asyncio.to_thread(jobQueue.cancel_channel, channel_id)
+    if cancelled:
+        logger.info(f"Cancelled {cancelled} command(s) in channel {channel_id} ({reason})")
+
+
+@discordClient.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    commandCancellation.cancel_message(payload.message_id)
+
+
+@discordClient.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    for message_id in payload.message_ids:
+        commandCancellation.cancel_message(message_id)
+
+
+@discordClient.event
+async def on_raw_thread_update(payload: discord.RawThreadUpdateEvent):
+    # アーカイブされたスレッドには返信できないため取り消す
+    if payload.data.get("thread_metadata", {}).get("archived"):
+        await cancel_channel_commands(payload.thread_id, "thread_archived")
+
+
+@discordClient.event
+async def on_raw_thread_delete(payload: discord.RawThreadDeleteEvent):
+    await cancel_channel_commands(payload.thread_id, "thread_deleted")
+
+
+@discordClient.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    await cancel_channel_commands(channel.id, "channel_deleted")
+
+
+@discordClient.event
+async def on_interaction(interaction: discord.Interaction):
+    shardMonitor.record_event(interaction.guild_id)
 
 
 # @discordClient.event
@@ -140,12 +390,20 @@ async def on_message(message: discord.Message):
 #         )
 
 
+@discordCommand.command(
+    name="ai-question-all",
+    description=f"{botConfig.discord_assistant_name} (OpenAI / Gemini / Claude) に同時に質問して回答を比較します"
+)
+async def question_all(interaction: discord.Interaction, prompt: str):
+    await run_command(interaction, "question_all", prompt=prompt)
+
+
 @discordCommand.command(
     name="ai-question-gemini",
     description=f"{botConfig.discord_assistant_name} (Gemini) に質問します"
 )
 async def gemini_question(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.gemini_question(interaction, prompt)
+    await run_command(interaction, "gemini_question", prompt=prompt)
 
 
 @discordCommand.command(
@@ -153,15 +411,16 @@ async def gemini_question(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} (Gemini) にVRChatでの開発に関して質問します"
 )
 async def gemini_question_udon(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.gemini_question_udon(interaction, prompt)
+    await run_command(interaction, "gemini_question_udon", prompt=prompt)
 
 
+# google-generativeai には Imagen のクライアントがないため、Gemini での画像生成は無効にしている
 # @discordCommand.command(
 #     name="ai-image-gemini",
 #     description=f"{botConfig.discord_assistant_name} (Gemini) で画像生成します"
 # )
-# async def openai_generate_image(interaction: discord.Interaction, prompt: str):
-#     await telDiscordCommand.gemini_generate_image(interaction, prompt)
+# async def gemini_generate_image(interaction: discord.Interaction, prompt: str):
+#     await run_command(interaction, "gemini_generate_image", prompt=prompt)
 
 
 @discordCommand.command(
@@ -169,7 +428,7 @@ async def gemini_question_udon(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} (Claude) に質問します"
 )
 async def claude_question(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.claude_question(interaction, prompt)
+    await run_command(interaction, "claude_question", prompt=prompt)
 
 
 @discordCommand.command(
@@ -177,7 +436,7 @@ async def claude_question(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} (Claude) にVRChatでの開発に関して質問します"
 )
 async def claude_question_udon(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.claude_question_udon(interaction, prompt)
+    await run_command(interaction, "claude_question_udon", prompt=prompt)
 
 
 @discordCommand.command(
@@ -185,7 +444,7 @@ async def claude_question_udon(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} に質問します"
 )
 async def openai_question(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.openai_question(interaction, prompt)
+    await run_command(interaction, "openai_question", prompt=prompt)
 
 
 @discordCommand.command(
@@ -193,7 +452,7 @@ async def openai_question(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} にVRChatでの開発に関して質問します"
 )
 async def openai_question_udon(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.openai_question_udon(interaction, prompt)
+    await run_command(interaction, "openai_question_udon", prompt=prompt)
 
 
 @discordCommand.command(
@@ -201,7 +460,7 @@ async def openai_question_udon(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} で画像生成します"
 )
 async def openai_generate_image(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.openai_generate_image(interaction, prompt)
+    await run_command(interaction, "openai_generate_image", prompt=prompt)
 
 
 # Stable Diffusion用の画像生成コマンドを追加
@@ -217,7 +476,7 @@ async def stablediffusion_generate_image(interaction: discord.Interaction, promp
         prompt: 画像生成のためのプロンプト
         negative_prompt: 生成から除外する要素を指定するネガティブプロンプト（省略可）
     """
-    await telDiscordCommand.stablediffusion_generate_image(interaction, prompt, negative_prompt)
+    await run_command(interaction, "stablediffusion_generate_image", prompt=prompt, negative_prompt=negative_prompt)
 
 
 # @discordCommand.command(
@@ -233,7 +492,7 @@ async def stablediffusion_generate_image(interaction: discord.Interaction, promp
     description=f"{botConfig.discord_assistant_name} と会話します"
 )
 async def openai_conversation(interaction: discord.Interaction, prompt: str):
-    await telDiscordCommand.openai_conversation(interaction, prompt)
+    await run_command(interaction, "openai_conversation", prompt=prompt)
 
 
 @discordCommand.command(
@@ -241,4 +500,46 @@ async def openai_conversation(interaction: discord.Interaction, prompt: str):
     description=f"{botConfig.discord_assistant_name} に関する要望を送信します"
 )
 async def git_create_issue(interaction: discord.Interaction, title: str, message: str):
-    await telDiscordCommand.git_create_issue(interaction, title, message)
+    await run_command(interaction, "git_create_issue", title=title, message=message)
+
+
+@discordCommand.command(
+    name="admin-reload-config",
+    description=f"{botConfig.discord_assistant_name} の設定を再起動せずに再読み込みします (管理者のみ)"
+)
+@app_commands.default_permissions(administrator=True)
+async def admin_reload_config(interaction: discord.Interaction):
+    if not await ensure_administrator(interaction):
+        return
+    message = reload_configuration(f"command by {interaction.user.id}")
+    await interaction.response.send_message(f"{message}\n{Constants.config_reload_scope_notice}", ephemeral=True)
+
+
+@discordCommand.command(
+    name="admin-memory",
+    description=f"{botConfig.discord_assistant_name} のメモリの確保状況を tracemalloc で調べます (管理者のみ)"
+)
+@app_commands.describe(action="snapshot: 確保量の多い箇所と前回からの増減 / start: 記録を開始 / stop: 記録を終了")
+@app_commands.choices(action=[
+    app_commands.Choice(name="snapshot", value="snapshot"),
+    app_commands.Choice(name="start", value="start"),
+    app_commands.Choice(name="stop", value="stop"),
+])
+@app_commands.default_permissions(administrator=True)
+async def admin_memory(interaction: discord.Interaction, action: str = "snapshot"):
+    if not await ensure_administrator(interaction):
+        return
+    if action == "start":
+        memoryProfiler.start()
+        await interaction.response.send_message("tracemalloc の記録を開始しました。", ephemeral=True)
+        return
+    if action == "stop":
+        memoryProfiler.stop()
+        await interaction.response.send_message("tracemalloc の記録を終了しました。", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    # スナップショットの集計は重いため、イベントループを止めないようにワーカースレッドで行う
+    report = await asyncio.to_thread(memoryProfiler.report, cache_sizes=discord_cache_sizes(discordClient))
+    file = discord.File(io.BytesIO(report.encode("utf-8")), filename=Constants.memory_report_filename)
+    preview = truncate_text(report, Constants.embed_field_value_limit)
+    await interaction.followup.send(f"```\n{preview}\n```", file=file, ephemeral=True)
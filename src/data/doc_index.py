@@ -0,0 +1,344 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .conversation_compactor import estimate_tokens
+
+# インデックスファイルの形式
+#
+# [MAGIC][ヘッダーの長さ (uint32)][ヘッダー (JSON)] の後に、ヘッダーに記録したオフセットで以下のセクションが続く
+#   term_offsets: 用語の文字列の開始位置 (uint32 x (用語数 + 1))
+#   terms:        UTF-8 のバイト順に並べた用語の文字列
+#   postings_at:  用語ごとのポスティングの開始位置 (uint32 x (用語数 + 1), 単位はポスティング数)
+#   postings:     (パッセージ番号 uint32, 出現回数 uint32) の並び
+#   doc_lengths:  パッセージごとのトークン数 (uint32 x パッセージ数)
+#   doc_offsets:  パッセージの JSON の開始位置 (uint64 x (パッセージ数 + 1))
+#   docs:         パッセージの JSON ({"source", "title", "text"})
+# すべて mmap した上で memoryview で参照するため、起動時にインデックス全体を読み込まない
+MAGIC = b"TGBM25\x00\x01"
+VERSION = 1
+
+# インデックスに含めるファイル
+MARKDOWN_EXTENSIONS = (".md", ".markdown", ".txt")
+CODE_EXTENSIONS = (".cs", ".shader", ".hlsl", ".cginc", ".compute")
+# パッセージの最大文字数と、コードを分割する行数
+MAX_PASSAGE_CHARS = 1200
+CODE_PASSAGE_LINES = 60
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+|[^\x00-\x7F\s]+")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+# 記号や助詞だけの日本語は検索に使わない
+JAPANESE_PUNCTUATION = set("、。・「」『』（）()？！：；ー〜…　")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    BM25 の用語に分割する
+
+    英数字は小文字にし、UdonSharpBehaviour のような識別子はそのままの形に加えて
+    udon / sharp / behaviour にも分ける。日本語は分かち書きせず、2 文字ずつの bigram にする。
+    """
+    tokens: list[str] = []
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if word.isascii():
+            tokens.append(word.lower())
+            parts = CAMEL_CASE_PATTERN.findall(word)
+            if len(parts) > 1:
+                tokens.extend(part.lower() for part in parts)
+            continue
+        characters = [character for character in word if character not in JAPANESE_PUNCTUATION]
+        if len(characters) == 1:
+            tokens.append(characters[0])
+        tokens.extend(a + b for a, b in zip(characters, characters[1:]))
+    return tokens
+
+
+@dataclass
+class Passage:
+    """
+    検索の単位になるドキュメントの一部
+    """
+    source: str  # ドキュメントのディレクトリからの相対パス
+    title: str  # 見出し
+    text: str
+
+
+def split_markdown(source: str, text: str) -> Iterator[Passage]:
+    """
+    Markdown を見出しごとに分け、長いセクションは段落の区切りで MAX_PASSAGE_CHARS 以下に分ける
+    """
+    headings: list[str] = []
+    lines: list[str] = []
+    in_code = False
+
+    def flush() -> Iterator[Passage]:
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if not body:
+            return
+        title = " > ".join(headings) or os.path.basename(source)
+        chunk = ""
+        for paragraph in body.split("\n\n"):
+            if chunk and len(chunk) + len(paragraph) > MAX_PASSAGE_CHARS:
+                yield Passage(source, title, chunk.strip())
+                chunk = ""
+            chunk += paragraph + "\n\n"
+        if chunk.strip():
+            yield Passage(source, title, chunk.strip())
+
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        heading = None if in_code else HEADING_PATTERN.match(line)
+        if heading is None:
+            lines.append(line)
+            continue
+        yield from flush()
+        level = len(heading.group(1))
+        headings = headings[:level - 1] + [heading.group(2).strip()]
+    yield from flush()
+
+
+def split_code(source: str, text: str) -> Iterator[Passage]:
+    """
+    コードを CODE_PASSAGE_LINES 行ずつに分ける
+    """
+    lines = text.splitlines()
+    for start in range(0, len(lines), CODE_PASSAGE_LINES):
+        chunk = "\n".join(lines[start:start + CODE_PASSAGE_LINES]).strip()
+        if chunk:
+            end = min(start + CODE_PASSAGE_LINES, len(lines))
+            yield Passage(source, f"{os.path.basename(source)} L{start + 1}-{end}", chunk)
+
+
+def collect_passages(directory: str) -> list[Passage]:
+    """
+    ディレクトリ以下の Markdown とコードをパッセージに分ける (パスの順)
+    """
+    passages: list[Passage] = []
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, directory).replace(os.sep, "/")
+            extension = os.path.splitext(name)[1].lower()
+            if extension not in MARKDOWN_EXTENSIONS + CODE_EXTENSIONS:
+                continue
+            with open(path, encoding="utf-8", errors="replace") as file:
+                text = file.read()
+            split = split_markdown if extension in MARKDOWN_EXTENSIONS else split_code
+            passages.extend(split(source, text))
+    return passages
+
+
+def build_index(directory: str, path: str, k1: float = 1.2, b: float = 0.75) -> int:
+    """
+    ドキュメントのディレクトリから BM25 のインデックスファイルを作成する (オフラインで実行する)
+
+    Args:
+        directory: Markdown とコードのディレクトリ
+        path: 出力するインデックスファイル (一時ファイルに書き込んでから置き換える)
+        k1: BM25 の出現回数の飽和パラメータ
+        b: BM25 の文書長の正規化パラメータ
+
+    Returns:
+        int: インデックスに含めたパッセージ数
+    """
+    passages = collect_passages(directory)
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    doc_lengths: list[int] = []
+    for doc_id, passage in enumerate(passages):
+        tokens = tokenize(f"{passage.title}\n{passage.text}")
+        doc_lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            postings[term].append((doc_id, count))
+
+    terms = sorted(postings, key=lambda term: term.encode("utf-8"))
+    term_blob = bytearray()
+    term_offsets = [0]
+    postings_at = [0]
+    posting_values: list[int] = []
+    for term in terms:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        for doc_id, count in postings[term]:
+            posting_values.extend((doc_id, count))
+        postings_at.append(len(posting_values) // 2)
+
+    doc_blob = bytearray()
+    doc_offsets = [0]
+    for passage in passages:
+        doc_blob += json.dumps(
+            {"source": passage.source, "title": passage.title, "text": passage.text},
+            ensure_ascii=False
+        ).encode("utf-8")
+        doc_offsets.append(len(doc_blob))
+
+    sections = [
+        ("term_offsets", struct.pack(f"<{len(term_offsets)}I", *term_offsets)),
+        ("terms", bytes(term_blob)),
+        ("postings_at", struct.pack(f"<{len(postings_at)}I", *postings_at)),
+        ("postings", struct.pack(f"<{len(posting_values)}I", *posting_values)),
+        ("doc_lengths", struct.pack(f"<{len(doc_lengths)}I", *doc_lengths)),
+        ("doc_offsets", struct.pack(f"<{len(doc_offsets)}Q", *doc_offsets)),
+        ("docs", bytes(doc_blob)),
+    ]
+    header = {
+        "version": VERSION,
+        "k1": k1,
+        "b": b,
+        "doc_count": len(passages),
+        "term_count": len(terms),
+        "average_length": sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0,
+        "sections": {},
+    }
+    # セクションの位置はヘッダーの長さに依存するため、オフセットを決めてからヘッダーを確定する
+    header_size = 0
+    while True:
+        position = len(MAGIC) + 4 + header_size
+        for name, data in sections:
+            # uint64 の配列を揃えるため 8 バイト境界に配置する
+            position += -position % 8
+            header["sections"][name] = [position, len(data)]
+            position += len(data)
+        encoded = json.dumps(header).encode("utf-8")
+        if len(encoded) == header_size:
+            break
+        header_size = len(encoded)
+
+    directory_name = os.path.dirname(path)
+    if directory_name:
+        os.makedirs(directory_name, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory_name or ".", suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(MAGIC + struct.pack("<I", header_size) + encoded)
+        for name, data in sections:
+            file.write(b"\0" * (header["sections"][name][0] - file.tell()))
+            file.write(data)
+    os.replace(temporary_path, path)
+    return len(passages)
+
+
+@dataclass
+class SearchResult:
+    score: float
+    passage: Passage
+
+
+class DocIndex:
+    """
+    build_index で作成した BM25 のインデックスを mmap して検索する
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+        if view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a document index")
+        header_size = struct.unpack_from("<I", self._mmap, len(MAGIC))[0]
+        header = json.loads(bytes(view[len(MAGIC) + 4:len(MAGIC) + 4 + header_size]))
+        if header["version"] != VERSION:
+            self.close()
+            raise ValueError(f"{path} has unsupported version {header['version']}")
+        self.k1: float = header["k1"]
+        self.b: float = header["b"]
+        self.doc_count: int = header["doc_count"]
+        self.term_count: int = header["term_count"]
+        self.average_length: float = header["average_length"] or 1.0
+
+        def section(name: str, item_format: Optional[str] = None) -> memoryview:
+            offset, size = header["sections"][name]
+            data = view[offset:offset + size]
+            return data.cast(item_format) if item_format else data
+
+        self._term_offsets = section("term_offsets", "I")
+        self._terms = section("terms")
+        self._postings_at = section("postings_at", "I")
+        self._postings = section("postings", "I")
+        self._doc_lengths = section("doc_lengths", "I")
+        self._doc_offsets = section("doc_offsets", "Q")
+        self._docs = section("docs")
+
+    def close(self):
+        # mmap を閉じる前に、参照しているすべての memoryview を解放する
+        for name in ("_term_offsets", "_terms", "_postings_at", "_postings", "_doc_lengths", "_doc_offsets", "_docs",
+                     "_view"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def _term(self, index: int) -> bytes:
+        return bytes(self._terms[self._term_offsets[index]:self._term_offsets[index + 1]])
+
+    def _find(self, term: str) -> Optional[int]:
+        # 用語は UTF-8 のバイト順に並んでいるため二分探索できる
+        target = term.encode("utf-8")
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.term_count and self._term(low) == target else None
+
+    def passage(self, doc_id: int) -> Passage:
+        record = json.loads(bytes(self._docs[self._doc_offsets[doc_id]:self._doc_offsets[doc_id + 1]]))
+        return Passage(record["source"], record["title"], record["text"])
+
+    def search(self, query: str, top_k: int = 4) -> list[SearchResult]:
+        """
+        BM25 のスコアが高い順にパッセージを返す
+
+        Args:
+            query: 質問内容
+            top_k: 返すパッセージの最大数
+
+        Returns:
+            list[SearchResult]: スコアの高い順 (一致する用語がない場合は空)
+        """
+        scores: dict[int, float] = defaultdict(float)
+        for term, query_count in Counter(tokenize(query)).items():
+            index = self._find(term)
+            if index is None:
+                continue
+            start, end = self._postings_at[index], self._postings_at[index + 1]
+            document_frequency = end - start
+            idf = math.log(1 + (self.doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            postings = self._postings[start * 2:end * 2]
+            for position in range(0, len(postings), 2):
+                doc_id, count = postings[position], postings[position + 1]
+                length_norm = 1 - self.b + self.b * self._doc_lengths[doc_id] / self.average_length
+                scores[doc_id] += idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [SearchResult(score, self.passage(doc_id)) for doc_id, score in best]
+
+
+def select_passages(results: list[SearchResult], token_budget: int) -> list[SearchResult]:
+    """
+    スコアの高い順に、トークン数の合計が token_budget に収まるパッセージを選ぶ
+    """
+    selected: list[SearchResult] = []
+    used = 0
+    for result in results:
+        tokens = estimate_tokens(result.passage.title) + estimate_tokens(result.passage.text)
+        if used + tokens > token_budget:
+            continue
+        selected.append(result)
+        used += tokens
+    return selected
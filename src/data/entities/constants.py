@@ -5,11 +5,67 @@ class Constants:
     # AI が回答中のメッセージ
     answering_message: Final[str] = "回答中です..."
 
-    # Github Issue 作成のエンドポイント
-    create_issue_url: Final[str] = "https://api.github.com/repos/telneko/TelGPT-DiscordBot/issues"
+    # Embed の文字数制限
+    embed_title_limit: Final[int] = 256
+    embed_field_value_limit: Final[int] = 1024
+
+    # プロバイダの応答が時間内に返らなかった場合のメッセージ
+    provider_timeout_message: Final[str] = "時間内に回答が返ってきませんでした。"
+
+    # 1 日の利用上限に達した場合のメッセージ
+    user_quota_exceeded_message: Final[str] = "本日の利用上限に達しました。明日 (UTC 0 時以降) にもう一度お試しください。"
+    guild_quota_exceeded_message: Final[str] = "このサーバーの本日の利用上限に達しました。明日 (UTC 0 時以降) にもう一度お試しください。"
+
+    # 同じコマンドを二重に送信した場合のメッセージ
+    duplicate_command_message: Final[str] = "同じ内容のコマンドを実行中です。回答をお待ちください。"
+
+    # キルスイッチでプロバイダを停止している場合のメッセージ
+    provider_disabled_message: Final[str] = "このコマンドで使う AI は現在停止しています。しばらくしてからお試しください。"
+
+    # 管理者用コマンドを管理者以外が実行した場合のメッセージ
+    admin_only_message: Final[str] = "このコマンドはサーバ管理者のみ使用できます。"
+    # /admin-reload-config は受け取ったプロセスの設定だけを再読み込みする
+    config_reload_scope_notice: Final[str] = (
+        "このプロセスの設定だけを再読み込みしました。ワーカーや他のシャードには、"
+        "worker.py / shard_launcher.py に SIGHUP を送って反映してください。"
+    )
+
+    # 長い回答を添付ファイルで送信する際のファイル名とメッセージ
+    long_answer_filename: Final[str] = "answer.md"
+    long_answer_notice: Final[str] = "回答が長いため、全文を添付ファイルで送信しました。"
+
+    # メモリの調査レポートのファイル名
+    memory_report_filename: Final[str] = "memory_report.txt"
+
+    # 画像の再生成で受け付ける添付画像
+    image_attachment_content_types: Final[frozenset[str]] = frozenset({"image/png", "image/jpeg", "image/webp"})
+    image_attachment_max_bytes: Final[int] = 20 * 1024 * 1024
+    # 生成した画像の添付ファイル名
+    generated_image_filename: Final[str] = "generated_image.png"
+
+    # スレッド名の文字数制限
+    thread_name_limit: Final[int] = 100
+    # 1 つのメッセージに付けられる Embed の上限
+    embed_count_limit: Final[int] = 10
+
+    # Github Issue を作成するリポジトリ
+    github_repository: Final[str] = "telneko/TelGPT-DiscordBot"
+    # Issue の作成を待っている間と作成後のメッセージ ({result} は Issue の URL, {error} はエラー)
+    issue_preview_limit: Final[int] = 1500
+    issue_queued_message: Final[str] = "Issueを送信しています..."
+    issue_created_message: Final[str] = "Issueを作成しました: {result}"
+    issue_failed_message: Final[str] = "Issueを作成できませんでした: {error}"
+    issue_duplicate_message: Final[str] = "同じ内容のIssueを送信済みです。"
+
+    # コマンドが期限 (TEL_GPT_COMMAND_TIMEOUT) までに終わらなかった場合のメッセージ
+    command_timeout_message: Final[str] = "時間内に処理が完了しなかったため、中断しました。もう一度お試しください。"
     
     # ボットのステータス通知メッセージ
     bot_started_message: Final[str] = "🟢 TelGPT Bot が起動しました"
     bot_stopping_message: Final[str] = "🔴 TelGPT Bot を停止しています..."
     bot_reconnecting_message: Final[str] = "🟡 TelGPT Bot の接続が切断されました。再接続します..."
     bot_resumed_message: Final[str] = "🟢 TelGPT Bot の接続が復旧しました"
+
+    # 停止処理中のメッセージ
+    bot_draining_message: Final[str] = "TelGPT Bot は再起動中のため、新しいコマンドを受け付けていません。しばらくしてからもう一度お試しください。"
+    bot_draining_in_flight_message: Final[str] = "⏳ TelGPT Bot を再起動します。この回答が完了してから停止します。"
@@ -11,3 +11,20 @@ class Message:
 class CachedError:
     message: str
     translated_message: str
+
+
+@dataclass
+class Usage:
+    """
+    プロバイダの呼び出し 1 回あたりの使用量
+
+    prompt_tokens にはキャッシュから読み込まれたトークン (cached_tokens) も含む
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    images: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class ModelTier(Enum):
+    """
+    質問の難しさに応じて使い分けるモデルの階層
+    """
+    # 短い質問向けの高速なモデル
+    FAST = "fast"
+    # 難しい質問向けのフラッグシップモデル
+    FLAGSHIP = "flagship"
@@ -6,4 +6,5 @@ class OpenAIChatModel(Enum):
     OpenAI の対話モデルデータ
     """
     GPT_4_O = "gpt-4o"
+    GPT_4_O_MINI = "gpt-4o-mini"
     GPT_4_1 = "gpt-4.1"
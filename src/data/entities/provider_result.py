@@ -0,0 +1,85 @@
+import functools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Union
+
+from .entity import Usage
+
+
+@dataclass(slots=True)
+class ProviderError:
+    """
+    プロバイダの呼び出しのエラー
+    """
+    code: Union[int, str]
+    message: str
+
+
+@dataclass(slots=True)
+class ProviderTimings:
+    """
+    プロバイダの呼び出しにかかった時間 (秒)
+
+    queued: 呼び出しが実行されるまで待った時間 (スレッドプールの空き待ちなど)
+    total: 呼び出しの開始から結果を受け取るまでの時間
+    """
+    queued: float = 0.0
+    total: float = 0.0
+
+
+@dataclass(slots=True)
+class ProviderResult:
+    """
+    API クラスが返す呼び出し結果 (src/data と src/infrastructure の API クラスで共通)
+
+    payload に回答 (文字列) や画像の情報 (辞書) を、失敗した場合は error を持つ。
+    """
+    payload: Any = None
+    error: Optional[ProviderError] = None
+    usage: Usage = field(default_factory=Usage)
+    timings: ProviderTimings = field(default_factory=ProviderTimings)
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    # キャッシュから返した結果か
+    cache_hit: bool = False
+    # 実行中の同じリクエストの結果を共有したか
+    coalesced: bool = False
+
+    @classmethod
+    def success(cls, payload: Any, **kwargs: Any) -> "ProviderResult":
+        return cls(payload=payload, **kwargs)
+
+    @classmethod
+    def failure(cls, code: Union[int, str], message: str, **kwargs: Any) -> "ProviderResult":
+        return cls(error=ProviderError(code=code, message=message), **kwargs)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# 計測した呼び出し結果を受け取る関数 (トレースの記録などで登録する)
+result_observers: list[Callable[[ProviderResult], None]] = []
+
+
+def notify_result(result: ProviderResult):
+    """
+    呼び出し結果を result_observers に通知する
+    """
+    for observer in result_observers:
+        observer(result)
+
+
+def measure_total(func: Callable[..., ProviderResult]) -> Callable[..., ProviderResult]:
+    """
+    ProviderResult を返す API クラスのメソッドの実行時間を timings.total に記録し、結果を通知する
+    """
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> ProviderResult:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        if isinstance(result, ProviderResult):
+            result.timings.total = time.perf_counter() - start
+            notify_result(result)
+        return result
+    return wrapper
@@ -55,10 +55,20 @@ class TelGPTCommand(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    async def question_all(interaction: discord.Interaction, prompt: str):
+        """
+        OpenAI / Gemini / Claude に同時に質問し、回答を並べて表示する
+        :param interaction: Discord の Interaction オブジェクト
+        :param prompt: 質問の内容
+        :return: None
+        """
+        pass
+
     @abstractmethod
     async def openai_generate_image(interaction: discord.Interaction, prompt: str):
         """
-        OpenAI を使って画像を生成する
+        OpenAI を使って画像を生成する. 失敗した場合は他のプロバイダで生成する
         :param interaction: Discord の Interaction オブジェクト
         :param prompt: 画像の内容
         :return: None
@@ -1,7 +1,12 @@
 import google.generativeai as gemini_api
 
 from .configs import botConfig
+from .deadline import provider_timeout
+from .entities.entity import Usage
 from .entities.gemini_model import GeminiChatModel, GeminiImageModel
+from .entities.provider_result import ProviderResult, measure_total
+from .model_router import PROVIDER_GEMINI
+from .usage_ledger import token_count, usageLedger
 
 
 # noinspection PyMethodMayBeStatic
@@ -10,45 +15,45 @@ class GeminiAPI:
     gemini_api: gemini_api
 
     def __init__(self):
-        # Gemini API の設定
-        gemini_api.configure(api_key=botConfig.gemini_api_key)
+        # Gemini API の設定 (接続先を変更する場合は gRPC ではなく REST で接続する)
+        if botConfig.gemini_base_url:
+            gemini_api.configure(
+                api_key=botConfig.gemini_api_key,
+                transport="rest",
+                client_options={"api_endpoint": botConfig.gemini_base_url},
+            )
+        else:
+            gemini_api.configure(api_key=botConfig.gemini_api_key)
         self.gemini_api = gemini_api
 
-    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> dict:
+    @measure_total
+    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> ProviderResult:
         try:
-            model = self.gemini_api.GenerativeModel(
+            generative_model = self.gemini_api.GenerativeModel(
                 model_name=model.value,
                 system_instruction=[
                     "Your response should be in Japanese.",
                     system_setting,
                 ]
             )
-            response = model.generate_content(prompt)
-            return {"response": response.text}
-        except Exception as e:
-            return {"error": {"code": 1, "message": f"Gemini API Error: {e}"}}
-
-    def generate_image(self, model: GeminiImageModel, prompt: str) -> dict:
-        try:
-            imagen = gemini_api.ImageGenerationModel(model.value)
-            response = imagen.generate_images(
-                prompt=prompt,
-                number_of_images=1,
-                aspect_ratio="1:1",
+            response = generative_model.generate_content(prompt, request_options={"timeout": provider_timeout()})
+            metadata = getattr(response, "usage_metadata", None)
+            usage = Usage(
+                prompt_tokens=token_count(getattr(metadata, "prompt_token_count", None)),
+                completion_tokens=token_count(getattr(metadata, "candidates_token_count", None)),
+                cached_tokens=token_count(getattr(metadata, "cached_content_token_count", None)),
             )
-            image = response.images.pop(0)
-
-            # image.png として保存
-            image.save("image.png")
-
-            return {
-                "response": {
-                }
-            }
+            usageLedger.record(PROVIDER_GEMINI, model, usage)
+            return ProviderResult.success(response.text, usage=usage, provider=PROVIDER_GEMINI, model=model.value)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Gemini API Error: {e}", provider=PROVIDER_GEMINI, model=model.value)
+
+    @measure_total
+    def generate_image(self, model: GeminiImageModel, prompt: str) -> ProviderResult:
+        # google-generativeai には Imagen のクライアント (ImageGenerationModel) がないため、呼び出さずに失敗させる
+        return ProviderResult.failure(
+            1,
+            "Imagen is not supported by the installed google-generativeai SDK",
+            provider=PROVIDER_GEMINI,
+            model=model.value,
+        )
@@ -3,7 +3,9 @@ import json
 import requests
 
 from .configs import botConfig
+from .deadline import provider_timeout
 from .entities.constants import Constants
+from .entities.provider_result import ProviderResult, measure_total
 
 
 # noinspection PyMethodMayBeStatic
@@ -11,10 +13,11 @@ class GithubAPI:
     def __init__(self):
         pass
 
-    def create_issue(self, author: str, title: str, message: str) -> dict:
+    @measure_total
+    def create_issue(self, author: str, title: str, message: str) -> ProviderResult:
         try:
             response = requests.post(
-                Constants.create_issue_url,
+                f"{botConfig.github_api_base_url}/repos/{Constants.github_repository}/issues",
                 headers={
                     'Authorization': f'token {botConfig.github_pat} ',
                     'Content-Type': 'application/json',
@@ -22,15 +25,15 @@ class GithubAPI:
                 data=json.dumps({
                     "title": f"{title} by {author}",
                     "body": message
-                })
+                }),
+                timeout=provider_timeout(),
             )
-            return {
-                "response": response.json()['html_url']
-            }
+            if not response.ok:
+                return ProviderResult.failure(
+                    response.status_code,
+                    f"GitHub API error: {response.status_code} {response.text}",
+                    provider="github",
+                )
+            return ProviderResult.success(response.json()['html_url'], provider="github")
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider="github")
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+@dataclass
+class ImageLineage:
+    """
+    Bot が送信した画像の生成履歴
+
+    prompts は最初のプロンプトと、その後の再生成の要求を古い順に並べたもの
+    """
+    message_id: int
+    prompts: list[str]
+    revised_prompt: Optional[str] = None  # プロバイダが書き換えたプロンプト
+    seed: Optional[int] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def original_prompt(self) -> str:
+        return self.prompts[0]
+
+    def revise(
+        self,
+        message_id: int,
+        prompt: str,
+        revised_prompt: Optional[str] = None,
+        seed: Optional[int] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> "ImageLineage":
+        """
+        この画像を再生成した画像の履歴を作成する
+        """
+        return ImageLineage(
+            message_id=message_id,
+            prompts=[*self.prompts, prompt],
+            revised_prompt=revised_prompt,
+            seed=seed,
+            provider=provider,
+            model=model,
+        )
+
+
+class ImageLineageStore:
+    """
+    Bot のメッセージ ID から画像の生成履歴を引くストア
+
+    直近の履歴は件数を制限した LRU でメモリに持ち、path を指定した場合は SQLite (WAL) にも保存して
+    再起動後やメモリから追い出された後も参照できるようにする。
+    """
+
+    def __init__(self, capacity: int = 2048, path: Optional[str] = None, retention_days: float = 30.0):
+        self.capacity = capacity
+        self.path = path
+        self.retention_days = retention_days
+        self._cache: OrderedDict[int, ImageLineage] = OrderedDict()
+        self._write_tasks: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        if path is None:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 書き込みはワーカースレッドから行うため、同一スレッドの制約を外してロックで保護する
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_lineage (
+                message_id INTEGER PRIMARY KEY,
+                prompts TEXT NOT NULL,
+                revised_prompt TEXT,
+                seed INTEGER,
+                provider TEXT,
+                model TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "DELETE FROM image_lineage WHERE created_at < ?", (time.time() - retention_days * 86400,)
+        )
+
+    def put(self, lineage: ImageLineage):
+        """
+        画像の生成履歴を記録する. SQLite への書き込みはバックグラウンドで行われる
+        """
+        self._remember(lineage)
+        if self._connection is not None:
+            task = asyncio.create_task(asyncio.to_thread(self._write, lineage))
+            self._write_tasks.add(task)
+            task.add_done_callback(self._write_done)
+
+    async def get(self, message_id: int) -> Optional[ImageLineage]:
+        """
+        Bot のメッセージの画像の生成履歴を取得する
+
+        Args:
+            message_id: 画像を送信した Bot のメッセージ ID
+
+        Returns:
+            Optional[ImageLineage]: 記録がない場合は None
+        """
+        lineage = self._cache.get(message_id)
+        if lineage is not None:
+            self._cache.move_to_end(message_id)
+            return lineage
+        if self._connection is None:
+            return None
+        lineage = await asyncio.to_thread(self._read, message_id)
+        if lineage is not None:
+            self._remember(lineage)
+        return lineage
+
+    async def flush(self):
+        """
+        バックグラウンドの書き込みが終わるまで待つ
+        """
+        if self._write_tasks:
+            await asyncio.wait(list(self._write_tasks))
+
+    def close(self):
+        if self._connection is not None:
+            with self._lock:
+                self._connection.close()
+            self._connection = None
+
+    def _remember(self, lineage: ImageLineage):
+        self._cache[lineage.message_id] = lineage
+        self._cache.move_to_end(lineage.message_id)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def _write_done(self, task: asyncio.Task):
+        self._write_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to write image lineage: {task.exception()}")
+
+    def _write(self, lineage: ImageLineage):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO image_lineage "
+                "(message_id, prompts, revised_prompt, seed, provider, model, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    lineage.message_id,
+                    json.dumps(lineage.prompts, ensure_ascii=False),
+                    lineage.revised_prompt,
+                    lineage.seed,
+                    lineage.provider,
+                    lineage.model,
+                    lineage.created_at,
+                )
+            )
+
+    def _read(self, message_id: int) -> Optional[ImageLineage]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT prompts, revised_prompt, seed, provider, model, created_at "
+                "FROM image_lineage WHERE message_id = ?",
+                (message_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        prompts, revised_prompt, seed, provider, model, created_at = row
+        return ImageLineage(
+            message_id=message_id,
+            prompts=json.loads(prompts),
+            revised_prompt=revised_prompt,
+            seed=seed,
+            provider=provider,
+            model=model,
+            created_at=created_at,
+        )
@@ -0,0 +1,59 @@
+import io
+
+from PIL import Image, ImageOps
+
+# DALL·E の画像バリエーションが受け付ける画像の上限 (4MB 未満の正方形の PNG)
+VARIATION_MAX_BYTES = 4 * 1024 * 1024
+# バリエーションの生成サイズ (これより大きい画像は送っても縮小されるだけなので、先に縮小する)
+VARIATION_MAX_SIDE = 1024
+# 縮小を繰り返す際の最小の辺の長さ
+MIN_SIDE = 256
+
+
+class ImageNormalizeError(Exception):
+    """
+    画像を読み込めない、または上限のサイズに収まらない
+    """
+    pass
+
+
+def normalize_image(
+    data: bytes,
+    max_bytes: int = VARIATION_MAX_BYTES,
+    max_side: int = VARIATION_MAX_SIDE
+) -> bytes:
+    """
+    添付画像をプロバイダに送れる形式 (中央で正方形に切り抜いた PNG) に変換する
+
+    CPU を使う処理なので、イベントループからは asyncio.to_thread で呼び出す。
+
+    Args:
+        data: 添付画像のバイト列 (PNG / JPEG など Pillow で読める形式)
+        max_bytes: 変換後の PNG の上限のバイト数
+        max_side: 変換後の画像の辺の長さの上限
+
+    Returns:
+        bytes: 変換後の PNG のバイト列
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # スマートフォンの写真などの回転情報を反映してから切り抜く
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA")
+    except Exception as e:
+        raise ImageNormalizeError(f"画像を読み込めませんでした: {e}") from e
+
+    side = min(image.size)
+    image = ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+
+    side = min(side, max_side)
+    while True:
+        if image.width != side:
+            image = image.resize((side, side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        if buffer.tell() < max_bytes:
+            return buffer.getvalue()
+        if side <= MIN_SIDE:
+            raise ImageNormalizeError("画像のサイズが大きすぎます")
+        side = max(int(side * 0.75), MIN_SIDE)
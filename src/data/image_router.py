@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Optional
+
+from .deadline import deadline_scope
+from .entities.provider_result import ProviderResult
+from .metrics import metrics
+from .prompt_translator import PromptTranslator
+from .single_flight import SingleFlight, request_key
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# プロンプトの内容によって拒否されたことを示すエラーコード (プロバイダの障害ではないため健全性は下げない)
+REJECTION_CODES = frozenset({"content_policy_violation", 400})
+# このエラー回数続いたプロバイダは一定時間後回しにする
+FAILURE_THRESHOLD = 3
+# 計測前のプロバイダの生成時間の見積もり (秒)
+INITIAL_LATENCY_SECONDS = 15.0
+
+
+@dataclass
+class ImageProvider:
+    """
+    画像生成のプロバイダ
+
+    generate は model, prompt (と negative_prompt) を受け取り、payload に
+    {"image": PNG などの画像のバイト列, "prompt": 実際に使われたプロンプト, "seed": シード} を持つ
+    ProviderResult を返す同期関数
+    """
+    name: str
+    model: Enum
+    generate: Callable[..., ProviderResult]
+    # 英語のプロンプトが必要なプロバイダ (Stable Diffusion など)
+    needs_english_prompt: bool = False
+    accepts_negative_prompt: bool = False
+
+
+@dataclass
+class ProviderHealth:
+    """
+    プロバイダの直近のエラーと生成時間
+    """
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+    latency: float = INITIAL_LATENCY_SECONDS
+
+    def is_healthy(self, now: float) -> bool:
+        return self.unhealthy_until <= now
+
+
+def is_rejection(result: ProviderResult) -> bool:
+    """
+    プロンプトの内容 (コンテンツポリシーなど) によって拒否されたエラーか
+    """
+    return not result.ok and result.error.code in REJECTION_CODES
+
+
+class ImageRouter:
+    """
+    画像生成を複数のプロバイダに振り分け、失敗した場合は次のプロバイダで生成し直す
+
+    1. 指定されたプロバイダを最初に、残りは直近の生成時間が短い順に試す
+    2. 障害やタイムアウトが FAILURE_THRESHOLD 回続いたプロバイダは cooldown 秒の間後回しにする
+    3. コンテンツポリシーなどで拒否された場合は、健全性は下げずに次のプロバイダで生成する
+    """
+
+    def __init__(
+        self,
+        providers: list[ImageProvider],
+        single_flight: SingleFlight,
+        prompt_translator: Optional[PromptTranslator] = None,
+        timeout: float = 60.0,
+        cooldown: float = 60.0
+    ):
+        self.providers = {provider.name: provider for provider in providers}
+        self.single_flight = single_flight
+        self.prompt_translator = prompt_translator
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.health = {provider.name: ProviderHealth() for provider in providers}
+
+    def configure(self, providers: list[ImageProvider], timeout: float, cooldown: float):
+        """
+        プロバイダと設定を差し替える (設定の再読み込み用). 残ったプロバイダの健全性は引き継ぐ
+        """
+        self.health = {provider.name: self.health.get(provider.name, ProviderHealth()) for provider in providers}
+        self.providers = {provider.name: provider for provider in providers}
+        self.timeout = timeout
+        self.cooldown = cooldown
+
+    def candidates(self, preferred: Optional[str] = None) -> list[ImageProvider]:
+        """
+        試すプロバイダの順番
+        """
+        now = time.monotonic()
+
+        def sort_key(provider: ImageProvider):
+            health = self.health[provider.name]
+            return not health.is_healthy(now), provider.name != preferred, health.latency
+
+        return sorted(self.providers.values(), key=sort_key)
+
+    async def generate(
+        self,
+        prompt: str,
+        preferred: Optional[str] = None,
+        negative_prompt: Optional[str] = None
+    ) -> ProviderResult:
+        """
+        画像を生成する. 失敗した場合は次のプロバイダで生成し直す
+
+        Args:
+            prompt: 画像生成のプロンプト
+            preferred: 最初に試すプロバイダ名
+            negative_prompt: ネガティブプロンプト (対応するプロバイダのみ使う)
+
+        Returns:
+            ProviderResult: 最初に成功したプロバイダの結果. すべて失敗した場合は最後のエラー
+        """
+        result = ProviderResult.failure(1, "画像生成のプロバイダが設定されていません")
+        previous: Optional[str] = None
+        for provider in self.candidates(preferred):
+            if previous is not None:
+                metrics.increment(f"image.failover.{previous}.{provider.name}")
+                logger.warning(f"Image generation failed on {previous}, falling over to {provider.name}")
+            result = await self._generate(provider, prompt, negative_prompt)
+            if result.ok:
+                return result
+            previous = provider.name
+        return result
+
+    async def _generate(
+        self,
+        provider: ImageProvider,
+        prompt: str,
+        negative_prompt: Optional[str]
+    ) -> ProviderResult:
+        if provider.needs_english_prompt and self.prompt_translator is not None:
+            translated = await self.prompt_translator.translate(prompt)
+            if not translated.ok:
+                return translated
+            prompt = translated.payload
+
+        kwargs = {}
+        if provider.accepts_negative_prompt and negative_prompt:
+            kwargs["negative_prompt"] = negative_prompt
+        start = time.perf_counter()
+        try:
+            # プロバイダの HTTP リクエストも同じ時間で打ち切り、次のプロバイダに切り替えた後に残らないようにする
+            with deadline_scope(self.timeout):
+                result = await asyncio.wait_for(
+                    self.single_flight.run(
+                        request_key(f"generate_image.{provider.name}", provider.model, prompt, **kwargs),
+                        provider.generate,
+                        model=provider.model,
+                        prompt=prompt,
+                        **kwargs
+                    ),
+                    timeout=self.timeout
+                )
+        except asyncio.TimeoutError:
+            result = ProviderResult.failure(
+                "timeout", f"{provider.name} の画像生成がタイムアウトしました", provider=provider.name
+            )
+        except Exception as e:
+            logger.exception(f"Image generation on {provider.name} failed: {e}")
+            result = ProviderResult.failure(1, f"{provider.name} Error: {e}", provider=provider.name)
+        elapsed = time.perf_counter() - start
+        metrics.observe(f"image.{provider.name}", elapsed)
+        self._record(provider.name, result, elapsed)
+        return result
+
+    def _record(self, name: str, result: ProviderResult, elapsed: float):
+        health = self.health.get(name)
+        if health is None:
+            # 生成中に設定の再読み込みで外されたプロバイダ
+            return
+        if result.ok:
+            health.consecutive_failures = 0
+            health.unhealthy_until = 0.0
+            health.latency = health.latency * 0.7 + elapsed * 0.3
+            return
+        kind = "rejected" if is_rejection(result) else "failed"
+        metrics.increment(f"image.{name}.{kind}")
+        if kind == "rejected":
+            return
+        health.consecutive_failures += 1
+        # タイムアウトした場合は、少なくともタイムアウトまでの時間がかかるものとして扱う
+        health.latency = max(health.latency, elapsed)
+        if health.consecutive_failures >= FAILURE_THRESHOLD:
+            health.unhealthy_until = time.monotonic() + self.cooldown
+            logger.warning(
+                f"Image provider {name} failed {health.consecutive_failures} times in a row, "
+                f"deprioritized for {self.cooldown:.0f}s"
+            )
@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# ジョブの状態
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """
+    ワーカーが実行するコマンドのジョブ
+    """
+    id: int
+    command: str
+    arguments: dict[str, Any]
+    interaction: dict[str, Any]
+    attempts: int
+    created_at: float
+
+
+class JobQueue:
+    """
+    SQLite を使った永続ジョブキュー
+
+    ゲートウェイプロセスがジョブを登録し、複数のワーカープロセスが取り出して実行する。
+    ファイルに保存されるため、コンテナを再起動してもキューに残っているジョブは失われない。
+    実行中のワーカーは renew でリースを延長し続け、リースが切れたジョブ (ワーカーが落ちた場合など) は再度取り出される。
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    command TEXT NOT NULL,
+                    arguments TEXT NOT NULL,
+                    interaction TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires_at REAL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    @contextmanager
+    def _connect(self):
+        # プロセス・スレッドをまたいで使うため、操作ごとに接続する (autocommit)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def enqueue(self, command: str, arguments: dict[str, Any], interaction: dict[str, Any]) -> int:
+        """
+        ジョブを登録する
+
+        Args:
+            command: 実行する TelDiscordCommand のメソッド名
+            arguments: コマンドの引数
+            interaction: 返信に必要なインタラクションの情報 (トークン・チャンネルIDなど)
+
+        Returns:
+            int: 登録したジョブのID
+        """
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO jobs (command, arguments, interaction, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (command, json.dumps(arguments), json.dumps(interaction), STATUS_QUEUED, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        実行待ちのジョブ (またはリースが切れた実行中のジョブ) を 1 件取り出す
+
+        Args:
+            worker: 取り出すワーカーの識別子
+
+        Returns:
+            Optional[Job]: 取り出したジョブ. 無い場合は None
+        """
+        with self._connect() as connection:
+            while True:
+                now = time.time()
+                # 複数のワーカーが同じジョブを取り出さないように書き込みロックを取る
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = connection.execute(
+                        "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                        "ORDER BY id LIMIT 1",
+                        (STATUS_QUEUED, STATUS_RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        connection.execute("COMMIT")
+                        return None
+                    if row["attempts"] >= self.max_attempts:
+                        # 何度もワーカーが落ちるジョブは諦める
+                        connection.execute(
+                            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                            (STATUS_FAILED, "max attempts exceeded", now, row["id"])
+                        )
+                        connection.execute("COMMIT")
+                        continue
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, "
+                        "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                        (STATUS_RUNNING, worker, now + self.lease_seconds, now, row["id"])
+                    )
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+                return Job(
+                    id=row["id"],
+                    command=row["command"],
+                    arguments=json.loads(row["arguments"]),
+                    interaction=json.loads(row["interaction"]),
+                    attempts=row["attempts"] + 1,
+                    created_at=row["created_at"],
+                )
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """
+        実行中のジョブのリースを延長する (長いコマンドを他のワーカーが取り出さないようにする)
+
+        Returns:
+            bool: 延長できたか. リースが切れて他のワーカーが取り出した場合は False
+        """
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (now + self.lease_seconds, now, job_id, STATUS_RUNNING, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        """
+        ジョブを完了にする
+
+        Returns:
+            bool: 更新できたか. リースが切れて他のワーカーが取り出した場合は False
+        """
+        return self._finish(job_id, worker, STATUS_DONE, None)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """
+        ジョブを失敗にする (失敗したジョブは再実行しない)
+
+        Returns:
+            bool: 更新できたか. リースが切れて他のワーカーが取り出した場合は False
+        """
+        return self._finish(job_id, worker, STATUS_FAILED, error)
+
+    def _finish(self, job_id: int, worker: str, status: str, error: Optional[str]) -> bool:
+        # 他のワーカーが実行中のジョブの状態を上書きしないように、自分が実行中の場合のみ更新する
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, error, time.time(), job_id, worker, STATUS_RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def cancel_channel(self, channel_id: int) -> int:
+        """
+        スレッド (チャンネル) が削除・アーカイブされた場合に、そこで実行待ちのジョブを取り消す
+
+        Returns:
+            int: 取り消したジョブの数
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND json_extract(interaction, '$.channel_id') = ?",
+                (STATUS_FAILED, "cancelled", time.time(), STATUS_QUEUED, channel_id)
+            )
+            return cursor.rowcount
+
+    def pending_count(self) -> int:
+        """
+        実行待ち・実行中のジョブ数
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+                (STATUS_QUEUED, STATUS_RUNNING)
+            ).fetchone()
+            return row[0]
+
+    def purge(self, older_than_seconds: float) -> int:
+        """
+        完了・失敗してから一定時間経ったジョブを削除する
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_DONE, STATUS_FAILED, time.time() - older_than_seconds)
+            )
+            return cursor.rowcount
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import signal
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+from .config_reload import config_listeners, reload_config
+from .configs import botConfig
+from .deadline import OUTCOME_TIMED_OUT, commandCancellation, is_token_expired
+from .job_queue import Job, JobQueue
+from .metrics import metrics
+from .outbox import outbox
+from .tel_discord_command import TelDiscordCommand
+from .trace_recorder import traceRecorder
+from .usage_ledger import usageLedger, usage_scope
+from .entities.constants import Constants
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# ワーカーで実行できる TelDiscordCommand のメソッド
+WORKER_COMMANDS = frozenset({
+    "gemini_question",
+    "gemini_question_udon",
+    "claude_question",
+    "claude_question_udon",
+    "openai_question",
+    "openai_question_udon",
+    "question_all",
+    "openai_generate_image",
+    "stablediffusion_generate_image",
+    "openai_conversation",
+    "git_create_issue",
+})
+
+
+async def enqueue_interaction(queue: JobQueue, interaction: discord.Interaction, command: str, **arguments: Any) -> int:
+    """
+    ゲートウェイ側の処理. インタラクションに応答 (defer) だけしてジョブを登録する
+
+    Args:
+        queue: ジョブキュー
+        interaction: Discord のインタラクション
+        command: 実行する TelDiscordCommand のメソッド名
+        arguments: コマンドの引数
+
+    Returns:
+        int: 登録したジョブのID
+    """
+    await interaction.response.defer()
+    return await asyncio.to_thread(queue.enqueue, command, arguments, {
+        "id": interaction.id,
+        "application_id": interaction.application_id,
+        "token": interaction.token,
+        "channel_id": interaction.channel_id,
+        "guild_id": interaction.guild_id,
+        "user_id": interaction.user.id,
+        "user_name": interaction.user.name,
+        "created_at": interaction.created_at.timestamp(),
+    })
+
+
+class DeferredResponse:
+    """
+    ゲートウェイで defer 済みのインタラクションの response
+    """
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+    def is_done(self) -> bool:
+        return True
+
+
+class WorkerInteraction:
+    """
+    ワーカーでコマンドを実行するための discord.Interaction の代わり
+
+    返信はインタラクションの Webhook (followup) から送信し、チャンネルは REST API で取得する
+    """
+
+    def __init__(self, client: discord.Client, data: dict[str, Any], channel: Any):
+        self.id = data["id"]
+        self.application_id = data["application_id"]
+        self.token = data["token"]
+        self.channel_id = data["channel_id"]
+        self.guild_id = data["guild_id"]
+        self.user = SimpleNamespace(id=data["user_id"], name=data["user_name"])
+        self.created_at = datetime.fromtimestamp(data["created_at"], tz=timezone.utc)
+        self.channel = channel
+        self.response = DeferredResponse()
+        self.followup = discord.Webhook.partial(self.application_id, self.token, client=client)
+
+
+async def execute_job(client: discord.Client, command: TelDiscordCommand, job: Job):
+    """
+    ジョブを TelDiscordCommand のメソッドで実行する
+    """
+    if job.command not in WORKER_COMMANDS:
+        raise ValueError(f"Unknown command: {job.command}")
+
+    channel = await client.fetch_channel(job.interaction["channel_id"])
+    if is_token_expired(job.interaction["created_at"]):
+        # トークンの期限切れで followup できないためチャンネルに通知する
+        metrics.increment("jobs.expired")
+        await channel.send(f"<@{job.interaction['user_id']}> 混み合っていたため、コマンドを実行できませんでした。もう一度お試しください。")
+        return
+
+    interaction = WorkerInteraction(client, job.interaction, channel)
+    with usage_scope(job.interaction["user_id"], job.interaction["guild_id"], job.command), \
+            traceRecorder.trace(job.command, job.arguments):
+        outcome = await commandCancellation.run(
+            job.command,
+            getattr(command, job.command)(interaction, **job.arguments),
+            timeout=botConfig.command_timeout,
+            channel_id=job.interaction["channel_id"],
+        )
+    if outcome == OUTCOME_TIMED_OUT:
+        await command.send_followup(interaction, content=Constants.command_timeout_message)
+
+
+async def renew_lease(queue: JobQueue, job: Job, worker: str, job_task: asyncio.Task):
+    """
+    ジョブの実行中、リースの 1/3 ごとにリースを延長する (キャンセルされるまで続ける)
+
+    延長できなかった場合は他のワーカーがジョブを取り出しているため、二重に返信しないように job_task を止める
+    """
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not await asyncio.to_thread(queue.renew, job.id, worker):
+            metrics.increment("jobs.lease_lost")
+            logger.warning(f"Worker {worker} lost the lease of job {job.id} ({job.command}), cancelling it")
+            job_task.cancel()
+            return
+
+
+async def run_job(queue: JobQueue, client: discord.Client, command: TelDiscordCommand, job: Job, worker: str):
+    """
+    リースを延長しながらジョブを実行し、結果をジョブキューに記録する
+    """
+    job_task = asyncio.create_task(execute_job(client, command, job))
+    # コマンドの期限はリースより長いため、実行中はリースを延長して他のワーカーが二重に実行しないようにする
+    heartbeat = asyncio.create_task(renew_lease(queue, job, worker, job_task))
+    try:
+        with metrics.timer(f"jobs.{job.command}"):
+            await job_task
+        await asyncio.to_thread(queue.complete, job.id, worker)
+    except asyncio.CancelledError:
+        lease_lost = heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None
+        if not lease_lost:
+            # ワーカー自体が停止するためのキャンセル
+            raise
+        # リースを失ったジョブは新しく取り出したワーカーに任せ、状態は更新しない
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.command}) failed: {e}")
+        await asyncio.to_thread(queue.fail, job.id, worker, str(e))
+    finally:
+        heartbeat.cancel()
+
+
+def reload_worker_config(name: str):
+    try:
+        reload_config()
+    except (OSError, ValueError) as e:
+        logger.error(f"Worker {name} rejected config reload, keeping current config: {e}")
+
+
+async def run_worker(name: str, poll_interval: float = 0.5):
+    """
+    ジョブキューからジョブを取り出して実行し続けるワーカー
+
+    ゲートウェイには接続せず、REST API と Webhook だけで返信する
+    """
+    queue = JobQueue(botConfig.job_queue_path)
+    client = discord.Client(intents=discord.Intents.none())
+    await client.login(botConfig.discord_token)
+    command = TelDiscordCommand(discord_client=client)
+    config_listeners.append(command.apply_config)
+    usageLedger.start()
+    traceRecorder.start()
+    # ワーカーで登録した Issue もワーカーから送信する (ゲートウェイと同じファイルを使う)
+    outbox.open(botConfig.outbox_path)
+    outbox.start(client)
+
+    # SIGTERM を受けたら実行中のジョブを終えてから停止する
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    # SIGHUP を受けたら設定を再読み込みする (ワーカープールから転送される)
+    loop.add_signal_handler(signal.SIGHUP, reload_worker_config, name)
+
+    logger.info(f"Worker {name} started")
+    try:
+        while not stopping.is_set():
+            job = await asyncio.to_thread(queue.claim, name)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stopping.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            metrics.observe("jobs.queued", time.time() - job.created_at)
+            await run_job(queue, client, command, job, name)
+    finally:
+        await command.close()
+        await outbox.close()
+        await client.close()
+        metrics.log_report()
+        logger.info(f"Worker {name} stopped")
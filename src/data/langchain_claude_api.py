@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import List
 
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -6,8 +6,27 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
 from .configs import botConfig
+from .deadline import provider_timeout
 from .entities.claude_model import ClaudeModel
-from .entities.entity import Message
+from .entities.entity import Message, Usage
+from .entities.provider_result import ProviderResult, measure_total
+from .model_router import PROVIDER_CLAUDE
+from .usage_ledger import token_count, usageLedger
+
+
+def to_usage(message) -> Usage:
+    """
+    Langchain のメッセージの usage_metadata を Usage に変換する
+    """
+    metadata = getattr(message, "usage_metadata", None)
+    if not isinstance(metadata, dict):
+        return Usage()
+    details = metadata.get("input_token_details") or {}
+    return Usage(
+        prompt_tokens=token_count(metadata.get("input_tokens")),
+        completion_tokens=token_count(metadata.get("output_tokens")),
+        cached_tokens=token_count(details.get("cache_read")),
+    )
 
 
 class LangchainClaudeAPI:
@@ -20,6 +39,7 @@ class LangchainClaudeAPI:
         Claude API の設定を初期化
         """
         self.api_key = botConfig.claude_api_key
+        self.base_url = botConfig.anthropic_base_url
 
     def _create_chat_model(self, model: ClaudeModel):
         """
@@ -31,13 +51,18 @@ class LangchainClaudeAPI:
         Returns:
             ChatAnthropic: 設定済みの Claude モデル
         """
+        options = {"anthropic_api_url": self.base_url} if self.base_url else {}
         return ChatAnthropic(
             anthropic_api_key=self.api_key,
             model_name=model.value,
             temperature=0.7,
+            # 実行中のコマンドの残り時間をタイムアウトにする (モデルは呼び出しごとに作成する)
+            default_request_timeout=provider_timeout(),
+            **options,
         )
 
-    def question(self, model: ClaudeModel, prompt: str, system_setting: str) -> Dict:
+    @measure_total
+    def question(self, model: ClaudeModel, prompt: str, system_setting: str) -> ProviderResult:
         """
         Claude に質問を投げる
         
@@ -47,7 +72,7 @@ class LangchainClaudeAPI:
             system_setting: システムプロンプト
         
         Returns:
-            dict: レスポンスまたはエラー情報
+            ProviderResult: レスポンスまたはエラー情報
         """
         try:
             # システムプロンプトを設定
@@ -61,24 +86,30 @@ class LangchainClaudeAPI:
                 ("human", "{input}")
             ])
             
-            # Langchain チェーンを構築
-            chain = prompt_template | chat_model | StrOutputParser()
+            # Langchain チェーンを構築 (使用量を取得するため、文字列への変換はチェーンの外で行う)
+            chain = prompt_template | chat_model
             
             # 実行
-            response = chain.invoke({"input": prompt})
+            message = chain.invoke({"input": prompt})
+            usage = to_usage(message)
+            usageLedger.record(PROVIDER_CLAUDE, model, usage)
             
-            return {
-                "response": response
-            }
+            return ProviderResult.success(
+                StrOutputParser().invoke(message),
+                usage=usage,
+                provider=PROVIDER_CLAUDE,
+                model=model.value,
+            )
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Claude API Error: {str(e)}"
-                }
-            }
+            return ProviderResult.failure(
+                1,
+                f"Claude API Error: {str(e)}",
+                provider=PROVIDER_CLAUDE,
+                model=model.value,
+            )
 
-    def conversation(self, model: ClaudeModel, prompts: List[Message]) -> Dict:
+    @measure_total
+    def conversation(self, model: ClaudeModel, prompts: List[Message]) -> ProviderResult:
         """
         会話履歴を使用して Claude と会話
         
@@ -87,7 +118,7 @@ class LangchainClaudeAPI:
             prompts: 会話履歴のメッセージリスト
         
         Returns:
-            dict: レスポンスまたはエラー情報
+            ProviderResult: レスポンスまたはエラー情報
         """
         try:
             # チャットモデル作成
@@ -108,14 +139,19 @@ class LangchainClaudeAPI:
             
             # 応答を生成
             response = chat_model.invoke(messages)
+            usage = to_usage(response)
+            usageLedger.record(PROVIDER_CLAUDE, model, usage)
             
-            return {
-                "response": response.content
-            }
+            return ProviderResult.success(
+                response.content,
+                usage=usage,
+                provider=PROVIDER_CLAUDE,
+                model=model.value,
+            )
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Claude API Error: {str(e)}"
-                }
-            }
+            return ProviderResult.failure(
+                1,
+                f"Claude API Error: {str(e)}",
+                provider=PROVIDER_CLAUDE,
+                model=model.value,
+            )
@@ -0,0 +1,123 @@
+import logging
+import resource
+import sys
+import threading
+import tracemalloc
+from typing import Optional
+
+import discord
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# レポートに含めない割り当て (計測自体と import 機構)
+IGNORED_FILES = ("<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>", tracemalloc.__file__)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def max_rss_bytes() -> int:
+    """
+    プロセスの最大 RSS (Linux は KiB, macOS はバイトで返される)
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def discord_cache_sizes(client: discord.Client) -> dict[str, int]:
+    """
+    discord.py のクライアントが保持しているキャッシュの件数
+    """
+    guilds = client.guilds
+    return {
+        "guilds": len(guilds),
+        "members": sum(len(guild.members) for guild in guilds),
+        "channels": sum(len(guild.channels) for guild in guilds),
+        "threads": sum(len(guild.threads) for guild in guilds),
+        "users": len(client.users),
+        "messages": len(client.cached_messages),
+    }
+
+
+class MemoryProfiler:
+    """
+    tracemalloc のスナップショットを取り、どこでメモリを確保しているかと前回からの増減をレポートする
+
+    トレースは start() してから確保されたメモリだけを記録する。トレース中は割り当てごとにオーバーヘッドがかかるため、
+    調査が終わったら stop() する。
+    """
+
+    def __init__(self, frames: int = 1, limit: int = 15):
+        self.frames = frames
+        self.limit = limit
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc started (frames={self.frames})")
+
+    def stop(self):
+        with self._lock:
+            self._previous = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                logger.info("tracemalloc stopped")
+
+    def report(self, group_by: str = "lineno", cache_sizes: Optional[dict[str, int]] = None) -> str:
+        """
+        スナップショットを取り、確保量の多い箇所と前回のスナップショットからの増減をレポートする
+
+        スナップショットの集計は重いため、イベントループをブロックしないよう asyncio.to_thread から呼ぶ
+
+        Args:
+            group_by: 集計の単位 ("lineno" / "filename" / "traceback")
+            cache_sizes: レポートに含める discord.py のキャッシュの件数
+
+        Returns:
+            str: レポート
+        """
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not running. Start it first."
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+            )
+            previous, self._previous = self._previous, snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"traced: {format_bytes(current)} (peak {format_bytes(peak)}), max RSS: {format_bytes(max_rss_bytes())}",
+        ]
+        if cache_sizes:
+            lines.append("discord cache: " + ", ".join(f"{name}={size}" for name, size in cache_sizes.items()))
+
+        lines.append("")
+        lines.append(f"Top {self.limit} allocations by {group_by}:")
+        for stat in snapshot.statistics(group_by)[:self.limit]:
+            lines.append(f"{format_bytes(stat.size):>11} {stat.count:>8} blocks  {stat.traceback.format()[0].strip()}")
+
+        if previous is not None:
+            lines.append("")
+            lines.append(f"Top {self.limit} changes since the previous snapshot:")
+            for stat in snapshot.compare_to(previous, group_by)[:self.limit]:
+                lines.append(
+                    f"{format_bytes(stat.size_diff):>11} {stat.count_diff:>+8} blocks  "
+                    f"{stat.traceback.format()[0].strip()}"
+                )
+        return "\n".join(lines)
+
+
+# プロセス全体で共有するメモリの計測
+memoryProfiler = MemoryProfiler()
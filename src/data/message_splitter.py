@@ -0,0 +1,166 @@
+import re
+
+# コードブロックの開始・終了 (``` または ~~~)
+FENCE_PATTERN = re.compile(r"^[ \t]*(`{3,}|~{3,})")
+# 見出し行
+HEADING_PATTERN = re.compile(r"^[ \t]*#{1,6}[ \t]")
+# 長い行を分割する際に優先する区切り文字
+SOFT_BREAK_CHARACTERS = (" ", "\t", "。", "、", "，", "．", ",", ".", ";")
+
+
+def _split_blocks(text: str) -> list[str]:
+    """
+    Markdown を段落・見出し・コードブロック単位のブロックに分割する
+
+    Args:
+        text: 分割する Markdown テキスト
+
+    Returns:
+        list[str]: 改行を含んだままのブロックのリスト
+    """
+    blocks: list[str] = []
+    current: list[str] = []
+    fence: str | None = None
+
+    def flush():
+        if current:
+            blocks.append("".join(current))
+            current.clear()
+
+    for line in text.splitlines(keepends=True):
+        match = FENCE_PATTERN.match(line)
+        if fence is not None:
+            current.append(line)
+            # 開始と同じ文字で同じ長さ以上のフェンスのみで構成された行が終了
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) \
+                    and line.strip() == match.group(1):
+                fence = None
+                flush()
+        elif match:
+            flush()
+            fence = match.group(1)
+            current.append(line)
+        elif line.strip() == "":
+            current.append(line)
+            flush()
+        elif HEADING_PATTERN.match(line):
+            flush()
+            current.append(line)
+        else:
+            current.append(line)
+    # 閉じられていないコードブロックは末尾で閉じる
+    if fence is not None:
+        if not current[-1].endswith("\n"):
+            current.append("\n")
+        current.append(fence + "\n")
+    flush()
+    return blocks
+
+
+def _split_long_line(line: str, limit: int) -> list[str]:
+    """
+    limit を超える 1 行を、可能な限り空白や句読点の位置で分割する
+    """
+    pieces: list[str] = []
+    while len(line) > limit:
+        cut = -1
+        for character in SOFT_BREAK_CHARACTERS:
+            cut = max(cut, line.rfind(character, limit // 2, limit))
+        cut = cut + 1 if cut >= 0 else limit
+        pieces.append(line[:cut])
+        line = line[cut:]
+    if line:
+        pieces.append(line)
+    return pieces
+
+
+def _pack_lines(lines: list[str], limit: int) -> list[str]:
+    """
+    行の境界を保ったまま limit 文字以内のかたまりに詰める
+    """
+    pieces: list[str] = []
+    buffer = ""
+    for line in lines:
+        for part in _split_long_line(line, limit):
+            if len(buffer) + len(part) > limit:
+                pieces.append(buffer)
+                buffer = ""
+            buffer += part
+    if buffer:
+        pieces.append(buffer)
+    return pieces
+
+
+def _split_fenced_block(block: str, limit: int) -> list[str]:
+    """
+    コードブロックを分割し、各かたまりでフェンスを閉じて次のかたまりで開き直す
+    """
+    lines = block.splitlines(keepends=True)
+    opener = lines[0] if lines[0].endswith("\n") else lines[0] + "\n"
+    fence = FENCE_PATTERN.match(opener).group(1)
+    closer = fence + "\n"
+    body = lines[1:]
+    # 元のブロックの終了フェンスは各かたまりで付け直す
+    if body and body[-1].strip() == fence:
+        body = body[:-1]
+
+    budget = max(limit - len(opener) - len(closer), 1)
+    return [opener + piece + ("" if piece.endswith("\n") else "\n") + closer
+            for piece in _pack_lines(body, budget)]
+
+
+def split_markdown_message(message: str, limit: int = 1800) -> list[str]:
+    """
+    Markdown の構造と行の境界を考慮してメッセージを limit 文字以内に分割する
+
+    段落・見出し・コードブロックの単位で詰め込み、それでも収まらない場合は行単位で分割する。
+    コードブロックが分割される場合は、かたまりごとにフェンスを閉じて次のかたまりで開き直す。
+
+    Args:
+        message: 分割するメッセージ
+        limit: 1 メッセージあたりの最大文字数
+
+    Returns:
+        list[str]: 分割されたメッセージのリスト
+    """
+    if len(message) <= limit:
+        return [message]
+
+    chunks: list[str] = []
+    buffer = ""
+    for block in _split_blocks(message):
+        if len(buffer) + len(block) <= limit:
+            buffer += block
+            continue
+        if buffer:
+            chunks.append(buffer)
+            buffer = ""
+        if len(block) <= limit:
+            buffer = block
+            continue
+        if FENCE_PATTERN.match(block):
+            pieces = _split_fenced_block(block, limit)
+        else:
+            pieces = _pack_lines(block.splitlines(keepends=True), limit)
+        chunks.extend(pieces[:-1])
+        buffer = pieces[-1]
+    if buffer:
+        chunks.append(buffer)
+
+    # 前後の改行だけになったかたまりは送信しない
+    chunks = [chunk.strip("\n") for chunk in chunks]
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def build_preview(message: str, limit: int) -> str:
+    """
+    添付ファイルとして送信する長い回答のプレビューを作成する
+
+    Args:
+        message: 元のメッセージ
+        limit: プレビューの最大文字数
+
+    Returns:
+        str: コードブロックが閉じられた状態の先頭部分
+    """
+    return split_markdown_message(message, limit)[0]
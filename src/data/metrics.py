@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+@dataclass
+class LatencySummary:
+    """
+    レイテンシの集計値 (件数・合計・最大)
+    """
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class Metrics:
+    """
+    プロセス内のカウンタとレイテンシを保持するシンプルなメトリクス
+
+    イベントループとワーカースレッドの両方から記録されるためロックで保護する
+    """
+    counters: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    latencies: dict[str, LatencySummary] = field(default_factory=lambda: defaultdict(LatencySummary))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self.latencies[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        with ブロックの実行時間を name のレイテンシとして記録する
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        現在の値をコピーして返す
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "latencies": {
+                    name: {"count": summary.count, "avg": summary.average, "max": summary.max}
+                    for name, summary in self.latencies.items()
+                },
+            }
+
+    def log_report(self):
+        """
+        現在の値をログに出力する
+        """
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot["counters"].items()):
+            logger.info(f"metrics counter {name}={value}")
+        for name, summary in sorted(snapshot["latencies"].items()):
+            logger.info(
+                f"metrics latency {name} count={summary['count']} "
+                f"avg={summary['avg'] * 1000:.1f}ms max={summary['max'] * 1000:.1f}ms"
+            )
+
+
+# プロセス全体で共有するメトリクス
+metrics = Metrics()
@@ -0,0 +1,145 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+
+from .configs import botConfig
+from .entities.claude_model import ClaudeModel
+from .entities.gemini_model import GeminiChatModel
+from .entities.model_tier import ModelTier
+from .entities.openai_chat_model import OpenAIChatModel
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# プロバイダ名
+PROVIDER_OPENAI = "openai"
+PROVIDER_GEMINI = "gemini"
+PROVIDER_CLAUDE = "claude"
+PROVIDER_STABILITY = "stability"
+
+# プロバイダを 1 つだけ使うコマンドと、そのプロバイダ (画像生成はプロバイダを切り替えるため含まない)
+COMMAND_PROVIDERS = {
+    "openai_question": PROVIDER_OPENAI,
+    "openai_question_udon": PROVIDER_OPENAI,
+    "openai_conversation": PROVIDER_OPENAI,
+    "gemini_question": PROVIDER_GEMINI,
+    "gemini_question_udon": PROVIDER_GEMINI,
+    "claude_question": PROVIDER_CLAUDE,
+    "claude_question_udon": PROVIDER_CLAUDE,
+    "git_create_issue": "github",
+}
+
+# コードが含まれていると判断するパターン
+CODE_PATTERN = re.compile(
+    r"```|^\s*(using|import|from|def|class|public|private|void|return|#include)\b|[;{}]\s*$",
+    re.MULTILINE
+)
+# 難しい質問であることを示すキーワード
+HARD_KEYWORDS = (
+    "なぜ", "理由", "設計", "比較", "最適化", "パフォーマンス", "デバッグ", "エラー", "バグ", "実装",
+    "詳しく", "詳細", "手順", "アルゴリズム", "証明", "レビュー", "リファクタ",
+    "why", "design", "compare", "optimize", "performance", "debug", "error", "implement",
+    "explain", "step by step", "algorithm", "prove", "review", "refactor",
+)
+# この文字数を超える質問は難しい質問として扱う
+LONG_PROMPT_LENGTH = 300
+# このスコア以上でフラッグシップモデルを使う
+FLAGSHIP_SCORE = 2
+
+
+@dataclass
+class RoutingDecision:
+    """
+    モデルの振り分け結果
+    """
+    command: str
+    tier: ModelTier
+    model: Enum
+    score: int
+    reasons: list[str] = field(default_factory=list)
+
+
+def classify_prompt(prompt: str) -> tuple[int, list[str]]:
+    """
+    質問の長さ・コードの有無・キーワードから難しさのスコアを計算する
+
+    Args:
+        prompt: 質問内容
+
+    Returns:
+        tuple[int, list[str]]: スコアと、スコアが加算された理由
+    """
+    score = 0
+    reasons: list[str] = []
+    if len(prompt) > LONG_PROMPT_LENGTH:
+        score += 2
+        reasons.append("long")
+    if CODE_PATTERN.search(prompt):
+        score += 2
+        reasons.append("code")
+    lowered = prompt.lower()
+    keywords = [keyword for keyword in HARD_KEYWORDS if keyword in lowered]
+    if keywords:
+        score += 1
+        reasons.append(f"keywords={','.join(keywords[:3])}")
+    if prompt.count("\n") >= 3 or prompt.count("?") + prompt.count("？") >= 2:
+        score += 1
+        reasons.append("multi-part")
+    return score, reasons
+
+
+class ModelRouter:
+    """
+    質問の難しさに応じて高速なモデルとフラッグシップモデルを振り分ける
+    """
+
+    def tiers(self, provider: str) -> dict[ModelTier, Enum]:
+        """
+        プロバイダごとの階層とモデルの対応
+        """
+        if provider == PROVIDER_OPENAI:
+            return {ModelTier.FAST: OpenAIChatModel.GPT_4_O_MINI, ModelTier.FLAGSHIP: botConfig.openai_chat_model}
+        if provider == PROVIDER_GEMINI:
+            return {ModelTier.FAST: GeminiChatModel.GEMINI_2_0_FLASH, ModelTier.FLAGSHIP: botConfig.gemini_chat_model}
+        if provider == PROVIDER_CLAUDE:
+            return {ModelTier.FAST: ClaudeModel.CLAUDE_3_5_HAIKU, ModelTier.FLAGSHIP: botConfig.claude_model}
+        raise ValueError(f"Unknown provider: {provider}")
+
+    def route(self, command: str, provider: str, prompt: str) -> RoutingDecision:
+        """
+        コマンドと質問内容から使用するモデルを決める
+
+        Args:
+            command: コマンド名 (TelDiscordCommand のメソッド名)
+            provider: プロバイダ名
+            prompt: 質問内容
+
+        Returns:
+            RoutingDecision: 振り分け結果
+        """
+        score, reasons = classify_prompt(prompt)
+        override = botConfig.model_tier_overrides.get(command)
+        if not botConfig.model_routing_enabled:
+            tier = ModelTier.FLAGSHIP
+            reasons = ["routing disabled"]
+        elif override is not None:
+            tier = override
+            reasons = ["override"]
+        else:
+            tier = ModelTier.FLAGSHIP if score >= FLAGSHIP_SCORE else ModelTier.FAST
+
+        decision = RoutingDecision(
+            command=command,
+            tier=tier,
+            model=self.tiers(provider)[tier],
+            score=score,
+            reasons=reasons,
+        )
+        metrics.increment(f"routing.{provider}.{tier.value}")
+        logger.info(
+            f"model routing: command={command} tier={tier.value} model={decision.model.value} "
+            f"score={score} reasons={','.join(reasons) or '-'} prompt_length={len(prompt)}"
+        )
+        return decision
@@ -1,24 +1,41 @@
-from openai import OpenAI, BadRequestError
+import base64
+from enum import Enum
+from typing import Optional
+
+from openai import NOT_GIVEN, OpenAI, BadRequestError
 
 from .configs import botConfig
-from .entities.entity import Message
+from .deadline import provider_timeout
+from .entities.entity import Message, Usage
 from .entities.openai_chat_model import OpenAIChatModel
 from .entities.openai_image_model import OpenAIImageModel
+from .entities.provider_result import ProviderResult, measure_total
+from .model_router import PROVIDER_OPENAI
+from .usage_ledger import token_count, usageLedger
 
 
 # OpenAIのエラーハンドリング. エラーコードによってメッセージを変更
-def handle_bad_request_error(e: BadRequestError):
+def handle_bad_request_error(e: BadRequestError, model: Optional[Enum] = None) -> ProviderResult:
     if e.code == "content_policy_violation":
         message = "コンテンツポリシー違反です. 他の質問をしてください."
     else:
         message = "エラーが発生しました. Error Code: " + e.code
 
-    return {
-        "error": {
-            "code": e.code,
-            "message": message
-        }
-    }
+    return ProviderResult.failure(e.code, message, provider=PROVIDER_OPENAI, model=model.value if model else None)
+
+
+def to_usage(usage) -> Usage:
+    """
+    Chat Completions のレスポンスの usage を Usage に変換する
+    """
+    if usage is None:
+        return Usage()
+    details = getattr(usage, "prompt_tokens_details", None)
+    return Usage(
+        prompt_tokens=token_count(usage.prompt_tokens),
+        completion_tokens=token_count(usage.completion_tokens),
+        cached_tokens=token_count(getattr(details, "cached_tokens", None)),
+    )
 
 
 class OpenAIAPI:
@@ -26,9 +43,14 @@ class OpenAIAPI:
 
     def __init__(self):
         # OpenAI API の設定
-        self.openAIClient = OpenAI(api_key=botConfig.openai_api_key)
+        self.openAIClient = OpenAI(api_key=botConfig.openai_api_key, base_url=botConfig.openai_base_url)
+
+    def close(self):
+        # HTTP のコネクションプールを閉じる
+        self.openAIClient.close()
 
-    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> dict:
+    @measure_total
+    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> ProviderResult:
         try:
             response = self.openAIClient.chat.completions.create(
                 model=model.value,
@@ -42,6 +64,7 @@ class OpenAIAPI:
                         "content": prompt,
                     }
                 ],
+                timeout=provider_timeout(),
             )
             
             # 利用しないので一時的にコメントアウト
@@ -49,20 +72,21 @@ class OpenAIAPI:
             #     "role": "system",
             #     "content": system_setting,
             # },
-            return {
-                "response": response.choices[0].message.content.strip()
-            }
+            usage = to_usage(response.usage)
+            usageLedger.record(PROVIDER_OPENAI, model, usage)
+            return ProviderResult.success(
+                response.choices[0].message.content.strip(),
+                usage=usage,
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
-            return handle_bad_request_error(e)
+            return handle_bad_request_error(e, model)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def conversation(self, model: OpenAIChatModel, prompts: list[Message]) -> dict:
+    @measure_total
+    def conversation(self, model: OpenAIChatModel, prompts: list[Message], max_tokens: Optional[int] = None) -> ProviderResult:
         try:
             messages = []
             for message in prompts:
@@ -76,63 +100,72 @@ class OpenAIAPI:
             response = self.openAIClient.chat.completions.create(
                 model=model.value,
                 messages=messages,
+                max_tokens=max_tokens if max_tokens is not None else NOT_GIVEN,
+                timeout=provider_timeout(),
+            )
+            usage = to_usage(response.usage)
+            usageLedger.record(PROVIDER_OPENAI, model, usage)
+            return ProviderResult.success(
+                response.choices[0].message.content.strip(),
+                usage=usage,
+                provider=PROVIDER_OPENAI,
+                model=model.value,
             )
-            return {
-                "response": response.choices[0].message.content.strip()
-            }
         except BadRequestError as e:
-            return handle_bad_request_error(e)
+            return handle_bad_request_error(e, model)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def create_image_variation(self, model: OpenAIImageModel, image_path: str) -> dict:
+    @measure_total
+    def create_image_variation(self, model: OpenAIImageModel, image: bytes) -> ProviderResult:
         try:
+            # ファイルを介さず、PNG のバイト列をそのままアップロードする
             response = self.openAIClient.images.create_variation(
                 model=model.value,
-                image=open(image_path, "rb"),
+                image=("image.png", image, "image/png"),
                 n=1,
-                size="1024x1024"
+                size="1024x1024",
+                timeout=provider_timeout(),
             )
-            return {
-                "response": {
+            usage = Usage(images=len(response.data))
+            usageLedger.record(PROVIDER_OPENAI, model, usage)
+            return ProviderResult.success(
+                {
                     "url": response.data[0].url,
                     "prompt": response.data[0].revised_prompt
-                }
-            }
+                },
+                usage=usage,
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
-            return handle_bad_request_error(e)
+            return handle_bad_request_error(e, model)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def generate_image(self, model: OpenAIImageModel, prompt: str) -> dict:
+    @measure_total
+    def generate_image(self, model: OpenAIImageModel, prompt: str) -> ProviderResult:
         try:
+            # URL は 1 時間で失効するため、画像のデータを受け取って Discord に添付する
             response = self.openAIClient.images.generate(
                 model=model.value,
                 prompt=prompt,
-                response_format="url"
+                response_format="b64_json",
+                timeout=provider_timeout(),
+            )
+            usage = Usage(images=len(response.data))
+            usageLedger.record(PROVIDER_OPENAI, model, usage)
+            return ProviderResult.success(
+                {
+                    "image": base64.b64decode(response.data[0].b64_json),
+                    "prompt": response.data[0].revised_prompt or prompt,
+                    "seed": None,
+                },
+                usage=usage,
+                provider=PROVIDER_OPENAI,
+                model=model.value,
             )
-            return {
-                "response": {
-                    "url": response.data[0].url,
-                    "prompt": response.data[0].revised_prompt
-                }
-            }
         except BadRequestError as e:
-            return handle_bad_request_error(e)
+            return handle_bad_request_error(e, model)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
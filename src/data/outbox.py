@@ -0,0 +1,417 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import discord
+
+from .deadline import is_token_expired
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# 送信の状態
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# 送信の種類
+KIND_GITHUB_ISSUE = "github_issue"
+KIND_STATUS_MESSAGE = "status_message"
+
+# Discord のメッセージの文字数制限
+MESSAGE_LIMIT = 2000
+# 4xx のうち、時間をおいて再試行すれば成功する可能性があるもの (タイムアウト・レート制限)
+RETRYABLE_CLIENT_ERRORS = frozenset({408, 429})
+
+
+class PermanentDeliveryError(Exception):
+    """
+    再試行しても成功しない送信エラー (送信先が存在しない・権限がないなど)
+    """
+
+
+def is_permanent_http_error(status: Union[int, str]) -> bool:
+    """
+    再試行しても成功しない HTTP のステータスコード (4xx) か. 通信エラーなどステータスコードがない場合は False
+    """
+    return isinstance(status, int) and 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS
+
+
+@dataclass
+class OutboxEntry:
+    """
+    送信待ちの外部への送信
+    """
+    id: int
+    kind: str
+    payload: dict[str, Any]
+    reply: Optional[dict[str, Any]]  # 送信結果で編集するコマンドの応答メッセージ
+    attempts: int
+    created_at: float
+
+
+@dataclass
+class EnqueueResult:
+    id: int
+    is_new: bool  # False の場合は同じ dedup_key の送信が登録済み
+    status: str
+    result: Optional[str]  # 送信済みの場合の結果 (Issue の URL など)
+
+
+# 同じ種類の送信の payload をまとめて受け取って送信し、結果を返す
+Deliverer = Callable[[list[dict[str, Any]]], Awaitable[str]]
+
+
+@dataclass
+class OutboxRoute:
+    deliver: Deliverer
+    batch_by: Optional[str]  # この payload の値が同じ送信をまとめて送る (None の場合は 1 件ずつ)
+    is_paused: Optional[Callable[[], bool]]  # True の間は送信しない (キルスイッチなど)
+
+
+class Outbox:
+    """
+    GitHub の Issue 作成やステータス通知など、コマンドの応答を待たなくてよい外部への送信を
+    SQLite に記録してから、バックグラウンドで送信する
+
+    コマンドは enqueue() で登録するだけですぐに応答し、送信は start() したタスクが行う。
+    失敗した送信は指数バックオフで max_attempts 回まで再試行し、同じ dedup_key の送信は 1 度だけ行う。
+    同じ種類で batch_by の値が同じ送信はまとめて 1 回で送る。送信結果はコマンドの応答メッセージを編集して伝える。
+    ゲートウェイとワーカーが同じファイルを使い、送信中のままリースが切れた送信 (プロセスが落ちた場合など) は再度送信する。
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 2.0,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+        lease_seconds: float = 120.0,
+        retention_days: float = 7.0,
+        drain_timeout: float = 10.0
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+        self.drain_timeout = drain_timeout
+        self.path: Optional[str] = None
+        self.client: Optional[discord.Client] = None
+        self.routes: dict[str, OutboxRoute] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._deliver_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def open(self, path: str):
+        """
+        送信を記録するファイルを開き、保存期間を過ぎた送信済みの記録を削除する
+        """
+        if self._connection is not None:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                dedup_key TEXT UNIQUE,
+                payload TEXT NOT NULL,
+                reply TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_expires_at REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, next_attempt_at)")
+        self._connection.execute(
+            "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+            (STATUS_SENT, STATUS_FAILED, time.time() - self.retention_days * 86400)
+        )
+
+    def register(
+        self,
+        kind: str,
+        deliver: Deliverer,
+        batch_by: Optional[str] = None,
+        is_paused: Optional[Callable[[], bool]] = None
+    ):
+        """
+        送信の種類と送信処理を登録する. 登録した種類の送信だけをこのプロセスで送信する
+        """
+        self.routes[kind] = OutboxRoute(deliver, batch_by, is_paused)
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        dedup_key: Optional[str] = None,
+        reply: Optional[dict[str, Any]] = None
+    ) -> EnqueueResult:
+        """
+        送信を登録する (送信はバックグラウンドで行う)
+
+        Args:
+            kind: 送信の種類
+            payload: 送信処理に渡す値 (JSON にできる値)
+            dedup_key: 同じ送信を 1 度だけ行うためのキー (None の場合は重複を確認しない)
+            reply: 送信結果で編集する応答メッセージ (application_id / token / message_id / channel_id / user_id /
+                   created_at と、編集後の本文の prefix / success ("{result}" を結果に置き換える) / failure ("{error}"))
+
+        Returns:
+            EnqueueResult: 登録した送信 (同じ dedup_key の送信がある場合はその送信)
+        """
+        if self._connection is None:
+            raise RuntimeError("Outbox is not open")
+        result = await asyncio.to_thread(self._insert, kind, payload, dedup_key, reply)
+        if result.is_new:
+            metrics.increment(f"outbox.enqueued.{kind}")
+            self._wakeup.set()
+        else:
+            metrics.increment(f"outbox.deduplicated.{kind}")
+        return result
+
+    def _insert(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        dedup_key: Optional[str],
+        reply: Optional[dict[str, Any]]
+    ) -> EnqueueResult:
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO outbox (kind, dedup_key, payload, reply, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (dedup_key) DO NOTHING",
+                (kind, dedup_key, json.dumps(payload), json.dumps(reply) if reply else None, STATUS_PENDING,
+                 now, now, now)
+            )
+            if cursor.rowcount:
+                return EnqueueResult(cursor.lastrowid, True, STATUS_PENDING, None)
+            row = self._connection.execute(
+                "SELECT id, status, result FROM outbox WHERE dedup_key = ?", (dedup_key,)
+            ).fetchone()
+        return EnqueueResult(row["id"], False, row["status"], row["result"])
+
+    def _claim(self, kinds: list[str]) -> list[OutboxEntry]:
+        now = time.time()
+        placeholders = ", ".join("?" for _ in kinds)
+        with self._lock:
+            # 他のプロセスが同じ送信を取り出さないように書き込みロックを取る
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    f"SELECT * FROM outbox WHERE kind IN ({placeholders}) AND "
+                    f"((status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_expires_at < ?)) "
+                    f"ORDER BY id LIMIT ?",
+                    (*kinds, STATUS_PENDING, now, STATUS_SENDING, now, self.batch_size)
+                ).fetchall()
+                self._connection.executemany(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, lease_expires_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    [(STATUS_SENDING, now + self.lease_seconds, now, row["id"]) for row in rows]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return [
+            OutboxEntry(
+                id=row["id"],
+                kind=row["kind"],
+                payload=json.loads(row["payload"]),
+                reply=json.loads(row["reply"]) if row["reply"] else None,
+                attempts=row["attempts"] + 1,
+                created_at=row["created_at"],
+            )
+            for row in rows
+        ]
+
+    def _finish(self, entries: list[OutboxEntry], status: str, result: Optional[str], error: Optional[str]):
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE outbox SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ?",
+                [(status, result, error, time.time(), entry.id) for entry in entries]
+            )
+
+    def _reschedule(self, entries: list[OutboxEntry], error: str):
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE outbox SET status = ?, error = ?, next_attempt_at = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ?",
+                [(STATUS_PENDING, error, now + self.retry_delay(entry.attempts), now, entry.id) for entry in entries]
+            )
+
+    def retry_delay(self, attempts: int) -> float:
+        """
+        attempts 回失敗した後に待つ時間 (秒). 同時に失敗した送信が一斉に再試行しないようにばらつかせる
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def pending_count(self) -> int:
+        """
+        送信していない (送信中を含む) 件数
+        """
+        if self._connection is None:
+            return 0
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (STATUS_PENDING, STATUS_SENDING)
+            ).fetchone()
+        return row[0]
+
+    async def deliver_due(self) -> int:
+        """
+        送信時刻になった送信を取り出して送信する
+
+        Returns:
+            int: 取り出した件数
+        """
+        if self._connection is None:
+            return 0
+        kinds = [kind for kind, route in self.routes.items() if route.is_paused is None or not route.is_paused()]
+        if not kinds:
+            return 0
+        async with self._deliver_lock:
+            entries = await asyncio.to_thread(self._claim, kinds)
+            groups: dict[tuple[str, Any], list[OutboxEntry]] = defaultdict(list)
+            for entry in entries:
+                batch_by = self.routes[entry.kind].batch_by
+                groups[(entry.kind, entry.payload.get(batch_by) if batch_by else entry.id)].append(entry)
+            for (kind, _), group in groups.items():
+                await self._deliver_group(kind, group)
+        return len(entries)
+
+    async def _deliver_group(self, kind: str, entries: list[OutboxEntry]):
+        started = time.perf_counter()
+        try:
+            result = await self.routes[kind].deliver([entry.payload for entry in entries])
+        except Exception as e:
+            is_permanent = isinstance(e, PermanentDeliveryError)
+            failed = [entry for entry in entries if is_permanent or entry.attempts >= self.max_attempts]
+            retrying = [entry for entry in entries if entry not in failed]
+            logger.warning(f"Outbox delivery of {len(entries)} {kind} failed (attempt {entries[0].attempts}): {e}")
+            if retrying:
+                metrics.increment(f"outbox.retried.{kind}", len(retrying))
+                await asyncio.to_thread(self._reschedule, retrying, str(e))
+            if failed:
+                metrics.increment(f"outbox.failed.{kind}", len(failed))
+                logger.error(f"Gave up {len(failed)} {kind} after {failed[0].attempts} attempts: {e}")
+                await asyncio.to_thread(self._finish, failed, STATUS_FAILED, None, str(e))
+                for entry in failed:
+                    await self._edit_reply(entry, "failure", "{error}", str(e))
+            return
+
+        metrics.observe(f"outbox.{kind}", time.perf_counter() - started)
+        metrics.increment(f"outbox.sent.{kind}", len(entries))
+        now = time.time()
+        for entry in entries:
+            metrics.observe(f"outbox.delay.{kind}", now - entry.created_at)
+        await asyncio.to_thread(self._finish, entries, STATUS_SENT, result, None)
+        # 送信は記録済みのため、応答メッセージの編集に失敗しても再送信しない
+        for entry in entries:
+            await self._edit_reply(entry, "success", "{result}", result)
+
+    async def _edit_reply(self, entry: OutboxEntry, template: str, placeholder: str, value: str):
+        reply = entry.reply
+        if reply is None or self.client is None:
+            return
+        suffix = reply.get(template, placeholder).replace(placeholder, value)
+        content = (reply.get("prefix", "") + suffix)[:MESSAGE_LIMIT]
+        try:
+            if not is_token_expired(reply["created_at"]):
+                webhook = discord.Webhook.partial(reply["application_id"], reply["token"], client=self.client)
+                await webhook.edit_message(reply["message_id"], content=content)
+                return
+            # トークンの期限が切れて応答を編集できないためチャンネルに通知する
+            channel_id = reply["channel_id"]
+            channel = self.client.get_channel(channel_id) or await self.client.fetch_channel(channel_id)
+            await channel.send(f"<@{reply['user_id']}> {suffix}"[:MESSAGE_LIMIT])
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to report outbox result of {entry.kind} {entry.id}: {e}")
+
+    def start(self, client: Optional[discord.Client]):
+        """
+        バックグラウンドでの送信を開始する
+
+        Args:
+            client: 応答メッセージの編集に使う Discord のクライアント
+        """
+        self.client = client
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                if await self.deliver_due():
+                    # 取り出しきれなかった送信があるかもしれないため待たずに続ける
+                    continue
+            except Exception as e:
+                logger.exception(f"Outbox delivery loop failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain(self):
+        if self._task is not None:
+            await self._task
+        while await self.deliver_due():
+            pass
+
+    async def close(self):
+        """
+        バックグラウンドでの送信を止め、送信時刻になっている送信を drain_timeout 秒まで送信してからファイルを閉じる
+
+        送信できなかった送信はファイルに残り、次に起動したときに送信する
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._connection is None:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox still has {self.pending_count()} entries, they will be sent after restart")
+        self._task = None
+        with self._lock:
+            self._connection.close()
+        self._connection = None
+
+
+# プロセス全体で共有する外部への送信の記録
+outbox = Outbox()
@@ -0,0 +1,140 @@
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from .entities.entity import Message
+from .entities.openai_chat_model import OpenAIChatModel
+from .entities.provider_result import ProviderResult
+from .metrics import metrics
+from .openai_api import OpenAIAPI
+from .single_flight import SingleFlight, normalize_prompt, request_key
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# Stable Diffusion 用のプロンプトに変換する際の指示
+SD_PROMPT_INSTRUCTION = (
+    "You are a bot that simply responds to the user's input prompts with English prompts for StableDiffusion. "
+    "You do not need to respond with “Yes, sir” or “OK”, just simply respond with the prompt for SD."
+)
+
+# 変換にかかった時間の初期値 (実際の変換時間が計測されるまで節約できた時間の見積もりに使う)
+INITIAL_TRANSLATION_SECONDS = 2.0
+
+
+def is_sd_ready_prompt(prompt: str) -> bool:
+    """
+    変換せずにそのまま Stable Diffusion に渡せるプロンプト (英語やタグ形式) か判定する
+
+    ASCII 以外の文字 (日本語など) を含まず、英字を含むプロンプトは英語かタグ形式とみなす。
+    "(masterpiece:1.2), 1girl, <lora:name:0.8>" のような重み付きのタグもそのまま渡す。
+    """
+    normalized = unicodedata.normalize("NFKC", prompt).strip()
+    if not normalized:
+        return False
+    has_letter = False
+    for character in normalized:
+        if not character.isascii():
+            # 記号や絵文字は許可し、英語以外の文字が含まれる場合は変換する
+            if unicodedata.category(character).startswith("L"):
+                return False
+            continue
+        if character.isalpha():
+            has_letter = True
+    return has_letter
+
+
+class PromptTranslator:
+    """
+    ユーザーのプロンプトを Stable Diffusion 用の英語のプロンプトに変換する
+
+    1. 英語やタグ形式のプロンプトはローカルで判定してそのまま使う
+    2. 変換済みのプロンプトは正規化したプロンプトをキーに一定時間キャッシュする
+    3. 変換が必要な場合は低レイテンシのモデルで、出力の長さを制限して変換する
+
+    1, 2 で変換を省略した場合は、直近の変換時間を節約できた時間として記録する
+    """
+
+    def __init__(
+        self,
+        openai_api: OpenAIAPI,
+        single_flight: SingleFlight,
+        model: OpenAIChatModel,
+        max_tokens: int = 200,
+        cache_size: int = 512,
+        cache_ttl: float = 3600.0
+    ):
+        self.openai_api = openai_api
+        self.single_flight = single_flight
+        self.model = model
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # 変換時間の指数移動平均
+        self._average_seconds = INITIAL_TRANSLATION_SECONDS
+
+    async def translate(self, prompt: str) -> ProviderResult:
+        """
+        プロンプトを Stable Diffusion 用に変換する
+
+        Args:
+            prompt: ユーザーのプロンプト
+
+        Returns:
+            ProviderResult: payload に変換後のプロンプト. キャッシュから返した場合は cache_hit が立つ
+        """
+        if is_sd_ready_prompt(prompt):
+            self._record_saved("passthrough")
+            return ProviderResult.success(prompt.strip())
+
+        key = normalize_prompt(prompt)
+        cached = self._get_cached(key)
+        if cached is not None:
+            self._record_saved("cache_hit")
+            return ProviderResult.success(cached, model=self.model.value, cache_hit=True)
+
+        start = time.perf_counter()
+        result = await self.single_flight.run(
+            request_key("stablediffusion_translate_prompt", self.model, prompt, max_tokens=self.max_tokens),
+            self.openai_api.conversation,
+            self.model,
+            [
+                Message(role="system", content=SD_PROMPT_INSTRUCTION),
+                Message(role="user", content=prompt),
+            ],
+            max_tokens=self.max_tokens
+        )
+        elapsed = time.perf_counter() - start
+        metrics.increment("sd_prompt.translated")
+        metrics.observe("sd_prompt.translation", elapsed)
+        if not result.ok:
+            return result
+
+        self._average_seconds = self._average_seconds * 0.8 + elapsed * 0.2
+        self._put_cached(key, result.payload)
+        return result
+
+    def _record_saved(self, reason: str):
+        metrics.increment(f"sd_prompt.{reason}")
+        metrics.observe("sd_prompt.saved", self._average_seconds)
+        logger.info(f"SD prompt translation skipped ({reason}), saved ~{self._average_seconds:.2f}s")
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _put_cached(self, key: str, value: str):
+        self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
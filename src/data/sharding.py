@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Optional
+
+import discord
+
+from .configs import botConfig
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+def shard_id_for_guild(guild_id: Optional[int], shard_count: Optional[int]) -> int:
+    """
+    Discord のシャーディング規則 ((guild_id >> 22) % shard_count) でギルドのシャードIDを求める
+
+    DM などギルドがない場合はシャード 0 が担当する
+    """
+    if guild_id is None or not shard_count:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+def split_shard_groups(shard_count: int, process_count: int) -> list[list[int]]:
+    """
+    シャードをプロセス数のグループに均等に分ける
+
+    Args:
+        shard_count: 全体のシャード数
+        process_count: 起動するプロセス数
+
+    Returns:
+        list[list[int]]: プロセスごとのシャードIDのリスト
+    """
+    process_count = max(1, min(process_count, shard_count))
+    groups: list[list[int]] = [[] for _ in range(process_count)]
+    for shard_id in range(shard_count):
+        groups[shard_id % process_count].append(shard_id)
+    return groups
+
+
+def build_intents(profile: str) -> discord.Intents:
+    """
+    Gateway の Intents を作成する
+
+    "minimal" はハンドラが使うイベント (ギルドとスレッド、メッセージとその本文) だけを受け取る。
+    リアクション・入力中・ボイス・招待などのイベントは受け取らず、そのキャッシュも持たない。
+    """
+    if profile == "default":
+        intents = discord.Intents.default()
+    else:
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.dm_messages = True
+    intents.message_content = True
+    return intents
+
+
+def client_options(intents: discord.Intents) -> dict:
+    """
+    discord.py のキャッシュの設定
+
+    返信元のメッセージ (message.reference.resolved) は Gateway のイベントに含まれ、スレッドのオーナーは
+    owner_id で判定するため、メッセージとメンバーのキャッシュがなくてもハンドラは動作する
+    """
+    return {
+        "max_messages": botConfig.max_messages,
+        "member_cache_flags": (
+            discord.MemberCacheFlags.from_intents(intents)
+            if botConfig.member_cache_enabled else discord.MemberCacheFlags.none()
+        ),
+        "chunk_guilds_at_startup": botConfig.chunk_guilds_at_startup,
+    }
+
+
+def create_discord_client(intents: discord.Intents) -> discord.Client:
+    """
+    設定に応じて通常のクライアントか AutoShardedClient を作成する
+    """
+    if not botConfig.sharding_enabled:
+        return discord.Client(intents=intents, **client_options(intents))
+    return discord.AutoShardedClient(
+        intents=intents,
+        shard_count=botConfig.shard_count,
+        shard_ids=botConfig.shard_ids,
+        **client_options(intents),
+    )
+
+
+class ShardMonitor:
+    """
+    シャードごとのイベント数とゲートウェイのレイテンシを集計してログに出力する
+    """
+
+    def __init__(self, client: discord.Client, interval: float = 60.0):
+        self.client = client
+        self.interval = interval
+        self._events: dict[int, int] = defaultdict(int)
+        self._last_report = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def record_event(self, guild_id: Optional[int]):
+        """
+        イベントを受信したシャードのカウンタを加算する
+        """
+        shard_id = shard_id_for_guild(guild_id, self.client.shard_count)
+        self._events[shard_id] += 1
+        metrics.increment(f"shard.{shard_id}.events")
+
+    def latencies(self) -> list[tuple[int, float]]:
+        if isinstance(self.client, discord.AutoShardedClient):
+            return self.client.latencies
+        return [(0, self.client.latency)]
+
+    def report(self):
+        """
+        前回の出力からのイベントレートと現在のレイテンシを出力する
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-9)
+        for shard_id, latency in self.latencies():
+            rate = self._events.pop(shard_id, 0) / elapsed
+            metrics.observe(f"shard.{shard_id}.latency", latency)
+            logger.info(f"shard {shard_id}: events={rate:.2f}/s latency={latency * 1000:.0f}ms")
+        self._events.clear()
+        self._last_report = now
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.report()
+            except Exception as e:
+                logger.error(f"Failed to report shard metrics: {e}")
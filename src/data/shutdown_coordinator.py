@@ -0,0 +1,177 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import discord
+
+from .entities.constants import Constants
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+@dataclass
+class InFlightJob:
+    """
+    実行中のコマンド
+    """
+    job_id: int
+    name: str
+    started_at: float
+    task: Optional[asyncio.Task]
+    interaction: Optional[discord.Interaction] = None
+
+
+class ShutdownCoordinator:
+    """
+    停止時に新しいコマンドの受付を止め、実行中のコマンドが終わるのを待ってから後始末を行う
+
+    1. is_draining を立てて新しいコマンドを受け付けないようにする
+    2. 実行中のコマンドを drain_timeout 秒まで待つ (進捗はログと、実行中のユーザーへの通知で確認できる)
+    3. 期限を過ぎても終わらないコマンドはキャンセルする
+    4. 登録された後始末 (メトリクスの出力・ストアの書き込み・HTTP クライアントのクローズ・停止通知など) を
+       登録順に 1 度だけ実行する
+    """
+
+    def __init__(self, drain_timeout: float = 60.0, progress_interval: float = 5.0):
+        self.drain_timeout = drain_timeout
+        self.progress_interval = progress_interval
+        self.is_draining = False
+        self._jobs: dict[int, InFlightJob] = {}
+        self._job_ids = itertools.count(1)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._cleanups: list[tuple[str, Callable[[], Any]]] = []
+        self._shutdown_task: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self._jobs)
+
+    @asynccontextmanager
+    async def track(self, name: str, interaction: Optional[discord.Interaction] = None):
+        """
+        with ブロックの間、コマンドを実行中として記録する
+
+        Args:
+            name: コマンド名 (ログ用)
+            interaction: 停止時に進捗を通知するインタラクション
+        """
+        job = InFlightJob(
+            job_id=next(self._job_ids),
+            name=name,
+            started_at=time.perf_counter(),
+            task=asyncio.current_task(),
+            interaction=interaction,
+        )
+        self._jobs[job.job_id] = job
+        self._idle.clear()
+        try:
+            yield job
+        finally:
+            del self._jobs[job.job_id]
+            if not self._jobs:
+                self._idle.set()
+
+    def add_cleanup(self, name: str, callback: Callable[[], Any]):
+        """
+        停止時に実行する後始末を登録する (同期関数・コルーチン関数のどちらでもよい)
+        """
+        self._cleanups.append((name, callback))
+
+    def request_shutdown(self, reason: str) -> asyncio.Task:
+        """
+        停止処理を開始する. シグナルハンドラから呼ばれるため、何度呼ばれても 1 度だけ実行する
+        """
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.get_running_loop().create_task(self._shutdown(reason))
+        return self._shutdown_task
+
+    async def shutdown(self, reason: str):
+        """
+        停止処理を開始して完了まで待つ
+        """
+        await self.request_shutdown(reason)
+
+    async def _shutdown(self, reason: str):
+        logger.info(f"Shutting down ({reason}), draining {self.in_flight_count} in-flight commands...")
+        self.is_draining = True
+        await self._notify_in_flight()
+        await self.drain()
+        await self._run_cleanups()
+        logger.info("Shutdown complete")
+
+    async def drain(self) -> bool:
+        """
+        実行中のコマンドが終わるのを drain_timeout 秒まで待つ
+
+        Returns:
+            bool: すべてのコマンドが期限内に終わった場合は True
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.drain_timeout
+        initial_count = self.in_flight_count
+        while self._jobs:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=min(self.progress_interval, remaining))
+            except asyncio.TimeoutError:
+                names = ", ".join(sorted(job.name for job in self._jobs.values()))
+                logger.info(f"Draining: {self.in_flight_count} commands in flight ({names}), {remaining:.0f}s left")
+
+        metrics.observe("shutdown.drain", loop.time() - start)
+        if not self._jobs:
+            metrics.increment("shutdown.drained", initial_count)
+            logger.info(f"Drained {initial_count} commands in {loop.time() - start:.1f}s")
+            return True
+
+        # 期限を過ぎても終わらないコマンドはキャンセルする
+        abandoned = list(self._jobs.values())
+        metrics.increment("shutdown.drained", initial_count - len(abandoned))
+        metrics.increment("shutdown.abandoned", len(abandoned))
+        tasks = []
+        for job in abandoned:
+            logger.warning(
+                f"Cancelling {job.name} after {time.perf_counter() - job.started_at:.1f}s (drain deadline exceeded)"
+            )
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+                tasks.append(job.task)
+        # キャンセルしたコマンドの後処理 (finally) が終わってから後始末に進む
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.progress_interval)
+        return False
+
+    async def _notify_in_flight(self):
+        """
+        実行中のコマンドのユーザーに、回答が終わってから停止することを通知する
+        """
+        for job in list(self._jobs.values()):
+            interaction = job.interaction
+            if interaction is None or not interaction.response.is_done():
+                continue
+            try:
+                await interaction.followup.send(Constants.bot_draining_in_flight_message, ephemeral=True)
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to notify {job.name} about shutdown: {e}")
+
+    async def _run_cleanups(self):
+        for name, callback in self._cleanups:
+            start = time.perf_counter()
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.exception(f"Shutdown step {name} failed: {e}")
+                continue
+            logger.info(f"Shutdown step {name} finished in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,116 @@
+import asyncio
+import dataclasses
+import logging
+import re
+import time
+import unicodedata
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Callable, Hashable, Iterator, Optional
+
+from .entities.provider_result import ProviderResult, notify_result
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    """
+    同じ質問とみなすためにプロンプトを正規化する (全角・半角の統一、空白の圧縮、大文字・小文字の同一視)
+    """
+    if not prompt:
+        return ""
+    normalized = unicodedata.normalize("NFKC", prompt)
+    return WHITESPACE_PATTERN.sub(" ", normalized).strip().casefold()
+
+
+def request_key(command: str, model: Optional[Enum], prompt: Optional[str], **params: Any) -> tuple:
+    """
+    (コマンド, モデル, 正規化したプロンプト, パラメータ) からリクエストのキーを作成する
+    """
+    return (
+        command,
+        model.value if model is not None else None,
+        normalize_prompt(prompt),
+        tuple(sorted((name, value) for name, value in params.items() if value is not None)),
+    )
+
+
+class SingleFlight:
+    """
+    同じキーのリクエストが実行中の場合、新しくプロバイダを呼ばずに実行中のリクエストの結果を共有する
+
+    プロバイダの呼び出しはワーカースレッドで行うため、呼び出し中もイベントループは止まらない。
+    呼び出しは待っているインタラクションとは独立したタスクで実行するので、
+    最初のインタラクションがキャンセルされても他のインタラクションには結果が届く。
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._submissions: set[Hashable] = set()
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        func(*args, **kwargs) をワーカースレッドで実行する. 同じキーの呼び出しが実行中ならその結果を待つ
+
+        Args:
+            key: リクエストのキー (request_key で作成する)
+            func: プロバイダを呼び出す同期関数
+
+        Returns:
+            func の戻り値. ProviderResult の場合は timings.queued にスレッドの空き待ちの時間を記録し、
+            実行中の呼び出しの結果を共有した場合は coalesced を立てた複製を返す
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(asyncio.to_thread(self._call, time.perf_counter(), func, *args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            return await asyncio.shield(task)
+
+        metrics.increment("single_flight.saved_calls")
+        metrics.increment(f"single_flight.saved_calls.{key[0]}")
+        logger.info(f"Coalesced request into an in-flight call: command={key[0]}")
+        result = await asyncio.shield(task)
+        if isinstance(result, ProviderResult):
+            result = dataclasses.replace(result, coalesced=True)
+            # プロバイダは呼んでいないが、結果を受け取ったことは通知する
+            notify_result(result)
+        return result
+
+    @staticmethod
+    def _call(submitted_at: float, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        queued = time.perf_counter() - submitted_at
+        metrics.observe("single_flight.queued", queued)
+        result = func(*args, **kwargs)
+        if isinstance(result, ProviderResult):
+            result.timings.queued = queued
+        return result
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    @contextmanager
+    def submission(self, key: Hashable) -> Iterator[bool]:
+        """
+        同じユーザーが同じコマンドを二重に送信していないか確認する
+
+        with ブロックの間 key を実行中として記録し、既に実行中の場合は False を返す
+        """
+        if key in self._submissions:
+            metrics.increment("single_flight.duplicate_submissions")
+            yield False
+            return
+        self._submissions.add(key)
+        try:
+            yield True
+        finally:
+            self._submissions.discard(key)
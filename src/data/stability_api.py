@@ -1,27 +1,32 @@
 import base64
 import os
 import io
-from typing import Dict, Any, Optional
+from typing import Optional
 
 import requests
 from PIL import Image
 
 from .configs import botConfig
+from .deadline import provider_timeout
+from .entities.entity import Usage
+from .entities.provider_result import ProviderResult, measure_total
 from .entities.stable_diffusion_model import StableDiffusionModel
+from .model_router import PROVIDER_STABILITY
+from .usage_ledger import usageLedger
 
 
 class StabilityAPI:
     """
     Stability AI APIのクライアントクラス
     """
-    API_HOST = "https://api.stability.ai"
-    
     def __init__(self):
         """初期化"""
         self.api_key = botConfig.stability_api_key
+        self.api_host = botConfig.stability_base_url
         if not self.api_key:
             raise ValueError("Stability AI API key is not set")
     
+    @measure_total
     def generate_image(
         self,
         model: StableDiffusionModel,
@@ -32,7 +37,7 @@ class StabilityAPI:
         cfg_scale: float = 7.0,
         steps: int = 30,
         samples: int = 1
-    ) -> Dict[str, Any]:
+    ) -> ProviderResult:
         """
         テキストプロンプトから画像を生成する
         
@@ -47,9 +52,9 @@ class StabilityAPI:
             samples: 生成する画像の数
             
         Returns:
-            Dict: レスポンス情報を含む辞書
-                成功時: {'response': {'url': 画像URL, 'prompt': 使用されたプロンプト, 'base64': Base64画像データ}}
-                失敗時: {'error': {'message': エラーメッセージ}}
+            ProviderResult: レスポンス情報
+                成功時: payload に {'image': PNG のバイト列, 'prompt': 使用されたプロンプト, 'seed': シード}
+                失敗時: error にエラーコードとエラーメッセージ
         """
         try:
             engine_id = model.value
@@ -69,7 +74,7 @@ class StabilityAPI:
                 payload["text_prompts"].append({"text": negative_prompt, "weight": -1.0})
             
             # APIエンドポイントの設定
-            url = f"{self.API_HOST}/v1/generation/{engine_id}/text-to-image"
+            url = f"{self.api_host}/v1/generation/{engine_id}/text-to-image"
             
             # APIリクエストを送信
             response = requests.post(
@@ -79,17 +84,19 @@ class StabilityAPI:
                     "Accept": "application/json",
                     "Authorization": f"Bearer {self.api_key}"
                 },
-                json=payload
+                json=payload,
+                timeout=provider_timeout(),
             )
             
             # レスポンスのステータスコードが成功でない場合
             if response.status_code != 200:
                 print(f"Stability API Error: {response.status_code} - {response.text}")
-                return {
-                    "error": {
-                        "message": f"API error: {response.status_code} - {response.text}"
-                    }
-                }
+                return ProviderResult.failure(
+                    response.status_code,
+                    f"API error: {response.status_code} - {response.text}",
+                    provider=PROVIDER_STABILITY,
+                    model=engine_id,
+                )
             
             # レスポンスのJSONを解析
             data = response.json()
@@ -98,39 +105,34 @@ class StabilityAPI:
             if "artifacts" in data and len(data["artifacts"]) > 0:
                 artifact = data["artifacts"][0]
                 
-                # Base64画像データ
-                image_base64 = artifact["base64"]
-                
-                # 一時的なURLをDiscordで使えるURLスキームに変換
-                base64_url = f"data:image/png;base64,{image_base64}"
-                
-                # 一時ファイルを作成して、Discord用の添付ファイルとして使用
-                # このアプローチでは、Discord側で表示可能な一時ファイルを提供
-                temp_image_path = "temp_image.png"
-                with open(temp_image_path, "wb") as f:
-                    f.write(base64.b64decode(image_base64))
+                usage = Usage(images=len(data["artifacts"]))
+                usageLedger.record(PROVIDER_STABILITY, model, usage)
                 
-                return {
-                    "response": {
-                        "url": temp_image_path,  # 添付ファイル用のパス
+                return ProviderResult.success(
+                    {
+                        "image": base64.b64decode(artifact["base64"]),
                         "prompt": prompt,
                         "seed": artifact.get("seed", None),
                         "finish_reason": artifact.get("finish_reason", None),
-                        "base64": image_base64  # 元のBase64データも保持
-                    }
-                }
+                    },
+                    usage=usage,
+                    provider=PROVIDER_STABILITY,
+                    model=engine_id,
+                )
             else:
                 print("No image was generated from Stability API")
-                return {
-                    "error": {
-                        "message": "No image was generated"
-                    }
-                }
+                return ProviderResult.failure(
+                    1,
+                    "No image was generated",
+                    provider=PROVIDER_STABILITY,
+                    model=engine_id,
+                )
                 
         except Exception as e:
             print(f"Error in Stability API: {str(e)}")
-            return {
-                "error": {
-                    "message": f"Error generating image: {str(e)}"
-                }
-            }
+            return ProviderResult.failure(
+                1,
+                f"Error generating image: {str(e)}",
+                provider=PROVIDER_STABILITY,
+                model=model.value,
+            )
@@ -0,0 +1,370 @@
+import asyncio
+import base64
+import io
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+from PIL import Image
+
+from .conversation_compactor import estimate_tokens
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+PROVIDER_OPENAI = "openai"
+PROVIDER_ANTHROPIC = "anthropic"
+PROVIDER_GEMINI = "gemini"
+PROVIDER_STABILITY = "stability"
+PROVIDER_DEEPL = "deepl"
+PROVIDER_GITHUB = "github"
+
+# 回答の本文に繰り返す文 (日本語はおよそ 1 文字 1 トークン)
+ANSWER_SENTENCE = "これはスタブサーバーの回答です。"
+# 5xx を注入する場合のステータスコード
+SERVER_ERROR_STATUSES = (500, 502, 503)
+
+Handler = Callable[[web.Request, "StubBehavior"], Awaitable[web.StreamResponse]]
+
+
+@dataclass
+class StubBehavior:
+    """
+    スタブサーバーの応答の振る舞い
+
+    プロバイダごとに上書きでき、実行中も POST /_stub/behavior で変更できる
+    """
+    latency: float = 0.2  # 最初のバイトを返すまでの時間 (秒)
+    jitter: float = 0.0  # latency に加える 0〜jitter 秒のばらつき
+    tokens_per_second: float = 0.0  # 回答の生成速度 (0 の場合は待たずに返す)
+    completion_tokens: int = 200  # 回答のトークン数
+    rate_limit_ratio: float = 0.0  # 429 を返す割合
+    server_error_ratio: float = 0.0  # 5xx を返す割合
+    max_concurrency: int = 0  # 同時に処理するリクエストの上限. 超えた分は 429 を返す (0 の場合は無制限)
+
+    @classmethod
+    def from_dict(cls, values: dict, base: Optional["StubBehavior"] = None) -> "StubBehavior":
+        names = {field.name for field in fields(cls)}
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"Unknown stub behavior: {', '.join(sorted(unknown))}")
+        return replace(base or cls(), **values)
+
+
+def error_body(provider: str, status: int, message: str) -> dict:
+    """
+    プロバイダごとのエラーレスポンスの形式
+    """
+    if provider == PROVIDER_OPENAI:
+        code = "rate_limit_exceeded" if status == 429 else "server_error"
+        return {"error": {"message": message, "type": code, "param": None, "code": code}}
+    if provider == PROVIDER_ANTHROPIC:
+        kind = "rate_limit_error" if status == 429 else "api_error"
+        return {"type": "error", "error": {"type": kind, "message": message}}
+    if provider == PROVIDER_GEMINI:
+        state = "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"
+        return {"error": {"code": status, "message": message, "status": state}}
+    if provider == PROVIDER_STABILITY:
+        return {"id": "stub", "name": "rate_limit_exceeded" if status == 429 else "server_error", "message": message}
+    return {"message": message}
+
+
+def answer_text(tokens: int) -> str:
+    repeat = tokens // len(ANSWER_SENTENCE) + 1
+    return (ANSWER_SENTENCE * repeat)[:max(tokens, 1)]
+
+
+def placeholder_png(size: int = 256) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (88, 101, 242)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubProviderServer:
+    """
+    Bot が呼び出すプロバイダの API を真似るローカルの HTTP サーバー
+
+    OpenAI (Chat Completions と SSE ストリーミング・画像生成) / Anthropic Messages / Gemini generateContent /
+    Stability text-to-image / DeepL translate / GitHub Issues のエンドポイントを 1 つのポートで提供する。
+    遅延・生成速度・429 と 5xx の割合はプロバイダごとに StubBehavior で設定する。
+    """
+
+    def __init__(
+        self,
+        behavior: Optional[StubBehavior] = None,
+        overrides: Optional[dict[str, StubBehavior]] = None,
+        seed: Optional[int] = None
+    ):
+        self.behavior = behavior or StubBehavior()
+        self.overrides = dict(overrides or {})
+        self.stats: Counter[str] = Counter()
+        self.base_url: Optional[str] = None
+        self._random = random.Random(seed)
+        self._in_flight: Counter[str] = Counter()
+        self._ids = itertools.count(1)
+        self._image = placeholder_png()
+        self._image_b64 = base64.b64encode(self._image).decode("ascii")
+        self._runner: Optional[web.AppRunner] = None
+
+    def behavior_for(self, provider: str) -> StubBehavior:
+        return self.overrides.get(provider, self.behavior)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.add_routes([
+            web.post("/v1/chat/completions", self._route(PROVIDER_OPENAI, self.openai_chat_completions)),
+            web.post("/v1/images/generations", self._route(PROVIDER_OPENAI, self.openai_images)),
+            web.post("/v1/images/variations", self._route(PROVIDER_OPENAI, self.openai_images)),
+            web.post("/v1/messages", self._route(PROVIDER_ANTHROPIC, self.anthropic_messages)),
+            web.post("/v1beta/models/{method}", self._route(PROVIDER_GEMINI, self.gemini_models)),
+            web.post(
+                "/v1/generation/{engine}/text-to-image", self._route(PROVIDER_STABILITY, self.stability_text_to_image)
+            ),
+            web.post("/v2/translate", self._route(PROVIDER_DEEPL, self.deepl_translate)),
+            web.post("/repos/{owner}/{repo}/issues", self._route(PROVIDER_GITHUB, self.github_create_issue)),
+            web.get("/_stub/image.png", self.image),
+            web.get("/_stub/stats", self.get_stats),
+            web.post("/_stub/behavior", self.update_behavior),
+        ])
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        サーバーを起動する
+
+        Returns:
+            str: サーバーのベース URL (TEL_GPT_PROVIDER_BASE_URL に指定する)
+        """
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{bound_host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _route(self, provider: str, handler: Handler) -> Callable[[web.Request], Awaitable[web.StreamResponse]]:
+        """
+        同時実行数の上限・エラーの注入・遅延を共通で行う
+        """
+
+        async def route(request: web.Request) -> web.StreamResponse:
+            behavior = self.behavior_for(provider)
+            self.stats[f"{provider}.requests"] += 1
+            if behavior.max_concurrency and self._in_flight[provider] >= behavior.max_concurrency:
+                return self._error(provider, 429, "Too many concurrent requests")
+            roll = self._random.random()
+            if roll < behavior.rate_limit_ratio:
+                return self._error(provider, 429, "Rate limit exceeded")
+            if roll < behavior.rate_limit_ratio + behavior.server_error_ratio:
+                return self._error(provider, self._random.choice(SERVER_ERROR_STATUSES), "Injected server error")
+
+            self._in_flight[provider] += 1
+            try:
+                await asyncio.sleep(behavior.latency + self._random.uniform(0, behavior.jitter))
+                return await handler(request, behavior)
+            finally:
+                self._in_flight[provider] -= 1
+
+        return route
+
+    def _error(self, provider: str, status: int, message: str) -> web.Response:
+        self.stats[f"{provider}.{status}"] += 1
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return web.json_response(error_body(provider, status, message), status=status, headers=headers)
+
+    @staticmethod
+    async def _generate(behavior: StubBehavior):
+        # ストリーミングしない場合も、回答をすべて生成し終えるまでの時間だけ待つ
+        if behavior.tokens_per_second > 0:
+            await asyncio.sleep(behavior.completion_tokens / behavior.tokens_per_second)
+
+    async def openai_chat_completions(self, request: web.Request, behavior: StubBehavior) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "stub")
+        prompt_tokens = sum(
+            estimate_tokens(message.get("content") or "")
+            for message in body.get("messages", [])
+            if isinstance(message.get("content"), str)
+        )
+        text = answer_text(min(behavior.completion_tokens, body.get("max_tokens") or behavior.completion_tokens))
+        completion_id = f"chatcmpl-stub-{next(self._ids)}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(text),
+            "total_tokens": prompt_tokens + len(text),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        if not body.get("stream"):
+            await self._generate(behavior)
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(choices: list, **extra):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        # 1 チャンクあたりおよそ 4 トークン
+        for index in range(0, len(text), 4):
+            delta = {"content": text[index:index + 4]}
+            if index == 0:
+                delta["role"] = "assistant"
+            await send([{"index": 0, "delta": delta, "finish_reason": None}])
+            if behavior.tokens_per_second > 0:
+                await asyncio.sleep(4 / behavior.tokens_per_second)
+        await send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def openai_images(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        if request.content_type == "application/json":
+            prompt = (await request.json()).get("prompt")
+        else:
+            # 画像のバリエーションは multipart で画像を受け取る
+            await request.post()
+            prompt = None
+        await self._generate(behavior)
+        return web.json_response({
+            "created": int(time.time()),
+            "data": [{
+                "b64_json": self._image_b64,
+                "url": f"{self.base_url or ''}/_stub/image.png",
+                "revised_prompt": prompt,
+            }],
+        })
+
+    async def anthropic_messages(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        body = await request.json()
+        prompt_tokens = estimate_tokens(json.dumps(body.get("messages", []), ensure_ascii=False))
+        text = answer_text(min(behavior.completion_tokens, body.get("max_tokens") or behavior.completion_tokens))
+        await self._generate(behavior)
+        return web.json_response({
+            "id": f"msg_stub_{next(self._ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": len(text)},
+        })
+
+    async def gemini_models(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        model, _, method = request.match_info["method"].partition(":")
+        body = await request.json()
+        if method == "predict":
+            # Imagen
+            await self._generate(behavior)
+            return web.json_response({"predictions": [{"bytesBase64Encoded": self._image_b64, "mimeType": "image/png"}]})
+        if method != "generateContent":
+            return web.json_response(error_body(PROVIDER_GEMINI, 404, f"Unknown method: {method}"), status=404)
+        prompt_tokens = estimate_tokens(json.dumps(body.get("contents", []), ensure_ascii=False))
+        text = answer_text(behavior.completion_tokens)
+        await self._generate(behavior)
+        return web.json_response({
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": len(text),
+                "totalTokenCount": prompt_tokens + len(text),
+            },
+            "modelVersion": model,
+        })
+
+    async def stability_text_to_image(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        body = await request.json()
+        await self._generate(behavior)
+        return web.json_response({
+            "artifacts": [
+                {"base64": self._image_b64, "seed": self._random.randrange(2 ** 32), "finishReason": "SUCCESS"}
+                for _ in range(body.get("samples", 1))
+            ],
+        })
+
+    async def deepl_translate(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        form = await request.post()
+        return web.json_response({
+            "translations": [
+                {"detected_source_language": form.get("source_lang", "EN"), "text": text}
+                for text in form.getall("text", [])
+            ],
+        })
+
+    async def github_create_issue(self, request: web.Request, behavior: StubBehavior) -> web.Response:
+        body = await request.json()
+        number = next(self._ids)
+        owner, repo = request.match_info["owner"], request.match_info["repo"]
+        return web.json_response({
+            "number": number,
+            "title": body.get("title"),
+            "state": "open",
+            "html_url": f"https://github.com/{owner}/{repo}/issues/{number}",
+        }, status=201)
+
+    async def image(self, request: web.Request) -> web.Response:
+        return web.Response(body=self._image, content_type="image/png")
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "stats": dict(self.stats),
+            "behavior": asdict(self.behavior),
+            "overrides": {provider: asdict(behavior) for provider, behavior in self.overrides.items()},
+        })
+
+    async def update_behavior(self, request: web.Request) -> web.Response:
+        """
+        {"default": {...}, "openai": {...}} の形式で振る舞いを変更する
+        """
+        try:
+            self.apply(await request.json())
+        except (ValueError, TypeError) as e:
+            return web.json_response({"message": str(e)}, status=400)
+        return await self.get_stats(request)
+
+    def apply(self, config: dict):
+        """
+        {"default": {...}, "openai": {...}} の形式の設定を反映する. 指定しなかった項目は変更しない
+        """
+        if "default" in config:
+            self.behavior = StubBehavior.from_dict(config["default"], self.behavior)
+        for provider, values in config.items():
+            if provider != "default":
+                self.overrides[provider] = StubBehavior.from_dict(values, self.overrides.get(provider, self.behavior))
@@ -1,21 +1,51 @@
+import asyncio
 import discord
-import os
+import hashlib
+import io
 import logging
+import os
+import time
+from typing import Optional
 
-from .common_method import download_image, translate_text
-from .configs import botConfig
+from .common_method import translate_text
+from .configs import BotConfig, botConfig
+from .conversation_compactor import ConversationCompactor
+from .conversation_store import ConversationStore, StoredMessage
+from .deadline import INVALID_WEBHOOK_TOKEN, deadline_scope, is_token_expired
+from .doc_index import DocIndex, select_passages
 from .entities.constants import Constants
-from .entities.entity import Message
+from .entities.provider_result import ProviderResult
 from .entities.telgpt_command import TelGPTCommand
 from .gemini_api import GeminiAPI
+from .image_lineage import ImageLineage, ImageLineageStore
+from .image_normalizer import ImageNormalizeError, normalize_image
+from .image_router import ImageProvider, ImageRouter
 from .github_api import GithubAPI
 from .openai_api import OpenAIAPI
+from .outbox import KIND_GITHUB_ISSUE, PermanentDeliveryError, is_permanent_http_error, outbox
+from .prompt_translator import PromptTranslator
 from .langchain_claude_api import LangchainClaudeAPI  # 追加
+from .message_splitter import build_preview, split_markdown_message
+from .metrics import metrics
+from .model_router import COMMAND_PROVIDERS, ModelRouter, PROVIDER_CLAUDE, PROVIDER_GEMINI, PROVIDER_OPENAI, PROVIDER_STABILITY
+from .single_flight import SingleFlight, request_key
 from .stability_api import StabilityAPI  # 追加
+from .trace_recorder import traceRecorder
+from .usage_ledger import usageLedger
 
 # ロガー設定
 logger = logging.getLogger('discord')
 
+
+def truncate_text(text: str, limit: int) -> str:
+    """
+    Discord の文字数制限に収まるように末尾を省略する
+    """
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1] + "…"
+
+
 # noinspection PyMethodMayBeStatic,DuplicatedCode,PyUnresolvedReferences,PyMethodOverriding
 class TelDiscordCommand(TelGPTCommand):
     discord_client: discord.Client
@@ -24,6 +54,15 @@ class TelDiscordCommand(TelGPTCommand):
     githubApi: GithubAPI
     langchainClaudeApi: LangchainClaudeAPI  # 追加
     stabilityApi: StabilityAPI  # 追加: Stability API クライアント
+    conversationStore: ConversationStore
+    conversationCompactor: ConversationCompactor
+    answering_thread_ids: set[int]  # 回答中のスレッド
+    modelRouter: ModelRouter
+    singleFlight: SingleFlight  # 同じリクエストのプロバイダ呼び出しをまとめる
+    promptTranslator: PromptTranslator  # Stable Diffusion 用のプロンプト変換
+    imageLineageStore: ImageLineageStore  # 送信した画像の生成履歴 (再生成の要求で参照する)
+    imageRouter: ImageRouter  # 画像生成のプロバイダの切り替え
+    docIndex: Optional[DocIndex]  # VRChat 開発のドキュメントの検索インデックス (None の場合は検索しない)
 
     def __init__(self, discord_client: discord.Client):
         self.discord_client = discord_client
@@ -32,50 +71,261 @@ class TelDiscordCommand(TelGPTCommand):
         self.githubApi = GithubAPI()
         self.langchainClaudeApi = LangchainClaudeAPI()  # 追加
         self.stabilityApi = StabilityAPI()  # 追加: Stability API クライアントの初期化
+        self.conversationStore = ConversationStore(
+            botConfig.conversation_store_path,
+            retention_days=botConfig.conversation_retention_days,
+            max_messages_per_thread=botConfig.conversation_max_messages_per_thread,
+        )
+        self.conversationCompactor = ConversationCompactor(
+            openai_api=self.openAIApi,
+            store=self.conversationStore,
+            model=botConfig.conversation_summary_model,
+            threshold_tokens=botConfig.conversation_compaction_tokens,
+            keep_recent=botConfig.conversation_compaction_keep_recent,
+        )
+        self.answering_thread_ids = set()
+        usageLedger.open(botConfig.usage_ledger_path)
+        if botConfig.trace_path is not None:
+            traceRecorder.open(botConfig.trace_path, sample_rate=botConfig.trace_sample_rate)
+        self.modelRouter = ModelRouter()
+        self.singleFlight = SingleFlight()
+        self.promptTranslator = PromptTranslator(
+            openai_api=self.openAIApi,
+            single_flight=self.singleFlight,
+            model=botConfig.sd_prompt_model,
+            max_tokens=botConfig.sd_prompt_max_tokens,
+            cache_ttl=botConfig.sd_prompt_cache_ttl,
+        )
+        self.imageRouter = ImageRouter(
+            providers=self.build_image_providers(botConfig),
+            single_flight=self.singleFlight,
+            prompt_translator=self.promptTranslator,
+            timeout=botConfig.image_provider_timeout,
+            cooldown=botConfig.image_provider_cooldown,
+        )
+        self.imageLineageStore = ImageLineageStore(
+            capacity=botConfig.image_lineage_capacity,
+            path=botConfig.image_lineage_path,
+            retention_days=botConfig.conversation_retention_days,
+        )
+        self.docIndex = self.open_doc_index(botConfig.doc_index_path)
+        # Issue の作成はバックグラウンドで行い、GitHub を停止している間は送信しない (outbox はプロセスの起動時に開く)
+        outbox.register(
+            KIND_GITHUB_ISSUE,
+            self.deliver_issue,
+            is_paused=lambda: COMMAND_PROVIDERS["git_create_issue"] in botConfig.disabled_providers,
+        )
+
+    def open_doc_index(self, path: str) -> Optional[DocIndex]:
+        """
+        ドキュメントの検索インデックスを mmap で開く (ファイルがないか壊れている場合は None)
+        """
+        if not os.path.exists(path):
+            logger.info(f"Document index {path} not found, udon commands run without retrieval")
+            return None
+        try:
+            doc_index = DocIndex(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to open document index {path}: {e}")
+            return None
+        logger.info(f"Opened document index {path} ({doc_index.doc_count} passages)")
+        return doc_index
+
+    def augment_udon_prompt(self, prompt: str) -> str:
+        """
+        質問に関連するドキュメントを検索し、トークン数の上限までプロンプトの前に添える
+
+        Args:
+            prompt: ユーザーの質問内容
+
+        Returns:
+            str: ドキュメントを添えたプロンプト (関連するドキュメントがない場合は質問内容のまま)
+        """
+        if self.docIndex is None:
+            return prompt
+        with metrics.timer("retrieval.search"):
+            results = self.docIndex.search(prompt, botConfig.doc_top_k)
+            passages = select_passages(results, botConfig.doc_token_budget)
+        if not passages:
+            metrics.increment("retrieval.miss")
+            return prompt
+        metrics.increment("retrieval.hit")
+        references = "\n\n".join(
+            f"[{index}] {result.passage.source} - {result.passage.title}\n{result.passage.text}"
+            for index, result in enumerate(passages, start=1)
+        )
+        return (
+            "Use the following excerpts from the VRChat / UdonSharp documentation if they are relevant. "
+            "If they do not cover the question, answer from your own knowledge.\n\n"
+            f"{references}\n\nQuestion:\n{prompt}"
+        )
+
+    def build_image_providers(self, config: BotConfig) -> list[ImageProvider]:
+        """
+        設定の順番で、停止していない画像生成のプロバイダを作成する
+        """
+        image_providers = {
+            PROVIDER_OPENAI: ImageProvider(PROVIDER_OPENAI, config.openai_image_model, self.openAIApi.generate_image),
+            PROVIDER_STABILITY: ImageProvider(
+                PROVIDER_STABILITY,
+                config.stable_diffusion_model,
+                self.stabilityApi.generate_image,
+                needs_english_prompt=True,
+                accepts_negative_prompt=True,
+            ),
+        }
+        return [
+            image_providers[name]
+            for name in config.image_providers
+            if name in image_providers and name not in config.disabled_providers
+        ]
+
+    def apply_config(self, config: BotConfig):
+        """
+        再読み込みした設定を、作成時に設定値を受け取ったコンポーネントに反映する
+        """
+        self.promptTranslator.cache_ttl = config.sd_prompt_cache_ttl
+        self.conversationCompactor.threshold_tokens = config.conversation_compaction_tokens
+        self.imageLineageStore.capacity = config.image_lineage_capacity
+        self.imageRouter.configure(
+            self.build_image_providers(config),
+            timeout=config.image_provider_timeout,
+            cooldown=config.image_provider_cooldown,
+        )
+        traceRecorder.sample_rate = config.trace_sample_rate
+
+    async def close(self):
+        """
+        実行中の要約と溜まっている会話履歴・画像の生成履歴・使用量・トレースを書き込み、ストアと HTTP クライアントを閉じる
+        """
+        await self.conversationCompactor.wait()
+        await self.conversationStore.flush()
+        self.conversationStore.close()
+        await self.imageLineageStore.flush()
+        self.imageLineageStore.close()
+        await usageLedger.close()
+        await traceRecorder.close()
+        if self.docIndex is not None:
+            self.docIndex.close()
+        self.openAIApi.close()
+
+    async def send_followup(self, interaction: discord.Interaction, content: Optional[str] = None, **kwargs):
+        """
+        followup で返信する. 長いコマンドでインタラクションのトークンの期限が切れている場合は、
+        ユーザーにメンションしてチャンネルに送信する
+
+        Args:
+            interaction: Discord のインタラクション
+            content: 本文
+            kwargs: followup.send に渡す引数 (file / embed / wait など)
+        """
+        if not is_token_expired(interaction.created_at.timestamp()):
+            try:
+                return await interaction.followup.send(content=content, **kwargs)
+            except discord.HTTPException as e:
+                if e.code != INVALID_WEBHOOK_TOKEN:
+                    raise
+        metrics.increment("followup.channel_fallback")
+        kwargs.pop("wait", None)
+        mention = f"<@{interaction.user.id}>"
+        return await interaction.channel.send(content=f"{mention} {content}" if content else mention, **kwargs)
 
     async def send_message_async(self, interaction: discord.Interaction, message: str):
-        # message が 2000 文字以上だったら 1800 文字ごとに分割して送信
-        if len(message) > 2000:
-            is_first = True
-            for i in range(0, len(message), 1800):
-                if is_first:
-                    await interaction.followup.send(content=message[i:i + 1800])
-                    is_first = False
-                else:
-                    await interaction.channel.send(content=message[i:i + 1800])
-        else:
-            await interaction.followup.send(content=message)
+        # Markdown の構造を保ったまま分割し、followup (期限切れの場合はチャンネル) で送信する
+        chunks = split_markdown_message(message, botConfig.message_chunk_size)
+        if len(chunks) > botConfig.max_split_messages:
+            # 分割数が多すぎる場合はプレビューと全文の .md ファイルを 1 回で送信
+            preview = build_preview(message, botConfig.message_chunk_size - len(Constants.long_answer_notice) - 2)
+            file = discord.File(io.BytesIO(message.encode("utf-8")), filename=Constants.long_answer_filename)
+            await self.send_followup(interaction, content=f"{preview}\n\n{Constants.long_answer_notice}", file=file)
+            return
+        for chunk in chunks:
+            await self.send_followup(interaction, content=chunk)
+
+    async def edit_translated_prompt(self, message: discord.Message, prefix: str, prompt: str):
+        """
+        画像を先に送信した後で、英語のプロンプトを日本語に翻訳してメッセージを編集する
+
+        Args:
+            message: 画像を送信したメッセージ
+            prefix: プロンプトの前に表示する内容
+            prompt: 画像生成に使われた英語のプロンプト
+        """
+        try:
+            translated_prompt = await asyncio.to_thread(translate_text, prompt)
+        except Exception as e:
+            # 翻訳できなかった場合は英語のプロンプトのままにする
+            logger.warning(f"Failed to translate image prompt: {e}")
+            return
+        await message.edit(content=f"{prefix}```{translated_prompt}```")
+
+    async def delete_unused_thread(self, thread: discord.Thread):
+        """
+        回答と並行して作成したスレッドを、回答がエラーになった場合に削除する
+        """
+        try:
+            await thread.delete()
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to delete unused thread {thread.id}: {e}")
 
     # TelGPTがオーナーのスレッド内でのメッセージ受信は会話となる
     async def on_receive_message_in_bot_thread(self, message: discord.Message):
         channel = message.channel
         # スレッドの中でTelGPTがオーナーの場合は会話セッション
 
-        # 現在のメッセージが回答中のメッセージだったら回答できない
-        async for channelMessage in channel.history(limit=1):
-            if channelMessage.author == self.discord_client.user and channelMessage.content == Constants.answering_message:
-                await channel.send("回答中は質問できません。しばらくお待ちください。")
-                return
+        # 回答中のスレッドでは質問できない (Discord の履歴を見ずにプロセス内で判定する)
+        if channel.id in self.answering_thread_ids:
+            await channel.send("回答中は質問できません。しばらくお待ちください。")
+            return
+        # AI に問い合わせる前に利用上限を確認する
+        quota_message = await usageLedger.check_quota(message.author.id, message.guild.id if message.guild else None)
+        if quota_message is not None:
+            await channel.send(quota_message)
+            return
+        self.answering_thread_ids.add(channel.id)
+        try:
+            await self.answer_in_bot_thread(message)
+        finally:
+            self.answering_thread_ids.discard(channel.id)
 
+    async def answer_in_bot_thread(self, message: discord.Message):
+        channel = message.channel
         temporary_message = await channel.send(Constants.answering_message)
 
-        # スレッド内のメッセージを取得
-        prompts = []
-        async for channelMessage in channel.history(limit=10):
-            if channelMessage.author == self.discord_client.user:
-                prompts.append(Message(role="assistant", content=channelMessage.content))
-            else:
-                prompts.append(Message(role="user", content=channelMessage.content))
-        prompts.reverse()
+        # 要約と保存済みの直近のメッセージから会話履歴を作成する
+        self.conversationStore.append(self.to_stored_message(message))
+        prompts = await self.conversationCompactor.build_prompts(channel.id)
+        if len(prompts) <= 1:
+            # 保存されていないスレッドのみ Discord の履歴から取得して保存する
+            history: list[StoredMessage] = []
+            async for channelMessage in channel.history(limit=botConfig.conversation_history_limit, before=temporary_message):
+                history.append(self.to_stored_message(channelMessage))
+            self.conversationStore.extend(history)
+            prompts = await self.conversationCompactor.build_prompts(channel.id)
 
-        # スレッド内のメッセージを使ってAIに質問
-        result = self.openAIApi.conversation(botConfig.openai_chat_model, prompts=prompts)
-        if "error" in result:
-            await temporary_message.edit(content=f"{result['error']['message']}")
+        # スレッド内のメッセージを使ってAIに質問 (イベントループを止めず、on_message の期限と取り消しに従う)
+        result = await asyncio.to_thread(self.openAIApi.conversation, botConfig.openai_chat_model, prompts=prompts)
+        if not result.ok:
+            await temporary_message.edit(content=result.error.message)
         else:
-            await temporary_message.edit(content=result['response'])
+            await temporary_message.edit(content=result.payload)
+            self.conversationStore.append(
+                self.to_stored_message(temporary_message, content=result.payload)
+            )
         return
 
+    def to_stored_message(self, message: discord.Message, content: str = None) -> StoredMessage:
+        """
+        Discord のメッセージを会話ストアに保存する形式に変換する
+        """
+        return StoredMessage(
+            thread_id=message.channel.id,
+            message_id=message.id,
+            role="assistant" if message.author == self.discord_client.user else "user",
+            content=message.content if content is None else content,
+            created_at=message.created_at.timestamp(),
+        )
+
     # TelBOTへのメンションを受け取った場合の処理
     async def on_receive_mention_from_user(self, message: discord.Message):
         channel = message.channel
@@ -91,38 +341,80 @@ class TelDiscordCommand(TelGPTCommand):
             if len(message.attachments) == 0:
                 await temporary_message.edit(content="画像が添付されていません")
                 return
-            attachment = message.attachments[0]
-            if attachment.content_type != "image/png" and attachment.content_type != "image/jpeg":
+            attachments = [
+                attachment for attachment in message.attachments
+                if attachment.content_type in Constants.image_attachment_content_types
+            ][:Constants.embed_count_limit]
+            if len(attachments) == 0:
                 await temporary_message.edit(content="画像の形式が正しくありません")
                 return
-            save_file_path = "image.png"
-            try:
-                download_image(attachment.url, save_file_path)
-            except Exception as e:
-                await temporary_message.edit(content=str(e))
+
+            # すべての添付画像の読み込み・変換・再生成を並行して行う
+            with metrics.timer("handler.image_variation"):
+                results = await asyncio.gather(
+                    *(self.create_image_variation(attachment) for attachment in attachments)
+                )
+            embeds = []
+            errors = []
+            for attachment, result in zip(attachments, results):
+                if not result.ok:
+                    errors.append(f"{attachment.filename}: {result.error.message}")
+                    continue
+                embed = discord.Embed()
+                embed.set_image(url=result.payload['url'])
+                embeds.append(embed)
+            if len(embeds) == 0:
+                await temporary_message.edit(content="\n".join(errors))
                 return
-            response = self.openAIApi.create_image_variation(
-                model=botConfig.openai_image_model,
-                image_path=save_file_path
+            await temporary_message.edit(
+                content="\n".join(["生成された画像を元に再生成しました", *errors]),
+                embeds=embeds
             )
-            image_url = response['response'].url
-            embed = discord.Embed()
-            embed.set_image(url=image_url)
-            await temporary_message.edit(content="生成された画像を元に再生成しました", embed=embed)
             return  # 画像再生成の処理が終わったので終了
 
+    async def create_image_variation(self, attachment: discord.Attachment) -> ProviderResult:
+        """
+        添付画像をメモリに読み込み、正方形の PNG に変換してからバリエーションを生成する
+
+        Args:
+            attachment: 元の画像の添付ファイル
+
+        Returns:
+            ProviderResult: payload に生成された画像の URL
+        """
+        if attachment.size > Constants.image_attachment_max_bytes:
+            return ProviderResult.failure(1, "画像のサイズが大きすぎます")
+        try:
+            data = await attachment.read()
+            # 画像の変換は CPU を使うため、イベントループを止めないようにワーカースレッドで行う
+            image = await asyncio.to_thread(normalize_image, data)
+        except (discord.HTTPException, ImageNormalizeError) as e:
+            return ProviderResult.failure(1, str(e))
+        model = botConfig.openai_image_model
+        return await self.singleFlight.run(
+            request_key("image_variation", model, hashlib.sha256(image).hexdigest()),
+            self.openAIApi.create_image_variation,
+            model=model,
+            image=image
+        )
+
     def generate_revise_image_prompt(self, old_prompts: list[str], new_prompt: str) -> str:
+        """
+        これまでのプロンプトと新しい要求から再生成用のプロンプトを作成する
+
+        Args:
+            old_prompts: 最初のプロンプトとその後の再生成の要求 (古い順)
+            new_prompt: 新しい再生成の要求
+        """
         first_prompt = old_prompts[0]
-        if len(old_prompts) == 1 or len(old_prompts) == 2:
+        if len(old_prompts) == 1:
             return f"""
             Initially, the image was requested with the theme "{first_prompt}". 
             Now, we would like to update and refine this concept with a new request: "{new_prompt}". 
             Please regenerate the image incorporating these insights.
             """
         else:
-            revised_prompts = old_prompts[2:]
-            revised_prompts.reverse()
-            revised_worlds = f"\",\"".join(revised_prompts)
+            revised_worlds = f"\",\"".join(old_prompts[1:])
             revised_worlds = f"\"{revised_worlds}\""
             return f"""
             First request: "{first_prompt}".
@@ -130,6 +422,56 @@ class TelDiscordCommand(TelGPTCommand):
             Latest revise request: "{new_prompt}".
             """
 
+    def record_image_lineage(
+        self,
+        message: discord.Message,
+        result: ProviderResult,
+        parent: Optional[ImageLineage] = None,
+        prompt: Optional[str] = None
+    ):
+        """
+        送信した画像の生成履歴を記録する
+
+        Args:
+            message: 画像を送信した Bot のメッセージ
+            result: 画像生成の結果
+            parent: 再生成の元になった画像の生成履歴 (最初の生成の場合は None)
+            prompt: ユーザーのプロンプト (再生成の場合は再生成の要求)
+        """
+        response = result.payload
+        details = dict(
+            revised_prompt=response.get('prompt'),
+            seed=response.get('seed'),
+            provider=result.provider,
+            model=result.model,
+        )
+        if parent is None:
+            lineage = ImageLineage(message_id=message.id, prompts=[prompt], **details)
+        else:
+            lineage = parent.revise(message.id, prompt, **details)
+        self.imageLineageStore.put(lineage)
+
+    async def resolve_reference(self, message: discord.Message) -> Optional[discord.Message]:
+        """
+        返信元のメッセージを取得する
+
+        返信元は通常 Gateway のイベントに含まれるが、含まれずメッセージキャッシュにもない場合は API で取得する
+
+        Returns:
+            Optional[discord.Message]: 返信でない場合や、返信元が削除されている場合は None
+        """
+        reference = message.reference
+        if reference is None or reference.message_id is None:
+            return None
+        if isinstance(reference.resolved, discord.Message):
+            return reference.resolved
+        if isinstance(reference.resolved, discord.DeletedReferencedMessage):
+            return None
+        try:
+            return await message.channel.fetch_message(reference.message_id)
+        except discord.NotFound:
+            return None
+
     async def on_message(self, message: discord.Message):
         if message.author == self.discord_client.user:
             return
@@ -148,63 +490,73 @@ class TelDiscordCommand(TelGPTCommand):
 
             temporary_message = await channel.send(Constants.answering_message)
 
-            base_message = message.reference.resolved
+            base_message = await self.resolve_reference(message)
             if base_message is None:
                 return
             if base_message.author == self.discord_client.user and len(base_message.embeds) > 0:
                 # Botが生成した画像に関するユーザの要求
-                request_prompt: list[str] = []
                 new_prompt = message.content
-                if is_in_thread:
-                    # スレッド内部なのでチャット履歴を持ってプロンプトを生成
-                    # スレッドタイトルが一番最初の質問
-                    request_prompt.append(message.channel.name)
-                    # スレッドの最初ログを数取得質問を取得
-                    async for first_message in channel.history(limit=10):
-                        if first_message.author != self.discord_client.user:
-                            request_prompt.append(first_message.content)
-                    response = self.openAIApi.generate_image(
-                        botConfig.openai_image_model,
-                        prompt=self.generate_revise_image_prompt(
-                            request_prompt,
-                            new_prompt
-                        )
+                lineage = await self.imageLineageStore.get(base_message.id)
+                if lineage is None:
+                    # 生成履歴の記録がない画像は、スレッド名かメッセージの 1 行目を最初のプロンプトとみなす
+                    original_prompt = (
+                        channel.name if is_in_thread
+                        else base_message.content.split("\n")[0].replace("Q:", "")
                     )
-                    if "error" in response:
-                        await temporary_message.edit(content=f"{response['error']['message']}")
-                    else:
-                        response = response['response']
-                        embed = discord.Embed()
-                        embed.set_image(url=response['url'])
-                        await temporary_message.edit(content=f"```{translate_text(response['prompt'])}```", embed=embed)
+                    lineage = ImageLineage(message_id=base_message.id, prompts=[original_prompt])
+                revise_prompt = self.generate_revise_image_prompt(lineage.prompts, new_prompt)
+                # 元の画像と同じプロバイダで再生成する
+                preferred = lineage.provider or PROVIDER_OPENAI
+                if is_in_thread:
+                    with metrics.timer("handler.revise_image_in_thread"):
+                        result = await self.imageRouter.generate(revise_prompt, preferred=preferred)
+                        if not result.ok:
+                            await temporary_message.edit(content=result.error.message)
+                        else:
+                            response = result.payload
+                            file, embed = self.build_image_message(result)
+                            # 画像を先に表示し、翻訳したプロンプトは後から反映する
+                            await temporary_message.edit(
+                                content=f"```{response['prompt']}```",
+                                embed=embed,
+                                attachments=[file]
+                            )
+                            self.record_image_lineage(temporary_message, result, lineage, new_prompt)
+                            await self.edit_translated_prompt(temporary_message, "", response['prompt'])
                 else:
-                    before_prompt = base_message.content.split("\n")[0].replace("Q:", "")
-                    request_prompt.append(before_prompt)
-                    response = self.openAIApi.generate_image(
-                        botConfig.openai_image_model,
-                        prompt=self.generate_revise_image_prompt(
-                            request_prompt,
-                            new_prompt
-                        )
-                    )
-                    if "error" in response:
-                        await temporary_message.edit(content=f"{response['error']['message']}")
-                    else:
-                        # スレッドの生成
-                        thread = await message.channel.create_thread(
-                            name=before_prompt,
-                            auto_archive_duration=60,
-                            type=discord.ChannelType.public_thread
-                        )
-                        response = response['response']
-                        embed = discord.Embed()
-                        embed.set_image(url=response['url'])
-                        await thread.send(content=f"```{translate_text(response['prompt'])}```", embed=embed)
-                        await temporary_message.edit(content=f"スレッドで送信しました {thread.mention}")
+                    with metrics.timer("handler.revise_image_in_channel"):
+                        # 画像の生成とスレッドの作成は互いに依存しないため並行して行う
+                        async with asyncio.TaskGroup() as group:
+                            image_task = group.create_task(
+                                self.imageRouter.generate(revise_prompt, preferred=preferred)
+                            )
+                            thread_task = group.create_task(message.channel.create_thread(
+                                name=truncate_text(lineage.original_prompt, Constants.thread_name_limit),
+                                auto_archive_duration=60,
+                                type=discord.ChannelType.public_thread
+                            ))
+                        result = image_task.result()
+                        thread = thread_task.result()
+                        if not result.ok:
+                            await self.delete_unused_thread(thread)
+                            await temporary_message.edit(content=result.error.message)
+                        else:
+                            response = result.payload
+                            file, embed = self.build_image_message(result)
+                            # 画像を先に送信し、翻訳したプロンプトは後から反映する
+                            image_message = await thread.send(
+                                content=f"```{response['prompt']}```",
+                                file=file,
+                                embed=embed
+                            )
+                            self.record_image_lineage(image_message, result, lineage, new_prompt)
+                            await temporary_message.edit(content=f"スレッドで送信しました {thread.mention}")
+                            await self.edit_translated_prompt(image_message, "", response['prompt'])
                 return  # 画像生成への返答の処理が終わったので終了
 
             if is_in_thread:
-                if channel.owner == self.discord_client.user:
+                # channel.owner はメンバーキャッシュを参照するため、ID で比較する
+                if channel.owner_id == self.discord_client.user.id:
                     await self.on_receive_message_in_bot_thread(message)
                 else:
                     # スレッドの中でTelGPTがオーナーでない場合は会話セッション
@@ -219,15 +571,19 @@ class TelDiscordCommand(TelGPTCommand):
     async def gemini_question(self, interaction: discord.Interaction, prompt: str):
         result_message = f"Q:{prompt}\n"
         await interaction.response.defer()
-        result = self.geminiApi.question(
-            model=botConfig.gemini_chat_model,
-            prompt=prompt,
-            system_setting="You are a helpful assistant."
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        decision = self.modelRouter.route("gemini_question", PROVIDER_GEMINI, prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("gemini_question", decision.model, prompt),
+                self.geminiApi.question,
+                model=decision.model,
+                prompt=prompt,
+                system_setting="You are a helpful assistant."
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
     async def gemini_question_udon(self, interaction: discord.Interaction, prompt: str):
@@ -253,15 +609,21 @@ class TelDiscordCommand(TelGPTCommand):
 
             When answering, include detailed code examples, Unity Editor walkthroughs, and actionable advice. Provide best practices and refer to official documentation or reputable resources as needed. Aim to assist users in solving real-world development challenges effectively.
             """
-        result = self.geminiApi.question(
-            model=botConfig.gemini_chat_model,
-            prompt=prompt,
-            system_setting=system_setting
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        # 回答のまとめと振り分けは質問内容で行い、プロバイダにはドキュメントを添えて送信する
+        decision = self.modelRouter.route("gemini_question_udon", PROVIDER_GEMINI, prompt)
+        augmented_prompt = self.augment_udon_prompt(prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("gemini_question_udon", decision.model, prompt),
+                self.geminiApi.question,
+                model=decision.model,
+                prompt=augmented_prompt,
+                system_setting=system_setting
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
     async def claude_question(self, interaction: discord.Interaction, prompt: str):
@@ -274,15 +636,19 @@ class TelDiscordCommand(TelGPTCommand):
         """
         result_message = f"Q:{prompt}\n"
         await interaction.response.defer()
-        result = self.langchainClaudeApi.question(
-            model=botConfig.claude_model,
-            prompt=prompt,
-            system_setting="You are a helpful assistant."
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        decision = self.modelRouter.route("claude_question", PROVIDER_CLAUDE, prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("claude_question", decision.model, prompt),
+                self.langchainClaudeApi.question,
+                model=decision.model,
+                prompt=prompt,
+                system_setting="You are a helpful assistant."
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
     async def claude_question_udon(self, interaction: discord.Interaction, prompt: str):
@@ -315,29 +681,39 @@ class TelDiscordCommand(TelGPTCommand):
 
             When answering, include detailed code examples, Unity Editor walkthroughs, and actionable advice. Provide best practices and refer to official documentation or reputable resources as needed. Aim to assist users in solving real-world development challenges effectively.
             """
-        result = self.langchainClaudeApi.question(
-            model=botConfig.claude_model,
-            prompt=prompt,
-            system_setting=system_setting
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        # 回答のまとめと振り分けは質問内容で行い、プロバイダにはドキュメントを添えて送信する
+        decision = self.modelRouter.route("claude_question_udon", PROVIDER_CLAUDE, prompt)
+        augmented_prompt = self.augment_udon_prompt(prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("claude_question_udon", decision.model, prompt),
+                self.langchainClaudeApi.question,
+                model=decision.model,
+                prompt=augmented_prompt,
+                system_setting=system_setting
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
     async def openai_question(self, interaction: discord.Interaction, prompt: str):
         result_message = f"Q:{prompt}\n"
         await interaction.response.defer()
-        result = self.openAIApi.question(
-            model=botConfig.openai_chat_model,
-            prompt=prompt,
-            system_setting=""
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        decision = self.modelRouter.route("openai_question", PROVIDER_OPENAI, prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("openai_question", decision.model, prompt),
+                self.openAIApi.question,
+                model=decision.model,
+                prompt=prompt,
+                system_setting=""
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
     async def openai_question_udon(self, interaction: discord.Interaction, prompt: str):
@@ -363,123 +739,184 @@ class TelDiscordCommand(TelGPTCommand):
 
             When answering, include detailed code examples, Unity Editor walkthroughs, and actionable advice. Provide best practices and refer to official documentation or reputable resources as needed. Aim to assist users in solving real-world development challenges effectively.
             """
-        result = self.openAIApi.question(
-            model=botConfig.openai_chat_model,
-            prompt=prompt,
-            system_setting=system_setting
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
+        # 回答のまとめと振り分けは質問内容で行い、プロバイダにはドキュメントを添えて送信する
+        decision = self.modelRouter.route("openai_question_udon", PROVIDER_OPENAI, prompt)
+        augmented_prompt = self.augment_udon_prompt(prompt)
+        with metrics.timer(f"provider.{decision.model.value}"):
+            result = await self.singleFlight.run(
+                request_key("openai_question_udon", decision.model, prompt),
+                self.openAIApi.question,
+                model=decision.model,
+                prompt=augmented_prompt,
+                system_setting=system_setting
+            )
+        if not result.ok:
+            result_message += result.error.message
         else:
-            result_message += result['response']
+            result_message += result.payload
         await self.send_message_async(interaction, result_message)
 
-    # async def gemini_generate_image(self, interaction: discord.Interaction, prompt: str):
-    #     result_message = f"Q:{prompt}\n"
-    #     await interaction.response.defer()
-    #     result = self.geminiApi.generate_image(
-    #         model=botConfig.gemini_image_model,
-    #         prompt=prompt
-    #     )
-    #     if "error" in result:
-    #         result_message += f"{result['error']['message']}"
-    #         await interaction.followup.send(content=result_message)
-    #     else:
-    #         response = result['response']
-    #         embed = discord.Embed()
-    #         embed.set_image(url=response['url'])
-    #         translated_prompt = translate_text(response['prompt'])
-    #         result_message += f"```{translated_prompt}```"
-    #         await interaction.followup.send(content=result_message, embed=embed)
+    async def question_all(self, interaction: discord.Interaction, prompt: str):
+        """
+        OpenAI / Gemini / Claude に同時に質問し、届いた順に 1 つのメッセージの Embed に反映する
 
-    async def openai_generate_image(self, interaction: discord.Interaction, prompt: str):
-        result_message = f"Q:{prompt}\n"
+        遅いプロバイダやエラーになったプロバイダがあっても、他のプロバイダの回答は待たずに表示する
+
+        Args:
+            interaction: Discord のインタラクション
+            prompt: ユーザーの質問内容
+        """
         await interaction.response.defer()
-        result = self.openAIApi.generate_image(
-            model=botConfig.openai_image_model,
-            prompt=prompt
-        )
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
-            await interaction.followup.send(content=result_message)
-        else:
-            response = result['response']
-            embed = discord.Embed()
-            embed.set_image(url=response['url'])
-            translated_prompt = translate_text(response['prompt'])
-            result_message += f"```{translated_prompt}```"
-            await interaction.followup.send(content=result_message, embed=embed)
+        providers = [
+            ("OpenAI", "openai_question", PROVIDER_OPENAI, self.openAIApi),
+            ("Gemini", "gemini_question", PROVIDER_GEMINI, self.geminiApi),
+            ("Claude", "claude_question", PROVIDER_CLAUDE, self.langchainClaudeApi),
+        ]
+        # キルスイッチで停止しているプロバイダには質問しない
+        providers = [entry for entry in providers if entry[2] not in botConfig.disabled_providers]
+        if not providers:
+            await self.send_followup(interaction, Constants.provider_disabled_message)
+            return
+        embed = discord.Embed(title=truncate_text(f"Q:{prompt}", Constants.embed_title_limit))
+        for label, _, _, _ in providers:
+            embed.add_field(name=label, value=Constants.answering_message, inline=False)
+        message = await self.send_followup(interaction, embed=embed, wait=True)
 
-    # 追加: Stable Diffusion で画像生成を行うメソッド
-    async def stablediffusion_generate_image(self, interaction: discord.Interaction, prompt: str, negative_prompt: str = None):
+        # 添付ファイル用の全文と、Embed に収まらず省略したか
+        answers: list[str] = [""] * len(providers)
+        is_truncated: list[bool] = [False] * len(providers)
+        edit_lock = asyncio.Lock()
+
+        async def ask(index: int, label: str, command: str, provider: str, api):
+            decision = self.modelRouter.route(command, provider, prompt)
+            start = time.perf_counter()
+            try:
+                # 個別のコマンドと同じキーを使い、同時に実行された同じ質問とプロバイダ呼び出しを共有する
+                with deadline_scope(botConfig.question_all_timeout):
+                    result = await asyncio.wait_for(
+                        self.singleFlight.run(
+                            request_key(command, decision.model, prompt),
+                            api.question,
+                            model=decision.model,
+                            prompt=prompt,
+                            system_setting="You are a helpful assistant."
+                        ),
+                        timeout=botConfig.question_all_timeout
+                    )
+            except asyncio.TimeoutError:
+                metrics.increment(f"question_all.timed_out.{provider}")
+                result = ProviderResult.failure(1, Constants.provider_timeout_message, provider=provider)
+            except Exception as e:
+                logger.exception(f"{label} failed in question_all: {e}")
+                result = ProviderResult.failure(1, f"{label} API Error: {e}", provider=provider)
+            elapsed = time.perf_counter() - start
+            metrics.observe(f"provider.{decision.model.value}", elapsed)
+
+            answer = result.payload if result.ok else result.error.message
+            answers[index] = f"## {label} ({decision.model.value}, {elapsed:.1f}s)\n\n{answer}"
+            value = truncate_text(answer, Constants.embed_field_value_limit)
+            is_truncated[index] = value != answer
+            async with edit_lock:
+                embed.set_field_at(
+                    index,
+                    name=f"{label} ({decision.model.value}) - {elapsed:.1f}s",
+                    value=value or "-",
+                    inline=False
+                )
+                try:
+                    await message.edit(embed=embed)
+                except discord.HTTPException as e:
+                    # 編集に失敗しても他のプロバイダの回答の反映は続ける
+                    logger.warning(f"Failed to update question_all message: {e}")
+
+        with metrics.timer("handler.question_all"):
+            async with asyncio.TaskGroup() as group:
+                for index, (label, command, provider, api) in enumerate(providers):
+                    group.create_task(ask(index, label, command, provider, api))
+
+        # Embed に収まらなかった回答は全文を添付ファイルで送信する
+        if any(is_truncated):
+            document = f"# Q:{prompt}\n\n" + "\n\n".join(answers)
+            file = discord.File(
+                io.BytesIO(document.encode("utf-8")),
+                filename=Constants.long_answer_filename
+            )
+            await self.send_followup(interaction, content=Constants.long_answer_notice, file=file)
+
+    def build_image_message(self, result: ProviderResult) -> tuple[discord.File, discord.Embed]:
         """
-        Stable Diffusion APIを使用して画像を生成する
+        生成した画像の添付ファイルと、画像と生成したモデルを表示する Embed を作成する
+
+        同じリクエストをまとめた場合も送信ごとに File を作成する必要があるため、送信の直前に呼び出す
+        """
+        file = discord.File(io.BytesIO(result.payload['image']), filename=Constants.generated_image_filename)
+        embed = discord.Embed()
+        embed.set_image(url=f"attachment://{Constants.generated_image_filename}")
+        embed.set_footer(text=f"{result.provider} / {result.model}")
+        return file, embed
+
+    async def generate_image(
+        self,
+        interaction: discord.Interaction,
+        prompt: str,
+        preferred: str,
+        negative_prompt: str = None
+    ):
+        """
+        preferred のプロバイダで画像を生成する. 失敗した場合は他のプロバイダで生成し直す
 
         Args:
             interaction: Discord インタラクション
             prompt: 画像生成のプロンプト
-            negative_prompt: ネガティブプロンプト（生成から除外したい要素）
+            preferred: 最初に試すプロバイダ名
+            negative_prompt: ネガティブプロンプト (対応するプロバイダのみ使う)
         """
         result_message = f"Q:{prompt}\n"
         if negative_prompt:
             result_message += f"Negative: {negative_prompt}\n"
-        
         await interaction.response.defer()
-        
-        try:
-            # Prompt を OpenAI で StableDiffusion 用の英語プロンプトに変換
-            # OpenAI API を使用してプロンプトを翻訳
-            # こちらのプロンプトを
-            gen_translated_prompt = self.openAIApi.question(
-                model=botConfig.openai_chat_model,
-                prompt=prompt,
-                system_setting="You are a bot that simply responds to the user's input prompts with English prompts for StableDiffusion. You do not need to respond with “Yes, sir” or “OK”, just simply respond with the prompt for SD."
-            )
-            if "error" in gen_translated_prompt:
-                result_message += f"{gen_translated_prompt['error']['message']}"
-                await interaction.channel.send(result_message, mention_author=True)
-            else:
-                # Stability API を使って画像生成
-                request_message = gen_translated_prompt['response']
-                result = self.stabilityApi.generate_image(
-                    model=botConfig.stable_diffusion_model,
-                    prompt=request_message,
-                    negative_prompt=negative_prompt
-                )
-
-                if "error" in result:
-                    # エラーがあった場合はログ出力してからユーザーに通知
-                    logger.error(f"Stability API Error: {result['error']['message']}")
-                    result_message += f"画像生成エラー: {result['error']['message']}"
-                    await interaction.followup.send(content=result_message)
-                    return
-
-                response = result['response']
+        result = await self.imageRouter.generate(prompt, preferred=preferred, negative_prompt=negative_prompt)
+        if not result.ok:
+            logger.error(f"Image generation failed on all providers: {result.error.message}")
+            await self.send_followup(interaction, content=f"{result_message}画像生成エラー: {result.error.message}")
+            return
 
-                # ファイルが存在し、読み込み可能か確認
-                file_path = response['url']
-                if not os.path.exists(file_path) or not os.path.isfile(file_path):
-                    logger.error(f"Generated image file not found: {file_path}")
-                    await interaction.followup.send(content=f"画像ファイルが見つかりません。生成処理は成功しましたが、ファイルの保存に問題が発生した可能性があります。")
-                    return
+        response = result.payload
+        file, embed = self.build_image_message(result)
+        if response.get('seed'):
+            embed.set_footer(text=f"{embed.footer.text} (Seed: {response['seed']})")
+        # 画像を先に送信し、翻訳したプロンプトは後から反映する
+        image_message = await self.send_followup(
+            interaction,
+            content=f"{result_message}```{response['prompt']}```",
+            file=file,
+            embed=embed,
+            wait=True
+        )
+        self.record_image_lineage(image_message, result, prompt=prompt)
+        # プロバイダが英語に書き換えたプロンプトのみ翻訳する
+        if response['prompt'] != prompt:
+            await self.edit_translated_prompt(image_message, result_message, response['prompt'])
 
-                # Discord用のFileオブジェクトを作成して送信
-                discord_file = discord.File(file_path, filename="generated_image.png")
+    async def openai_generate_image(self, interaction: discord.Interaction, prompt: str):
+        with metrics.timer("handler.openai_generate_image"):
+            await self.generate_image(interaction, prompt, preferred=PROVIDER_OPENAI)
 
-                # シード情報の追加
-                seed_info = ""
-                if response.get('seed'):
-                    seed_info = f" (Seed: {response['seed']})"
+    # 追加: Stable Diffusion で画像生成を行うメソッド
+    async def stablediffusion_generate_image(self, interaction: discord.Interaction, prompt: str, negative_prompt: str = None):
+        """
+        Stable Diffusion APIを使用して画像を生成する
 
-                result_message += f"```{request_message}```"
+        プロンプトは Stable Diffusion 用の英語のプロンプトに変換してから送信する
+        (英語・タグ形式のプロンプトと変換済みのプロンプトは OpenAI に問い合わせない)
 
-                # ファイルと一緒にメッセージを送信
-                await interaction.followup.send(content=result_message, file=discord_file)
-            
-        except Exception as e:
-            # 予期しないエラーの場合も詳細を記録して通知
-            logger.exception(f"Unexpected error in stablediffusion_generate_image: {str(e)}")
-            await interaction.followup.send(content=f"画像生成中に予期しないエラーが発生しました: {str(e)}")
+        Args:
+            interaction: Discord インタラクション
+            prompt: 画像生成のプロンプト
+            negative_prompt: ネガティブプロンプト（生成から除外したい要素）
+        """
+        with metrics.timer("handler.stablediffusion_generate_image"):
+            await self.generate_image(interaction, prompt, preferred=PROVIDER_STABILITY, negative_prompt=negative_prompt)
 
     # async def openai_recreate_image(self, interaction: discord.Interaction):
     #     await interaction.response.defer()
@@ -513,36 +950,110 @@ class TelDiscordCommand(TelGPTCommand):
         else:
             await interaction.response.defer()
 
-            result = self.openAIApi.question(
+            with metrics.timer("handler.openai_conversation"):
+                await self.start_conversation_thread(interaction, prompt, result_message)
+
+    async def start_conversation_thread(self, interaction: discord.Interaction, prompt: str, result_message: str):
+        """
+        最初の回答の生成とスレッドの作成を並行して行い、スレッドで回答する
+        """
+        async with asyncio.TaskGroup() as group:
+            question_task = group.create_task(asyncio.to_thread(
+                self.openAIApi.question,
                 model=botConfig.openai_chat_model,
                 prompt=prompt,
                 system_setting="You are a helpful assistant."
-            )
-            if "error" in result:
-                result_message += f"{result['error']['message']}"
-                await interaction.channel.send(result_message, mention_author=True)
-            else:
-                thread = await interaction.channel.create_thread(
-                    name=prompt,
-                    auto_archive_duration=60,
-                    type=discord.ChannelType.public_thread
-                )
-                link = thread.mention
-                await interaction.followup.send(content="スレッドを生成しました: " + link)
-                result_message += result['response']
-                await thread.send(result_message)
+            ))
+            thread_task = group.create_task(interaction.channel.create_thread(
+                name=truncate_text(prompt, Constants.thread_name_limit),
+                auto_archive_duration=60,
+                type=discord.ChannelType.public_thread
+            ))
+        result = question_task.result()
+        thread = thread_task.result()
+        if not result.ok:
+            await self.delete_unused_thread(thread)
+            result_message += result.error.message
+            await interaction.channel.send(result_message, mention_author=True)
+        else:
+            link = thread.mention
+            await self.send_followup(interaction, content="スレッドを生成しました: " + link)
+            result_message += result.payload
+            answer = await thread.send(result_message)
+            # スレッドの最初の質問と回答を会話履歴として保存
+            self.conversationStore.extend([
+                StoredMessage(
+                    thread_id=thread.id,
+                    message_id=interaction.id,
+                    role="user",
+                    content=prompt,
+                    created_at=interaction.created_at.timestamp(),
+                ),
+                StoredMessage(
+                    thread_id=thread.id,
+                    message_id=answer.id,
+                    role="assistant",
+                    content=result_message,
+                    created_at=answer.created_at.timestamp(),
+                ),
+            ])
 
     async def git_create_issue(self, interaction: discord.Interaction, title: str, message: str):
-        result_message = f"```{title}\n{message}```\n"
+        """
+        Issue の作成を outbox に登録してすぐに応答し、作成できたら応答を Issue の URL に編集する
+
+        Args:
+            interaction: Discord のインタラクション
+            title: Issue のタイトル
+            message: Issue の本文
+        """
+        result_message = f"```{title}\n{truncate_text(message, Constants.issue_preview_limit)}```\n"
         await interaction.response.defer()
 
         # ユーザーネームの先頭2文字だけ表示
         author = interaction.user.name[:2] + "***"
-        result = self.githubApi.create_issue(author, title, message)
-        if "error" in result:
-            result_message += f"{result['error']['message']}"
-            await interaction.followup.send(content=result_message)
-        else:
-            response = result['response']
-            result_message += f"Issueを作成しました: {response}"
-            await self.send_message_async(interaction, result_message)
+        answer = await interaction.followup.send(content=result_message + Constants.issue_queued_message, wait=True)
+        result = await outbox.enqueue(
+            KIND_GITHUB_ISSUE,
+            {"author": author, "title": title, "message": message},
+            # 同じユーザーが同じ内容の Issue を送信しても 1 件だけ作成する
+            dedup_key=hashlib.sha256(f"{interaction.user.id}\n{title}\n{message}".encode("utf-8")).hexdigest(),
+            reply={
+                "application_id": interaction.application_id,
+                "token": interaction.token,
+                "message_id": answer.id,
+                "channel_id": interaction.channel_id,
+                "user_id": interaction.user.id,
+                "created_at": interaction.created_at.timestamp(),
+                "prefix": result_message,
+                "success": Constants.issue_created_message,
+                "failure": Constants.issue_failed_message,
+            },
+        )
+        if not result.is_new:
+            suffix = (
+                Constants.issue_created_message.replace("{result}", result.result)
+                if result.result else Constants.issue_duplicate_message
+            )
+            await answer.edit(content=result_message + suffix)
+
+    async def deliver_issue(self, payloads: list[dict]) -> str:
+        """
+        outbox に登録された Issue を作成する (Issue は 1 件ずつ作成する)
+
+        Returns:
+            str: 作成した Issue の URL
+
+        Raises:
+            PermanentDeliveryError: 認証・権限・内容のエラー (4xx) で、再試行しても作成できない場合
+            RuntimeError: GitHub の障害 (5xx)・レート制限・通信エラーで、再試行する場合
+        """
+        payload = payloads[0]
+        result = await asyncio.to_thread(
+            self.githubApi.create_issue, payload["author"], payload["title"], payload["message"]
+        )
+        if not result.ok:
+            if is_permanent_http_error(result.error.code):
+                raise PermanentDeliveryError(result.error.message)
+            raise RuntimeError(result.error.message)
+        return result.payload
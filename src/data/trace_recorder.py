@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, Optional
+
+from .conversation_compactor import estimate_tokens
+from .entities.provider_result import ProviderResult, result_observers
+from .metrics import metrics
+from .model_router import CODE_PATTERN
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+def describe_text(text: str) -> dict:
+    """
+    テキストを記録せずに、負荷の再現に必要な特徴だけを取り出す
+
+    Returns:
+        dict: 文字数・UTF-8 のバイト数・推定トークン数・非 ASCII 文字の割合・コードを含むか
+    """
+    non_ascii = sum(1 for character in text if not character.isascii())
+    return {
+        "chars": len(text),
+        "bytes": len(text.encode("utf-8")),
+        "tokens": estimate_tokens(text),
+        "non_ascii_ratio": round(non_ascii / len(text), 3) if text else 0.0,
+        "has_code": CODE_PATTERN.search(text) is not None,
+    }
+
+
+def payload_size(payload: Any) -> int:
+    """
+    プロバイダの結果の大きさ (回答の UTF-8 のバイト数, 画像のバイト数)
+    """
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    if isinstance(payload, bytes):
+        return len(payload)
+    if isinstance(payload, dict):
+        return sum(payload_size(value) for value in payload.values())
+    return 0
+
+
+@dataclass
+class ProviderCallTrace:
+    """
+    インタラクションの中で行ったプロバイダの呼び出し
+    """
+    provider: Optional[str]
+    model: Optional[str]
+    ok: bool
+    error_code: Optional[str]
+    offset: float  # インタラクションの開始から結果を受け取るまでの時間 (秒)
+    latency: float
+    queued: float
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    images: int
+    payload_bytes: int
+    cache_hit: bool
+    coalesced: bool
+
+
+@dataclass
+class InteractionTrace:
+    """
+    匿名化したインタラクションの記録
+
+    ユーザー・ギルド・チャンネルの ID やプロンプトの本文は記録しない
+    """
+    command: str
+    started_at: float
+    arguments: dict[str, dict] = field(default_factory=dict)
+    calls: list[ProviderCallTrace] = field(default_factory=list)
+    duration: float = 0.0
+    outcome: str = "ok"
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def add_call(self, result: ProviderResult):
+        self.calls.append(ProviderCallTrace(
+            provider=result.provider,
+            model=result.model,
+            ok=result.ok,
+            error_code=None if result.ok else str(result.error.code),
+            offset=round(time.perf_counter() - self._started, 4),
+            latency=round(result.timings.total, 4),
+            queued=round(result.timings.queued, 4),
+            prompt_tokens=result.usage.prompt_tokens,
+            completion_tokens=result.usage.completion_tokens,
+            cached_tokens=result.usage.cached_tokens,
+            images=result.usage.images,
+            payload_bytes=payload_size(result.payload),
+            cache_hit=result.cache_hit,
+            coalesced=result.coalesced,
+        ))
+
+    def to_json(self) -> str:
+        record = asdict(self)
+        del record["_started"]
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, line: str) -> "InteractionTrace":
+        record = json.loads(line)
+        record["calls"] = [ProviderCallTrace(**call) for call in record.get("calls", [])]
+        return cls(**record)
+
+
+# 記録中のインタラクション. asyncio.to_thread やタスクにも引き継がれる
+current_trace: ContextVar[Optional[InteractionTrace]] = ContextVar("current_trace", default=None)
+
+
+def record_provider_call(result: ProviderResult):
+    trace = current_trace.get()
+    if trace is not None:
+        # ワーカースレッドから呼ばれるが、list.append はスレッドセーフ
+        trace.add_call(result)
+
+
+class TraceRecorder:
+    """
+    コマンドの負荷を再現するための匿名化したトレースを JSONL に記録する
+
+    open() を呼ぶまでは何も記録しない (オプトイン)。記録はメモリに溜め、flush_interval 秒ごとにまとめて追記する。
+    """
+
+    def __init__(self, flush_interval: float = 10.0):
+        self.flush_interval = flush_interval
+        self.path: Optional[str] = None
+        self.sample_rate = 1.0
+        self._pending: list[str] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.path is not None
+
+    def open(self, path: str, sample_rate: float = 1.0):
+        """
+        トレースの記録を開始する
+
+        Args:
+            path: トレースを追記する JSONL ファイル
+            sample_rate: 記録するインタラクションの割合 (0.0 - 1.0)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.sample_rate = sample_rate
+        if record_provider_call not in result_observers:
+            result_observers.append(record_provider_call)
+
+    @contextmanager
+    def trace(self, command: str, arguments: dict[str, Any]) -> Iterator[Optional[InteractionTrace]]:
+        """
+        with ブロック内のコマンドの実行とプロバイダの呼び出しを記録する
+
+        Args:
+            command: コマンド名
+            arguments: コマンドの引数 (文字列の引数は特徴だけを記録する)
+        """
+        if not self.is_enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = InteractionTrace(
+            command=command,
+            started_at=round(time.time(), 3),
+            arguments={name: describe_text(value) for name, value in arguments.items() if isinstance(value, str)},
+        )
+        token = current_trace.set(trace)
+        try:
+            yield trace
+        except asyncio.CancelledError:
+            trace.outcome = "cancelled"
+            raise
+        except Exception:
+            trace.outcome = "error"
+            raise
+        finally:
+            current_trace.reset(token)
+            trace.duration = round(time.perf_counter() - trace._started, 4)
+            with self._pending_lock:
+                self._pending.append(trace.to_json())
+            metrics.increment("trace.recorded")
+
+    def start(self):
+        """
+        定期的な書き込みを開始する
+        """
+        if self.is_enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """
+        溜まっているトレースを追記する
+        """
+        if not self.is_enabled:
+            return
+        async with self._flush_lock:
+            with self._pending_lock:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception as e:
+                logger.error(f"Failed to write traces: {e}")
+
+    def _write(self, lines: list[str]):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+    async def close(self):
+        """
+        定期的な書き込みを止め、残っているトレースを書き込む
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+def load_traces(path: str) -> list[InteractionTrace]:
+    """
+    JSONL のトレースを記録の開始時刻順に読み込む
+    """
+    with open(path, encoding="utf-8") as file:
+        traces = [InteractionTrace.from_json(line) for line in file if line.strip()]
+    traces.sort(key=lambda trace: trace.started_at)
+    return traces
+
+
+# プロセス全体で共有するトレースの記録
+traceRecorder = TraceRecorder()
@@ -0,0 +1,387 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+import discord
+
+from . import tel_discord_command
+from .entities.entity import Usage
+from .entities.provider_result import ProviderResult
+from .job_worker import WORKER_COMMANDS
+from .model_router import PROVIDER_CLAUDE, PROVIDER_GEMINI, PROVIDER_OPENAI, PROVIDER_STABILITY
+from .tel_discord_command import TelDiscordCommand
+from .trace_recorder import InteractionTrace, ProviderCallTrace
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+# トレースに記録がない呼び出しの応答時間 (秒)
+DEFAULT_PROVIDER_LATENCY = 1.0
+DEFAULT_TRANSLATE_LATENCY = 0.3
+# トレースに記録がない呼び出しの結果の大きさ (バイト)
+DEFAULT_PAYLOAD_BYTES = 600
+# 再生できる速度の範囲 (倍)
+MIN_SPEED = 1.0
+MAX_SPEED = 100.0
+
+
+def synthesize_text(features: dict, salt: int) -> str:
+    """
+    トレースに記録した特徴 (文字数・非 ASCII 文字の割合・コードの有無) から本文の代わりのテキストを作る
+
+    トレースごとに異なる salt を含め、本番では別々だった質問が再生時に 1 つにまとめられないようにする
+    """
+    chars = max(features.get("chars", 0), 1)
+    text = f"{salt} "
+    if features.get("has_code"):
+        text += "```\n{}\n```\n"
+    non_ascii = min(round(chars * features.get("non_ascii_ratio", 0.0)), chars - len(text))
+    text += "あ" * max(non_ascii, 0)
+    return text + "a" * max(chars - len(text), 0)
+
+
+@dataclass
+class ReplayContext:
+    """
+    再生中のトレースと、プロバイダごとのまだ再生していない呼び出し
+    """
+    trace: InteractionTrace
+    speed: float
+    calls: dict[Optional[str], deque[ProviderCallTrace]] = field(init=False)
+
+    def __post_init__(self):
+        calls = defaultdict(deque)
+        for call in self.trace.calls:
+            # 実行中の呼び出しの結果を共有した呼び出しはプロバイダを呼んでいない
+            if not call.coalesced and not call.cache_hit:
+                calls[call.provider].append(call)
+        self.calls = calls
+
+    def next_call(self, provider: str) -> Optional[ProviderCallTrace]:
+        calls = self.calls.get(provider)
+        return calls.popleft() if calls else None
+
+
+current_replay: ContextVar[Optional[ReplayContext]] = ContextVar("current_replay", default=None)
+
+
+class StubProviderAPI:
+    """
+    トレースに記録した応答時間だけ待ち、記録した大きさの結果を返すプロバイダ API の代わり
+
+    OpenAIAPI / GeminiAPI / LangchainClaudeAPI / StabilityAPI / GithubAPI と同じメソッドを持つ
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+
+    def _call(self, model: Any = None, is_image: bool = False) -> ProviderResult:
+        context = current_replay.get()
+        speed = context.speed if context is not None else 1.0
+        call = context.next_call(self.provider) if context is not None else None
+        latency = call.latency if call is not None else DEFAULT_PROVIDER_LATENCY
+        size = call.payload_bytes if call is not None else DEFAULT_PAYLOAD_BYTES
+        time.sleep(latency / speed)
+
+        model_name = getattr(model, "value", model)
+        if call is not None and not call.ok:
+            return ProviderResult.failure(call.error_code, "replayed error", provider=self.provider, model=model_name)
+        usage = Usage(
+            prompt_tokens=call.prompt_tokens if call is not None else 0,
+            completion_tokens=call.completion_tokens if call is not None else 0,
+            cached_tokens=call.cached_tokens if call is not None else 0,
+            images=1 if is_image else 0,
+        )
+        payload: Any = "a" * size
+        if is_image:
+            payload = {"image": b"\0" * size, "prompt": "replayed prompt", "seed": None, "url": "https://example.com"}
+        return ProviderResult.success(payload, usage=usage, provider=self.provider, model=model_name)
+
+    def question(self, model=None, prompt=None, system_setting=None) -> ProviderResult:
+        return self._call(model)
+
+    def conversation(self, model=None, prompts=None, max_tokens=None) -> ProviderResult:
+        return self._call(model)
+
+    def generate_image(self, model=None, prompt=None, **kwargs) -> ProviderResult:
+        return self._call(model, is_image=True)
+
+    def create_image_variation(self, model=None, image=None) -> ProviderResult:
+        return self._call(model, is_image=True)
+
+    def create_issue(self, author=None, title=None, message=None) -> ProviderResult:
+        return self._call()
+
+    def close(self):
+        pass
+
+
+def stub_translate_text(text: str) -> str:
+    context = current_replay.get()
+    time.sleep(DEFAULT_TRANSLATE_LATENCY / (context.speed if context is not None else 1.0))
+    return text
+
+
+@contextmanager
+def stub_providers() -> Iterator[None]:
+    """
+    with ブロックの間に作成した TelDiscordCommand のプロバイダ API と翻訳を代わりのものに置き換える
+    """
+    replacements = {
+        "OpenAIAPI": lambda: StubProviderAPI(PROVIDER_OPENAI),
+        "GeminiAPI": lambda: StubProviderAPI(PROVIDER_GEMINI),
+        "LangchainClaudeAPI": lambda: StubProviderAPI(PROVIDER_CLAUDE),
+        "StabilityAPI": lambda: StubProviderAPI(PROVIDER_STABILITY),
+        "GithubAPI": lambda: StubProviderAPI("github"),
+        "translate_text": stub_translate_text,
+    }
+    originals = {name: getattr(tel_discord_command, name) for name in replacements}
+    for name, replacement in replacements.items():
+        setattr(tel_discord_command, name, replacement)
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(tel_discord_command, name, original)
+
+
+_message_ids = itertools.count(1)
+
+
+class ReplayMessage:
+    def __init__(self, content: Optional[str] = None):
+        self.id = next(_message_ids)
+        self.content = content
+        self.created_at = datetime.now(timezone.utc)
+
+    async def edit(self, content: Optional[str] = None, **kwargs):
+        if content is not None:
+            self.content = content
+
+
+class ReplayThread:
+    def __init__(self, name: str):
+        self.id = next(_message_ids)
+        self.name = name
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> ReplayMessage:
+        return ReplayMessage(content)
+
+    async def delete(self):
+        pass
+
+
+class ReplayChannel:
+    type = discord.ChannelType.text
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> ReplayMessage:
+        return ReplayMessage(content)
+
+    async def create_thread(self, name: str, **kwargs) -> ReplayThread:
+        return ReplayThread(name)
+
+
+class ReplayResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        pass
+
+    def is_done(self) -> bool:
+        return True
+
+
+class ReplayFollowup:
+    async def send(self, content: Optional[str] = None, **kwargs) -> ReplayMessage:
+        return ReplayMessage(content)
+
+
+class ReplayUser:
+    id = 0
+    name = "replay"
+
+
+class ReplayInteraction:
+    """
+    再生用のインタラクション. Discord には何も送信しない
+    """
+
+    application_id = 0
+    token = "replay"
+    channel_id = 0
+
+    def __init__(self):
+        self.id = next(_message_ids)
+        self.created_at = datetime.now(timezone.utc)
+        self.user = ReplayUser()
+        self.guild_id = None
+        self.channel = ReplayChannel()
+        self.response = ReplayResponse()
+        self.followup = ReplayFollowup()
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """
+    最近傍法のパーセンタイル
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(ratio * len(ordered)) - 1))]
+
+
+@dataclass
+class ReplayReport:
+    """
+    再生結果
+
+    latency はウォールクロックの秒数で、scaled_* は速度を掛けて本番の時間に換算した値
+    """
+    speed: float
+    concurrency: Optional[int]
+    replayed: int = 0
+    errors: int = 0
+    skipped: int = 0
+    wall_seconds: float = 0.0
+    offered_rate: float = 0.0  # 1 秒あたりに到着したインタラクション数
+    throughput: float = 0.0  # 1 秒あたりに完了したインタラクション数
+    latencies: list[float] = field(default_factory=list, repr=False)
+    queue_waits: list[float] = field(default_factory=list, repr=False)
+    command_latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list), repr=False)
+
+    @property
+    def is_sustainable(self) -> bool:
+        """
+        同時実行数の上限による待ち時間が、処理時間の中央値を超えずに済んだか (待ち行列が伸び続けていないか)
+        """
+        return percentile(self.queue_waits, 0.99) <= percentile(self.latencies, 0.5)
+
+    def summary(self) -> dict:
+        return {
+            "speed": self.speed,
+            "concurrency": self.concurrency,
+            "replayed": self.replayed,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "offered_rate": round(self.offered_rate, 3),
+            "throughput": round(self.throughput, 3),
+            # 本番の時間に換算したスループット
+            "scaled_throughput": round(self.throughput / self.speed, 3),
+            "sustainable": self.is_sustainable,
+            "latency_ms": {
+                name: round(percentile(self.latencies, ratio) * 1000, 1)
+                for name, ratio in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+            },
+            "scaled_latency_ms": {
+                name: round(percentile(self.latencies, ratio) * self.speed * 1000, 1)
+                for name, ratio in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            },
+            "queue_wait_p99_ms": round(percentile(self.queue_waits, 0.99) * 1000, 1),
+            "commands": {
+                command: {
+                    "count": len(values),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                }
+                for command, values in sorted(self.command_latencies.items())
+            },
+        }
+
+
+async def replay(
+    command: TelDiscordCommand,
+    traces: list[InteractionTrace],
+    speed: float = 1.0,
+    concurrency: Optional[int] = None
+) -> ReplayReport:
+    """
+    トレースを記録した間隔で TelDiscordCommand に再生し、スループットとレイテンシを計測する
+
+    Args:
+        command: プロバイダを stub_providers で置き換えて作成した TelDiscordCommand
+        traces: 記録の開始時刻順のトレース
+        speed: 再生速度 (到着間隔とプロバイダの応答時間を 1/speed にする)
+        concurrency: 同時に実行するコマンドの上限 (None の場合は無制限)
+
+    Returns:
+        ReplayReport: 再生結果
+    """
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError(f"speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+    report = ReplayReport(speed=speed, concurrency=concurrency)
+    replayable = [trace for trace in traces if trace.command in WORKER_COMMANDS]
+    report.skipped = len(traces) - len(replayable)
+    if not replayable:
+        return report
+
+    limit = asyncio.Semaphore(concurrency) if concurrency else None
+    loop = asyncio.get_running_loop()
+    origin = replayable[0].started_at
+    start = loop.time()
+    completed_at: list[float] = []
+
+    async def run_one(index: int, trace: InteractionTrace):
+        await asyncio.sleep(max(0.0, start + (trace.started_at - origin) / speed - loop.time()))
+        arrived = loop.time()
+        arguments = {name: synthesize_text(features, index) for name, features in trace.arguments.items()}
+        if limit is not None:
+            await limit.acquire()
+        began = loop.time()
+        token = current_replay.set(ReplayContext(trace=trace, speed=speed))
+        try:
+            await getattr(command, trace.command)(ReplayInteraction(), **arguments)
+        except Exception as e:
+            report.errors += 1
+            logger.warning(f"Replay of {trace.command} failed: {e}")
+        finally:
+            current_replay.reset(token)
+            if limit is not None:
+                limit.release()
+        finished = loop.time()
+        completed_at.append(finished)
+        report.queue_waits.append(began - arrived)
+        report.latencies.append(finished - arrived)
+        report.command_latencies[trace.command].append(finished - arrived)
+
+    await asyncio.gather(*(run_one(index, trace) for index, trace in enumerate(replayable)))
+
+    report.replayed = len(replayable)
+    report.wall_seconds = max(completed_at) - start
+    arrival_span = (replayable[-1].started_at - origin) / speed
+    report.offered_rate = len(replayable) / arrival_span if arrival_span > 0 else float(len(replayable))
+    report.throughput = len(replayable) / report.wall_seconds if report.wall_seconds > 0 else 0.0
+    return report
+
+
+async def run_replay(
+    traces: list[InteractionTrace],
+    speed: float = 1.0,
+    concurrency: Optional[int] = None,
+    executor_workers: Optional[int] = None
+) -> ReplayReport:
+    """
+    プロバイダを置き換えた TelDiscordCommand を作成してトレースを再生する
+
+    Args:
+        executor_workers: プロバイダの呼び出しに使うスレッドプールのスレッド数 (None の場合は asyncio の既定値)
+    """
+    loop = asyncio.get_running_loop()
+    if executor_workers is not None:
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=executor_workers))
+    with stub_providers():
+        command = TelDiscordCommand(discord_client=None)
+    try:
+        return await replay(command, traces, speed=speed, concurrency=concurrency)
+    finally:
+        await command.close()
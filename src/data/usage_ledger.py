@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+from typing import Iterator, Optional
+
+from .configs import botConfig
+from .entities.constants import Constants
+from .entities.entity import Usage
+from .metrics import metrics
+
+# ロガー設定
+logger = logging.getLogger('discord')
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """
+    モデルの料金 (USD). トークンは 100 万トークンあたり、画像は 1 枚あたり
+    """
+    prompt: float = 0.0
+    cached: float = 0.0
+    completion: float = 0.0
+    image: float = 0.0
+
+
+# モデルごとの料金 (各社の公開価格を元にした概算)
+MODEL_PRICES: dict[str, ModelPrice] = {
+    "gpt-4.1": ModelPrice(prompt=2.00, cached=0.50, completion=8.00),
+    "gpt-4o": ModelPrice(prompt=2.50, cached=1.25, completion=10.00),
+    "gpt-4o-mini": ModelPrice(prompt=0.15, cached=0.075, completion=0.60),
+    "gemini-2.0-flash": ModelPrice(prompt=0.10, cached=0.025, completion=0.40),
+    "gemini-2.5-flash-preview-05-20": ModelPrice(prompt=0.15, cached=0.0375, completion=0.60),
+    "claude-3-5-haiku-latest": ModelPrice(prompt=0.80, cached=0.08, completion=4.00),
+    "claude-3-7-sonnet-latest": ModelPrice(prompt=3.00, cached=0.30, completion=15.00),
+    "claude-sonnet-4-20250514": ModelPrice(prompt=3.00, cached=0.30, completion=15.00),
+    "claude-opus-4-20250514": ModelPrice(prompt=15.00, cached=1.50, completion=75.00),
+    "dall-e-3": ModelPrice(image=0.04),
+    "imagen-3.0-generate-001": ModelPrice(image=0.04),
+    "stable-diffusion-xl-1024-v1-0": ModelPrice(image=0.006),
+    "sd3-medium": ModelPrice(image=0.035),
+}
+
+
+def token_count(value) -> int:
+    """
+    レスポンスの使用量の値をトークン数に変換する (値が無い場合は 0)
+    """
+    return value if isinstance(value, int) else 0
+
+
+def estimate_cost(model: str, usage: Usage) -> float:
+    """
+    使用量から料金 (USD) を概算する. 料金が分からないモデルは 0 とする
+    """
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return 0.0
+    uncached_tokens = max(usage.prompt_tokens - usage.cached_tokens, 0)
+    return (
+        uncached_tokens * price.prompt
+        + usage.cached_tokens * price.cached
+        + usage.completion_tokens * price.completion
+    ) / 1_000_000 + usage.images * price.image
+
+
+@dataclass
+class UsageContext:
+    """
+    プロバイダを呼び出したユーザーとギルド
+    """
+    user_id: int
+    guild_id: Optional[int]
+    command: str
+
+
+# 実行中のコマンドのユーザーとギルド. asyncio.to_thread やタスクにも引き継がれる
+current_usage_context: ContextVar[Optional[UsageContext]] = ContextVar("current_usage_context", default=None)
+
+
+@contextmanager
+def usage_scope(user_id: int, guild_id: Optional[int], command: str) -> Iterator[UsageContext]:
+    """
+    with ブロック内のプロバイダ呼び出しの使用量を user_id と guild_id に記録する
+    """
+    context = UsageContext(user_id=user_id, guild_id=guild_id, command=command)
+    token = current_usage_context.set(context)
+    try:
+        yield context
+    finally:
+        current_usage_context.reset(token)
+
+
+@dataclass
+class UsageTotals:
+    """
+    使用量の合計
+    """
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    images: int = 0
+    cost_usd: float = 0.0
+
+    def add(self, usage: Usage, cost_usd: float, calls: int = 1):
+        self.calls += calls
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.cached_tokens += usage.cached_tokens
+        self.images += usage.images
+        self.cost_usd += cost_usd
+
+    def merge(self, other: "UsageTotals"):
+        self.add(
+            Usage(
+                prompt_tokens=other.prompt_tokens,
+                completion_tokens=other.completion_tokens,
+                cached_tokens=other.cached_tokens,
+                images=other.images,
+            ),
+            other.cost_usd,
+            calls=other.calls
+        )
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class UsageLedger:
+    """
+    プロバイダの使用量と料金をユーザー・ギルド・モデル・日ごとに集計する台帳
+
+    プロバイダの呼び出しごとにメモリ上で集計し、flush_interval 秒ごとにまとめて SQLite (WAL) に書き込む。
+    ワーカープロセスも同じファイルに書き込むため、利用上限の確認はファイルの値とメモリ上の未書き込みの値を合計して行う。
+    open() を呼ぶまではメモリ上で集計するだけで書き込まない。
+    """
+
+    def __init__(self, flush_interval: float = 10.0):
+        self.flush_interval = flush_interval
+        self.path: Optional[str] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        # (日付, ユーザーID, ギルドID, プロバイダ, モデル) ごとの未書き込みの使用量
+        self._pending: dict[tuple[str, int, int, str, str], UsageTotals] = {}
+        self._pending_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def open(self, path: str):
+        """
+        使用量を書き込むファイルを開く
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                guild_id INTEGER NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL,
+                images INTEGER NOT NULL,
+                cost_usd REAL NOT NULL,
+                PRIMARY KEY (day, user_id, guild_id, provider, model)
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS usage_day_guild ON usage (day, guild_id)")
+
+    def record(self, provider: str, model: Enum, usage: Usage):
+        """
+        プロバイダの呼び出し 1 回分の使用量を記録する (ワーカースレッドからも呼ばれる)
+
+        Args:
+            provider: プロバイダ名
+            model: 使用したモデル
+            usage: 使用量
+        """
+        context = current_usage_context.get()
+        user_id = context.user_id if context else 0
+        guild_id = context.guild_id if context and context.guild_id else 0
+        cost_usd = estimate_cost(model.value, usage)
+        key = (today(), user_id, guild_id, provider, model.value)
+        with self._pending_lock:
+            self._pending.setdefault(key, UsageTotals()).add(usage, cost_usd)
+        metrics.increment(f"usage.{provider}.tokens", usage.total_tokens)
+        metrics.increment(f"usage.{provider}.cached_tokens", usage.cached_tokens)
+        metrics.increment(f"usage.{provider}.images", usage.images)
+
+    def start(self):
+        """
+        定期的な書き込みを開始する
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """
+        メモリ上で集計した使用量をまとめて書き込む
+        """
+        if self._connection is None:
+            return
+        async with self._flush_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, {}
+            if not rows:
+                return
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                logger.error(f"Failed to write usage: {e}")
+                # 書き込めなかった使用量は次の書き込みで再試行する
+                with self._pending_lock:
+                    for key, totals in rows.items():
+                        self._pending.setdefault(key, UsageTotals()).merge(totals)
+
+    def _write(self, rows: dict[tuple[str, int, int, str, str], UsageTotals]):
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    """
+                    INSERT INTO usage (day, user_id, guild_id, provider, model, calls, prompt_tokens,
+                                       completion_tokens, cached_tokens, images, cost_usd)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (day, user_id, guild_id, provider, model) DO UPDATE SET
+                        calls = calls + excluded.calls,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens,
+                        cached_tokens = cached_tokens + excluded.cached_tokens,
+                        images = images + excluded.images,
+                        cost_usd = cost_usd + excluded.cost_usd
+                    """,
+                    [
+                        (*key, totals.calls, totals.prompt_tokens, totals.completion_tokens,
+                         totals.cached_tokens, totals.images, totals.cost_usd)
+                        for key, totals in rows.items()
+                    ]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    async def totals_today(self, user_id: Optional[int] = None, guild_id: Optional[int] = None) -> UsageTotals:
+        """
+        今日 (UTC) のユーザーまたはギルドの使用量の合計を取得する
+
+        Args:
+            user_id: ユーザーID (指定した場合はユーザーの合計)
+            guild_id: ギルドID (user_id を指定しない場合はギルドの合計)
+        """
+        day = today()
+        column, value = ("user_id", user_id) if user_id is not None else ("guild_id", guild_id or 0)
+        totals = UsageTotals()
+        if self._connection is not None:
+            totals = await asyncio.to_thread(self._totals, day, column, value)
+        index = 1 if column == "user_id" else 2
+        with self._pending_lock:
+            for key, pending in self._pending.items():
+                if key[0] == day and key[index] == value:
+                    totals.merge(pending)
+        return totals
+
+    def _totals(self, day: str, column: str, value: int) -> UsageTotals:
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT COALESCE(SUM(calls), 0), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0), "
+                f"COALESCE(SUM(cached_tokens), 0), COALESCE(SUM(images), 0), COALESCE(SUM(cost_usd), 0) "
+                f"FROM usage WHERE day = ? AND {column} = ?",
+                (day, value)
+            ).fetchone()
+        return UsageTotals(*row)
+
+    async def check_quota(self, user_id: int, guild_id: Optional[int]) -> Optional[str]:
+        """
+        ユーザーとギルドの今日の料金が上限に達していないか確認する
+
+        Returns:
+            Optional[str]: 上限に達している場合はユーザーに返すメッセージ
+        """
+        if botConfig.user_daily_quota_usd is not None:
+            totals = await self.totals_today(user_id=user_id)
+            if totals.cost_usd >= botConfig.user_daily_quota_usd:
+                metrics.increment("usage.quota_exceeded.user")
+                logger.info(f"User {user_id} exceeded the daily quota (${totals.cost_usd:.4f})")
+                return Constants.user_quota_exceeded_message
+        if guild_id is not None and botConfig.guild_daily_quota_usd is not None:
+            totals = await self.totals_today(guild_id=guild_id)
+            if totals.cost_usd >= botConfig.guild_daily_quota_usd:
+                metrics.increment("usage.quota_exceeded.guild")
+                logger.info(f"Guild {guild_id} exceeded the daily quota (${totals.cost_usd:.4f})")
+                return Constants.guild_quota_exceeded_message
+        return None
+
+    async def close(self):
+        """
+        定期的な書き込みを止め、残っている使用量を書き込んでファイルを閉じる
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._connection is not None:
+            with self._lock:
+                self._connection.close()
+            self._connection = None
+
+
+# プロセス全体で共有する使用量の台帳
+usageLedger = UsageLedger()
@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any
+from typing import List, Any
 
 from src.domain.models.ai_models import OpenAIChatModel, OpenAIImageModel, GeminiChatModel, GeminiImageModel
 from src.domain.models.message import Message
+from src.data.entities.provider_result import ProviderResult
 
 
 class AIServiceInterface(ABC):
@@ -10,14 +11,14 @@ class AIServiceInterface(ABC):
     AIサービスの基本インターフェース
     """
     @abstractmethod
-    def question(self, model: Any, prompt: str, system_setting: str) -> Dict[str, Any]:
+    def question(self, model: Any, prompt: str, system_setting: str) -> ProviderResult:
         """
         AIモデルに質問を送信し、回答を受け取る
         
         :param model: 使用するモデル
         :param prompt: 質問内容
         :param system_setting: システム設定
-        :return: レスポンスまたはエラー情報を含む辞書
+        :return: レスポンスまたはエラー情報を含む ProviderResult
         """
         pass
 
@@ -27,22 +28,22 @@ class OpenAIServiceInterface(AIServiceInterface):
     OpenAI API用のインターフェース
     """
     @abstractmethod
-    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> Dict[str, Any]:
+    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> ProviderResult:
         pass
     
     @abstractmethod
-    def conversation(self, model: OpenAIChatModel, prompts: List[Message]) -> Dict[str, Any]:
+    def conversation(self, model: OpenAIChatModel, prompts: List[Message]) -> ProviderResult:
         """
         OpenAIモデルとの会話形式の対話を行う
         
         :param model: 使用するモデル
         :param prompts: 会話履歴
-        :return: レスポンスまたはエラー情報を含む辞書
+        :return: レスポンスまたはエラー情報を含む ProviderResult
         """
         pass
     
     @abstractmethod
-    def generate_image(self, model: OpenAIImageModel, prompt: str) -> Dict[str, Any]:
+    def generate_image(self, model: OpenAIImageModel, prompt: str) -> ProviderResult:
         """
         OpenAIを使用して画像を生成する
         
@@ -53,7 +54,7 @@ class OpenAIServiceInterface(AIServiceInterface):
         pass
     
     @abstractmethod
-    def create_image_variation(self, model: OpenAIImageModel, image_path: str) -> Dict[str, Any]:
+    def create_image_variation(self, model: OpenAIImageModel, image_path: str) -> ProviderResult:
         """
         既存の画像からバリエーションを生成する
         
@@ -69,11 +70,11 @@ class GeminiServiceInterface(AIServiceInterface):
     Gemini API用のインターフェース
     """
     @abstractmethod
-    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> Dict[str, Any]:
+    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> ProviderResult:
         pass
     
     @abstractmethod
-    def generate_image(self, model: GeminiImageModel, prompt: str) -> Dict[str, Any]:
+    def generate_image(self, model: GeminiImageModel, prompt: str) -> ProviderResult:
         """
         Geminiを使用して画像を生成する
         
@@ -89,13 +90,13 @@ class GitHubServiceInterface(ABC):
     GitHub API用のインターフェース
     """
     @abstractmethod
-    def create_issue(self, author: str, title: str, message: str) -> Dict[str, Any]:
+    def create_issue(self, author: str, title: str, message: str) -> ProviderResult:
         """
         GitHubにIssueを作成する
         
         :param author: 作成者
         :param title: Issueタイトル
         :param message: Issue本文
-        :return: 作成結果またはエラー情報を含む辞書
+        :return: 作成結果またはエラー情報を含む ProviderResult
         """
         pass
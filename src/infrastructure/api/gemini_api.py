@@ -1,9 +1,11 @@
 import google.generativeai as gemini_api
-from typing import Dict, Any
 
 from src.domain.config.bot_config import botConfig
 from src.domain.interfaces.api_interfaces import GeminiServiceInterface
 from src.domain.models.ai_models import GeminiChatModel, GeminiImageModel
+from src.data.entities.provider_result import ProviderResult, measure_total
+
+PROVIDER_GEMINI = "gemini"
 
 
 class GeminiAPI(GeminiServiceInterface):
@@ -17,14 +19,15 @@ class GeminiAPI(GeminiServiceInterface):
         gemini_api.configure(api_key=botConfig.gemini_api_key)
         self.gemini_api = gemini_api
 
-    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> Dict[str, Any]:
+    @measure_total
+    def question(self, model: GeminiChatModel, prompt: str, system_setting: str) -> ProviderResult:
         """
         Geminiモデルに質問を送信し、回答を受け取る
         
         :param model: 使用するモデル
         :param prompt: 質問内容
         :param system_setting: システム設定
-        :return: レスポンスまたはエラー情報を含む辞書
+        :return: レスポンスまたはエラー情報を含む ProviderResult
         """
         try:
             model_instance = self.gemini_api.GenerativeModel(
@@ -35,11 +38,12 @@ class GeminiAPI(GeminiServiceInterface):
                 ]
             )
             response = model_instance.generate_content(prompt)
-            return {"response": response.text}
+            return ProviderResult.success(response.text, provider=PROVIDER_GEMINI, model=model.value)
         except Exception as e:
-            return {"error": {"code": 1, "message": f"Gemini API Error: {e}"}}
+            return ProviderResult.failure(1, f"Gemini API Error: {e}", provider=PROVIDER_GEMINI, model=model.value)
 
-    def generate_image(self, model: GeminiImageModel, prompt: str) -> Dict[str, Any]:
+    @measure_total
+    def generate_image(self, model: GeminiImageModel, prompt: str) -> ProviderResult:
         """
         Geminiを使用して画像を生成する
         
@@ -62,16 +66,18 @@ class GeminiAPI(GeminiServiceInterface):
 
             # レスポンスを返す
             # 注意: Gemini APIは現在URLを返さないので、保存した画像パスを返す
-            return {
-                "response": {
+            return ProviderResult.success(
+                {
                     "path": image_path,
                     "prompt": prompt  # Geminiは修正されたプロンプトを返さないので、元のプロンプトを使用
-                }
-            }
+                },
+                provider=PROVIDER_GEMINI,
+                model=model.value,
+            )
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Gemini Image Generation Error: {e}"
-                }
-            }
+            return ProviderResult.failure(
+                1,
+                f"Gemini Image Generation Error: {e}",
+                provider=PROVIDER_GEMINI,
+                model=model.value,
+            )
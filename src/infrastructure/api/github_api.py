@@ -1,25 +1,26 @@
 import json
-from typing import Dict, Any
 
 import requests
 
 from src.domain.config.bot_config import botConfig
 from src.domain.interfaces.api_interfaces import GitHubServiceInterface
 from src.domain.models.constants import Constants
+from src.data.entities.provider_result import ProviderResult, measure_total
 
 
 class GithubAPI(GitHubServiceInterface):
     """
     GitHub APIクライアントの実装
     """
-    def create_issue(self, author: str, title: str, message: str) -> Dict[str, Any]:
+    @measure_total
+    def create_issue(self, author: str, title: str, message: str) -> ProviderResult:
         """
         GitHubにIssueを作成する
         
         :param author: 作成者
         :param title: Issueタイトル
         :param message: Issue本文
-        :return: 作成結果またはエラー情報を含む辞書
+        :return: 作成結果またはエラー情報を含む ProviderResult
         """
         try:
             response = requests.post(
@@ -35,20 +36,12 @@ class GithubAPI(GitHubServiceInterface):
             )
             
             if response.status_code != 201:
-                return {
-                    "error": {
-                        "code": response.status_code,
-                        "message": f"GitHub API error: {response.text}"
-                    }
-                }
+                return ProviderResult.failure(
+                    response.status_code,
+                    f"GitHub API error: {response.text}",
+                    provider="github",
+                )
                 
-            return {
-                "response": response.json()['html_url']
-            }
+            return ProviderResult.success(response.json()['html_url'], provider="github")
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider="github")
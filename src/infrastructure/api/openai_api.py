@@ -1,31 +1,29 @@
 from openai import OpenAI, BadRequestError
-from typing import Dict, List, Any
+from typing import List
 
 from src.domain.config.bot_config import botConfig
 from src.domain.interfaces.api_interfaces import OpenAIServiceInterface
 from src.domain.models.ai_models import OpenAIChatModel, OpenAIImageModel
 from src.domain.models.message import Message
+from src.data.entities.provider_result import ProviderResult, measure_total
+
+PROVIDER_OPENAI = "openai"
 
 
 # OpenAIのエラーハンドリング. エラーコードによってメッセージを変更
-def handle_bad_request_error(e: BadRequestError) -> Dict[str, Any]:
+def handle_bad_request_error(e: BadRequestError) -> ProviderResult:
     """
     OpenAI APIのエラーハンドリングを行う
     
     :param e: BadRequestErrorエラーオブジェクト
-    :return: エラー情報を含む辞書
+    :return: エラー情報を含む ProviderResult
     """
     if e.code == "content_policy_violation":
         message = "コンテンツポリシー違反です. 他の質問をしてください."
     else:
         message = "エラーが発生しました. Error Code: " + e.code
 
-    return {
-        "error": {
-            "code": e.code,
-            "message": message
-        }
-    }
+    return ProviderResult.failure(e.code, message, provider=PROVIDER_OPENAI)
 
 
 class OpenAIAPI(OpenAIServiceInterface):
@@ -38,14 +36,15 @@ class OpenAIAPI(OpenAIServiceInterface):
         # OpenAI API の設定
         self.openAIClient = OpenAI(api_key=botConfig.openai_api_key)
 
-    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> Dict[str, Any]:
+    @measure_total
+    def question(self, model: OpenAIChatModel, prompt: str, system_setting: str) -> ProviderResult:
         """
         OpenAIモデルに質問を送信し、回答を受け取る
         
         :param model: 使用するモデル
         :param prompt: 質問内容
         :param system_setting: システム設定
-        :return: レスポンスまたはエラー情報を含む辞書
+        :return: レスポンスまたはエラー情報を含む ProviderResult
         """
         try:
             response = self.openAIClient.chat.completions.create(
@@ -65,26 +64,24 @@ class OpenAIAPI(OpenAIServiceInterface):
                     }
                 ],
             )
-            return {
-                "response": response.choices[0].message.content.strip()
-            }
+            return ProviderResult.success(
+                response.choices[0].message.content.strip(),
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
             return handle_bad_request_error(e)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def conversation(self, model: OpenAIChatModel, prompts: List[Message]) -> Dict[str, Any]:
+    @measure_total
+    def conversation(self, model: OpenAIChatModel, prompts: List[Message]) -> ProviderResult:
         """
         OpenAIモデルとの会話形式の対話を行う
         
         :param model: 使用するモデル
         :param prompts: 会話履歴
-        :return: レスポンスまたはエラー情報を含む辞書
+        :return: レスポンスまたはエラー情報を含む ProviderResult
         """
         try:
             messages = []
@@ -100,20 +97,18 @@ class OpenAIAPI(OpenAIServiceInterface):
                 model=model.value,
                 messages=messages,
             )
-            return {
-                "response": response.choices[0].message.content.strip()
-            }
+            return ProviderResult.success(
+                response.choices[0].message.content.strip(),
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
             return handle_bad_request_error(e)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def create_image_variation(self, model: OpenAIImageModel, image_path: str) -> Dict[str, Any]:
+    @measure_total
+    def create_image_variation(self, model: OpenAIImageModel, image_path: str) -> ProviderResult:
         """
         既存の画像からバリエーションを生成する
         
@@ -128,23 +123,21 @@ class OpenAIAPI(OpenAIServiceInterface):
                 n=1,
                 size="1024x1024"
             )
-            return {
-                "response": {
+            return ProviderResult.success(
+                {
                     "url": response.data[0].url,
                     "prompt": response.data[0].revised_prompt
-                }
-            }
+                },
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
             return handle_bad_request_error(e)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
 
-    def generate_image(self, model: OpenAIImageModel, prompt: str) -> Dict[str, Any]:
+    @measure_total
+    def generate_image(self, model: OpenAIImageModel, prompt: str) -> ProviderResult:
         """
         OpenAIを使用して画像を生成する
         
@@ -158,18 +151,15 @@ class OpenAIAPI(OpenAIServiceInterface):
                 prompt=prompt,
                 response_format="url"
             )
-            return {
-                "response": {
+            return ProviderResult.success(
+                {
                     "url": response.data[0].url,
                     "prompt": response.data[0].revised_prompt
-                }
-            }
+                },
+                provider=PROVIDER_OPENAI,
+                model=model.value,
+            )
         except BadRequestError as e:
             return handle_bad_request_error(e)
         except Exception as e:
-            return {
-                "error": {
-                    "code": 1,
-                    "message": f"Unknown Error {e}"
-                }
-            }
+            return ProviderResult.failure(1, f"Unknown Error {e}", provider=PROVIDER_OPENAI, model=model.value)
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+# トレースの再生
+#
+# TEL_GPT_TRACE_PATH で記録したトレースを、プロバイダを代わりのものに置き換えた TelDiscordCommand に
+# 1 倍から 100 倍の速度で再生し、その設定で処理できるスループットとレイテンシを表示する。
+# 例: python replay_traces.py var/traces.jsonl --speed 20 --concurrency 16
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay recorded interaction traces against stub providers.")
+    parser.add_argument("path", help="JSONL file written by TEL_GPT_TRACE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed (1-100)")
+    parser.add_argument("--concurrency", type=int, default=None, help="max commands running at once")
+    parser.add_argument("--executor-workers", type=int, default=None, help="threads for provider calls")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # 再生では本物のプロバイダや本番のデータを使わない
+    os.environ.setdefault("TEL_GPT_OPEN_AI_TOKEN", "replay")
+    os.environ.setdefault("TEL_GPT_STABILITY_TOKEN", "replay")
+    os.environ["TEL_GPT_DATA_DIR"] = tempfile.mkdtemp(prefix="telgpt-replay-")
+    os.environ["TEL_GPT_IMAGE_LINEAGE_PERSIST"] = "0"
+    os.environ.pop("TEL_GPT_TRACE_PATH", None)
+
+    from data.trace_recorder import load_traces
+    from data.trace_replay import run_replay
+
+    report = asyncio.run(run_replay(
+        load_traces(args.path),
+        speed=args.speed,
+        concurrency=args.concurrency,
+        executor_workers=args.executor_workers,
+    ))
+    print(json.dumps(report.summary(), ensure_ascii=False, indent=2))
+
+
+# メインエントリーポイント
+if __name__ == "__main__":
+    main()
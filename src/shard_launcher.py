@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+# シャードランチャー
+#
+# TEL_GPT_SHARD_COUNT 個のシャードを TEL_GPT_SHARD_PROCESSES 個のプロセスに分けて起動する。
+# 各プロセスは担当するシャードだけを AutoShardedClient で接続し、
+# 起動・停止通知とコマンドの同期はシャード 0 を担当するプロセスだけが行う。
+#
+# 子プロセスでは環境変数を設定してから設定を読み込む必要があるため、
+# このモジュールのトップレベルでは data パッケージを import しない。
+
+# 子プロセスが異常終了した場合に再起動するまでの待ち時間 (秒)
+RESTART_DELAY = 5.0
+
+
+def run_shard_group(shard_ids: list[int], shard_count: int):
+    """
+    担当するシャードを環境変数に設定してボットを起動する (子プロセスで実行)
+    """
+    os.environ["TEL_GPT_SHARD_COUNT"] = str(shard_count)
+    os.environ["TEL_GPT_SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+
+    import app
+    app.main()
+
+
+def start_process(context, shard_ids: list[int], shard_count: int):
+    process = context.Process(
+        target=run_shard_group,
+        args=(shard_ids, shard_count),
+        name=f"telgpt-shards-{'-'.join(str(shard_id) for shard_id in shard_ids)}",
+    )
+    process.start()
+    print(f"Started shard group {shard_ids} (pid: {process.pid})")
+    return process
+
+
+def main():
+    from data.sharding import split_shard_groups
+
+    shard_count = int(os.getenv("TEL_GPT_SHARD_COUNT", "0"))
+    process_count = int(os.getenv("TEL_GPT_SHARD_PROCESSES", "1"))
+    if shard_count <= 0:
+        print("TEL_GPT_SHARD_COUNT must be set to launch shard groups")
+        sys.exit(1)
+
+    # fork ではなく spawn で起動し、子プロセスごとに設定とクライアントを作り直す
+    context = multiprocessing.get_context("spawn")
+    groups = split_shard_groups(shard_count, process_count)
+    processes = {tuple(group): start_process(context, group, shard_count) for group in groups}
+
+    is_stopping = False
+
+    def stop(sig, frame):
+        nonlocal is_stopping
+        print(f"Signal {sig} received, stopping shard groups...")
+        is_stopping = True
+        # 子プロセスにも SIGTERM を送り、それぞれのシャットダウン処理を実行させる
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    def reload(sig, frame):
+        # 設定の再読み込みは各子プロセスが行う
+        print(f"Signal {sig} received, reloading config of shard groups...")
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    # 子プロセスを監視し、異常終了したシャードグループは再起動する
+    while not is_stopping:
+        time.sleep(1)
+        for group, process in list(processes.items()):
+            if not process.is_alive() and not is_stopping:
+                print(f"Shard group {list(group)} exited with code {process.exitcode}, restarting...")
+                time.sleep(RESTART_DELAY)
+                processes[group] = start_process(context, list(group), shard_count)
+
+    for process in processes.values():
+        process.join()
+
+
+# メインエントリーポイント
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import json
+
+from data.stub_provider_server import StubBehavior, StubProviderServer
+
+# プロバイダのスタブサーバー
+#
+# OpenAI / Anthropic / Gemini / Stability AI / DeepL / GitHub の API を真似るローカルの HTTP サーバーを起動する。
+# Bot を TEL_GPT_PROVIDER_BASE_URL=http://127.0.0.1:8089 で起動すると、API キーなしでオフラインで負荷試験ができる。
+# 例: python stub_providers.py --latency 0.5 --tokens-per-second 80 --rate-limit-ratio 0.05
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a local server that mimics the provider APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="generation speed (0: no delay)")
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="ratio of requests answered with 429")
+    parser.add_argument("--server-error-ratio", type=float, default=0.0, help="ratio of requests answered with 5xx")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="concurrent requests per provider (0: no limit)")
+    parser.add_argument("--config", help='JSON file like {"default": {...}, "openai": {"latency": 2.0}}')
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+async def serve(args: argparse.Namespace):
+    server = StubProviderServer(
+        StubBehavior(
+            latency=args.latency,
+            jitter=args.jitter,
+            tokens_per_second=args.tokens_per_second,
+            completion_tokens=args.completion_tokens,
+            rate_limit_ratio=args.rate_limit_ratio,
+            server_error_ratio=args.server_error_ratio,
+            max_concurrency=args.max_concurrency,
+        ),
+        seed=args.seed,
+    )
+    if args.config:
+        with open(args.config, encoding="utf-8") as file:
+            server.apply(json.load(file))
+    base_url = await server.start(args.host, args.port)
+    print(f"Stub providers listening on {base_url} (TEL_GPT_PROVIDER_BASE_URL={base_url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+# メインエントリーポイント
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
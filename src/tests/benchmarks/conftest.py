@@ -0,0 +1,103 @@
+# ベンチマーク用の pytest 設定
+#
+# 各ベンチマークは baselines.json に保存された基準値 (baseline_ms) と
+# 予算 (budget_ms) を持ち、計測した中央値が予算を超えた場合はテストを失敗させる。
+# TEL_GPT_BENCH_UPDATE=1 を指定して実行すると、計測値で基準値と予算を書き換える。
+import json
+import os
+import statistics
+import time
+from typing import Callable
+
+import pytest
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# 予算は基準値の何倍まで許容するか (CI のばらつきを吸収するための係数)
+BUDGET_FACTOR = 5.0
+# 非常に速い処理が共有の CI ランナーの揺らぎ (GC・スケジューリング) だけで落ちないようにするための最低予算
+MIN_BUDGET_MS = 0.1
+
+
+def _load_baselines() -> dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _save_baselines(baselines: dict):
+    with open(BASELINES_PATH, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True, ensure_ascii=False)
+        file.write("\n")
+
+
+class BenchmarkRunner:
+    """
+    関数を繰り返し実行して中央値を計測し、baselines.json の予算と比較する
+    """
+
+    def __init__(self, baselines: dict, update: bool):
+        self.baselines = baselines
+        self.update = update
+        self.updated = False
+
+    def measure(self, func: Callable[[], object], rounds: int, number: int, warmup: int) -> float:
+        """
+        func を number 回ずつ rounds 回実行し、1 回あたりの中央値をミリ秒で返す
+        """
+        for _ in range(warmup):
+            func()
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) * 1000 / number)
+        return statistics.median(samples)
+
+    def __call__(
+        self,
+        name: str,
+        func: Callable[[], object],
+        rounds: int = 30,
+        number: int = 10,
+        warmup: int = 3
+    ) -> float:
+        median_ms = self.measure(func, rounds, number, warmup)
+
+        if self.update:
+            self.baselines[name] = {
+                "baseline_ms": round(median_ms, 4),
+                "budget_ms": round(max(median_ms * BUDGET_FACTOR, MIN_BUDGET_MS), 4),
+            }
+            self.updated = True
+            return median_ms
+
+        entry = self.baselines.get(name)
+        if entry is None:
+            pytest.fail(
+                f"ベンチマーク '{name}' の基準値がありません. "
+                f"TEL_GPT_BENCH_UPDATE=1 を指定して baselines.json を更新してください (計測値: {median_ms:.4f}ms)"
+            )
+        assert median_ms <= entry["budget_ms"], (
+            f"ベンチマーク '{name}' が予算を超えました: "
+            f"{median_ms:.4f}ms > {entry['budget_ms']}ms (基準値: {entry['baseline_ms']}ms)"
+        )
+        return median_ms
+
+
+@pytest.fixture(scope="session")
+def _benchmark_runner():
+    runner = BenchmarkRunner(
+        baselines=_load_baselines(),
+        update=os.getenv("TEL_GPT_BENCH_UPDATE") == "1",
+    )
+    yield runner
+    if runner.updated:
+        _save_baselines(runner.baselines)
+
+
+@pytest.fixture
+def benchmark(_benchmark_runner) -> BenchmarkRunner:
+    return _benchmark_runner
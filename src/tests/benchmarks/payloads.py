@@ -0,0 +1,73 @@
+# ベンチマーク用のペイロード生成
+# 実際の利用に近い日本語の回答文と UdonSharp のコードブロックを混ぜたテキストを作成する
+
+JAPANESE_PARAGRAPH = (
+    "UdonSharp では同期変数を使うことで、ワールド内のプレイヤー間で状態を共有できます。"
+    "ただし、同期の頻度が高すぎるとネットワーク帯域を圧迫するため、"
+    "RequestSerialization を呼ぶタイミングには注意が必要です。"
+    "また、オーナーシップの移譲は Networking.SetOwner を使って明示的に行いましょう。\n"
+)
+
+UDON_CODE_BLOCK = '''```csharp
+using UdonSharp;
+using UnityEngine;
+using VRC.SDKBase;
+
+public class DoorController : UdonSharpBehaviour
+{
+    [UdonSynced] private bool _isOpen;
+    [SerializeField] private Animator _animator;
+
+    public override void Interact()
+    {
+        Networking.SetOwner(Networking.LocalPlayer, gameObject);
+        _isOpen = !_isOpen;
+        RequestSerialization();
+        UpdateState();
+    }
+
+    public override void OnDeserialization()
+    {
+        UpdateState();
+    }
+
+    private void UpdateState()
+    {
+        _animator.SetBool("IsOpen", _isOpen);
+    }
+}
+```
+'''
+
+
+def build_answer(size_bytes: int) -> str:
+    """
+    日本語の段落とコードブロックを交互に並べ、UTF-8 で size_bytes 付近になる回答文を作成する
+
+    Args:
+        size_bytes: 目標とする UTF-8 でのバイト数
+
+    Returns:
+        str: 生成された回答文
+    """
+    parts: list[str] = []
+    total = 0
+    index = 0
+    while total < size_bytes:
+        part = UDON_CODE_BLOCK if index % 3 == 2 else JAPANESE_PARAGRAPH
+        parts.append(part)
+        total += len(part.encode("utf-8"))
+        index += 1
+    text = "".join(parts)
+    # 目標サイズを超えた分は文字単位で切り詰める
+    while len(text.encode("utf-8")) > size_bytes:
+        text = text[:-1]
+    return text
+
+
+# 1 KB / 10 KB / 100 KB の代表的なサイズ
+PAYLOAD_SIZES: dict[str, int] = {
+    "1kb": 1024,
+    "10kb": 10 * 1024,
+    "100kb": 100 * 1024,
+}
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from src.data.entities.provider_result import ProviderResult
+from src.data.message_splitter import split_markdown_message
+from src.data.tel_discord_command import TelDiscordCommand
+from src.tests.benchmarks.payloads import PAYLOAD_SIZES, build_answer
+
+
+class FakeSender:
+    """送信内容を記録するだけの軽量な送信先 (Mock のオーバーヘッドを計測に含めないため)"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.created_at = datetime.now(timezone.utc)
+        self.followup = FakeSender()
+        self.channel = FakeSender()
+
+
+@pytest.fixture
+def command() -> TelDiscordCommand:
+    # API クライアントの初期化を避けるため __init__ を呼ばずに生成する
+    instance = TelDiscordCommand.__new__(TelDiscordCommand)
+    instance.discord_client = None
+    return instance
+
+
+@pytest.fixture
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.mark.parametrize("size_name", list(PAYLOAD_SIZES))
+def test_bench_send_message_async(benchmark, command, event_loop_runner, size_name):
+    # 回答の分割送信 (チャンク分割と送信呼び出し) の計測
+    message = build_answer(PAYLOAD_SIZES[size_name])
+
+    def run():
+        event_loop_runner(command.send_message_async(FakeInteraction(), message))
+
+    benchmark(f"send_message_async[{size_name}]", run)
+
+
+@pytest.mark.parametrize("revision_count", [1, 3, 10])
+def test_bench_generate_revise_image_prompt(benchmark, command, revision_count):
+    # 画像の再生成プロンプト作成の計測
+    old_prompts = ["夕焼けの海辺に立つ猫"] + [f"もう少し明るくして {i}" for i in range(revision_count)]
+
+    def run():
+        command.generate_revise_image_prompt(old_prompts, "背景に花火を追加して")
+
+    benchmark(f"generate_revise_image_prompt[{revision_count}]", run, number=200)
+
+
+@pytest.mark.parametrize("size_name", list(PAYLOAD_SIZES))
+def test_bench_build_image_message(benchmark, command, size_name):
+    # 生成した画像の添付ファイルと Embed の組み立ての計測
+    result = ProviderResult.success(
+        {"image": b"\x89PNG" + bytes(PAYLOAD_SIZES[size_name]), "prompt": "夕焼けの海辺に立つ猫", "seed": None},
+        provider="openai",
+        model="dall-e-3",
+    )
+
+    def run():
+        _, embed = command.build_image_message(result)
+        embed.to_dict()
+
+    benchmark(f"build_image_message[{size_name}]", run, number=200)
+
+
+@pytest.mark.parametrize("size_name", list(PAYLOAD_SIZES))
+def test_bench_split_markdown_message(benchmark, size_name):
+    # Markdown を考慮したメッセージ分割の計測
+    message = build_answer(PAYLOAD_SIZES[size_name])
+
+    def run():
+        split_markdown_message(message, 1800)
+
+    benchmark(f"split_markdown_message[{size_name}]", run)
@@ -0,0 +1,51 @@
+import pytest
+
+from src.data.doc_index import DocIndex, build_index, select_passages
+from src.tests.benchmarks.payloads import build_answer
+
+# ドキュメントのページ数 (1 ページあたり 4 セクション)
+PAGE_COUNT = 500
+
+QUERIES = {
+    "english": "How do I call SendCustomNetworkEvent and RequestSerialization on the owner?",
+    "japanese": "同期変数のオーナーシップを移譲する方法を教えてください",
+}
+
+
+@pytest.fixture(scope="module")
+def index_path(tmp_path_factory) -> str:
+    docs = tmp_path_factory.mktemp("docs")
+    for page in range(PAGE_COUNT):
+        sections = [f"# Page{page}"]
+        for section in range(4):
+            sections.append(f"## Topic{page}Section{section}\n\n{build_answer(1024)}")
+        (docs / f"page{page}.md").write_text("\n\n".join(sections), encoding="utf-8")
+    path = str(tmp_path_factory.mktemp("index") / "udon_docs.idx")
+    build_index(str(docs), path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def doc_index(index_path):
+    index = DocIndex(index_path)
+    yield index
+    index.close()
+
+
+def test_bench_doc_index_open(benchmark, index_path):
+    # 起動時のインデックスの読み込み (mmap するだけで全体は読み込まない)
+    def run():
+        DocIndex(index_path).close()
+
+    benchmark("doc_index_open", run)
+
+
+@pytest.mark.parametrize("language", QUERIES)
+def test_bench_doc_index_search(benchmark, doc_index, language):
+    query = QUERIES[language]
+
+    def run():
+        return select_passages(doc_index.search(query, top_k=4), token_budget=1500)
+
+    assert run()
+    benchmark(f"doc_index_search_{language}", run, rounds=10, number=3)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+
+from src.data import tel_discord_command
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.entities.provider_result import ProviderResult
+from src.data.image_lineage import ImageLineageStore
+from src.data.image_router import ImageProvider, ImageRouter
+from src.data.single_flight import SingleFlight
+from src.data.tel_discord_command import TelDiscordCommand
+
+# 外部 API と Discord の応答時間の代わりに待つ時間 (秒)
+PROVIDER_DELAY = 0.12
+THREAD_DELAY = 0.06
+TRANSLATE_DELAY = 0.06
+
+
+class FakeMessage:
+    def __init__(self, content=None):
+        self.id = 1
+        self.content = content
+        self.history = [content]
+        self.created_at = datetime.now(timezone.utc)
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.history.append(content)
+
+
+class FakeThread:
+    id = 2
+    mention = "<#2>"
+
+    async def send(self, content=None, **kwargs):
+        return FakeMessage(content)
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    type = discord.ChannelType.text
+
+    async def create_thread(self, **kwargs):
+        await asyncio.sleep(THREAD_DELAY)
+        return FakeThread()
+
+    async def send(self, content=None, **kwargs):
+        return FakeMessage(content)
+
+
+class FakeResponse:
+    async def defer(self):
+        pass
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content)
+        self.messages.append(message)
+        return message
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.id = 3
+        self.created_at = datetime.now(timezone.utc)
+        self.channel = FakeChannel()
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+def slow_provider(result: ProviderResult):
+    def call(*args, **kwargs):
+        time.sleep(PROVIDER_DELAY)
+        return result
+    return call
+
+
+def slow_translate(text: str) -> str:
+    time.sleep(TRANSLATE_DELAY)
+    return f"翻訳: {text}"
+
+
+@pytest.fixture
+def command(monkeypatch) -> TelDiscordCommand:
+    # API クライアントの初期化を避けるため __init__ を呼ばずに生成する
+    instance = TelDiscordCommand.__new__(TelDiscordCommand)
+    instance.discord_client = None
+    instance.singleFlight = SingleFlight()
+    instance.conversationStore = MagicMock()
+    instance.openAIApi = MagicMock()
+    instance.imageLineageStore = ImageLineageStore()
+    instance.openAIApi.question.side_effect = slow_provider(ProviderResult.success("回答"))
+    instance.openAIApi.generate_image.side_effect = slow_provider(
+        ProviderResult.success({"image": b"png", "prompt": "a cat"}, provider="openai", model="dall-e-3")
+    )
+    instance.imageRouter = ImageRouter(
+        [ImageProvider("openai", OpenAIImageModel.DALL_E_3, instance.openAIApi.generate_image)],
+        instance.singleFlight
+    )
+    monkeypatch.setattr(tel_discord_command, "translate_text", slow_translate)
+    return instance
+
+
+def test_bench_openai_conversation_latency(benchmark, command):
+    # スレッドの作成と回答の生成を含む /ai-conversation 全体の計測
+    def run():
+        asyncio.run(command.openai_conversation(FakeInteraction(), "猫について教えて"))
+
+    benchmark("handler.openai_conversation", run, rounds=5, number=1, warmup=1)
+
+
+def test_bench_openai_generate_image_latency(benchmark, command):
+    # 画像の生成からプロンプトの翻訳までを含む /ai-image 全体の計測
+    def run():
+        asyncio.run(command.openai_generate_image(FakeInteraction(), "猫"))
+
+    benchmark("handler.openai_generate_image", run, rounds=5, number=1, warmup=1)
+
+
+def test_openai_generate_image_posts_before_translation(command):
+    # 画像は翻訳を待たずに送信し、翻訳したプロンプトは後から編集で反映する
+    interaction = FakeInteraction()
+    asyncio.run(command.openai_generate_image(interaction, "猫"))
+
+    message = interaction.followup.messages[0]
+    assert message.history[0].endswith("```a cat```")
+    assert message.content.endswith("```翻訳: a cat```")
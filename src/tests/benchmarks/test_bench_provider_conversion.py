@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.data.entities.claude_model import ClaudeModel
+from src.data.entities.entity import Message
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.langchain_claude_api import LangchainClaudeAPI
+from src.data.openai_api import OpenAIAPI
+from src.tests.benchmarks.payloads import PAYLOAD_SIZES, build_answer
+
+
+def build_history(size_bytes: int, turns: int = 10) -> list[Message]:
+    """スレッド内の会話履歴 (user / assistant の交互) を作成する"""
+    per_turn = max(size_bytes // turns, 1)
+    history = []
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        history.append(Message(role=role, content=build_answer(per_turn)))
+    return history
+
+
+@pytest.fixture
+def openai_api():
+    with patch("src.data.openai_api.OpenAI") as mock_openai:
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "回答"
+        mock_openai.return_value = mock_client
+        yield OpenAIAPI()
+
+
+@pytest.fixture
+def claude_api():
+    api = LangchainClaudeAPI()
+    chat_model = MagicMock()
+    chat_model.invoke.return_value.content = "回答"
+    with patch.object(api, "_create_chat_model", return_value=chat_model):
+        yield api
+
+
+@pytest.mark.parametrize("size_name", list(PAYLOAD_SIZES))
+def test_bench_openai_conversation(benchmark, openai_api, size_name):
+    # Message から OpenAI のメッセージ形式への変換の計測
+    history = build_history(PAYLOAD_SIZES[size_name])
+
+    def run():
+        result = openai_api.conversation(OpenAIChatModel.GPT_4_1, prompts=history)
+        assert result.ok
+
+    benchmark(f"openai_conversation[{size_name}]", run)
+
+
+@pytest.mark.parametrize("size_name", list(PAYLOAD_SIZES))
+def test_bench_claude_conversation(benchmark, claude_api, size_name):
+    # Message から Langchain のメッセージ形式への変換の計測
+    history = build_history(PAYLOAD_SIZES[size_name])
+
+    def run():
+        result = claude_api.conversation(ClaudeModel.CLAUDE_4_0_SONNET, prompts=history)
+        assert result.ok
+
+    benchmark(f"claude_conversation[{size_name}]", run)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock
+
+import discord
+import pytest
+from discord import app_commands
+
+from src.data.command_sync import command_tree_hash, sync_commands
+
+
+def _create_tree() -> app_commands.CommandTree:
+    client = discord.Client(intents=discord.Intents.none())
+    tree = app_commands.CommandTree(client)
+
+    @tree.command(name="ai-question", description="質問します")
+    async def question(interaction: discord.Interaction, prompt: str):
+        pass
+
+    tree.sync = AsyncMock(return_value=[])
+    return tree
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return os.path.join(tmp_path, "command_tree.json")
+
+
+def test_hash_changes_with_schema():
+    tree = _create_tree()
+    before = command_tree_hash(tree)
+
+    @tree.command(name="ai-image", description="画像生成します")
+    async def image(interaction: discord.Interaction, prompt: str):
+        pass
+
+    assert command_tree_hash(tree) != before
+
+
+def test_sync_only_when_schema_changes(state_path):
+    # 同じスキーマでは 2 回目以降の同期を行わない
+    tree = _create_tree()
+
+    assert asyncio.run(sync_commands(tree, state_path)) is True
+    assert asyncio.run(sync_commands(tree, state_path)) is False
+    assert tree.sync.await_count == 1
+
+    @tree.command(name="ai-image", description="画像生成します")
+    async def image(interaction: discord.Interaction, prompt: str):
+        pass
+
+    assert asyncio.run(sync_commands(tree, state_path)) is True
+    assert tree.sync.await_count == 2
+
+
+def test_force_sync(state_path):
+    tree = _create_tree()
+    asyncio.run(sync_commands(tree, state_path))
+
+    assert asyncio.run(sync_commands(tree, state_path, force=True)) is True
+    assert tree.sync.await_count == 2
+
+
+def test_sync_to_dev_guild(state_path):
+    # 開発用ギルドを指定した場合はギルドに同期する
+    tree = _create_tree()
+
+    asyncio.run(sync_commands(tree, state_path, dev_guild_id=1234))
+
+    assert tree.sync.await_args.kwargs["guild"].id == 1234
+    assert len(tree.get_commands(guild=discord.Object(id=1234))) == 1
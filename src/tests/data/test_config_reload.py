@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from src.data.config_reload import config_listeners, reload_config
+from src.data.configs import BotConfig, botConfig, load_environ, read_config_file
+from src.data.entities.gemini_model import GeminiChatModel
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.image_router import ImageProvider, ImageRouter, ProviderHealth
+from src.data.single_flight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def restore_config():
+    saved = dict(vars(botConfig))
+    listeners = list(config_listeners)
+    yield
+    vars(botConfig).update(saved)
+    config_listeners[:] = listeners
+
+
+def write_config(tmp_path, content: str) -> dict:
+    path = tmp_path / "telgpt.env"
+    path.write_text(content, encoding="utf-8")
+    return {**os.environ, "TEL_GPT_CONFIG_FILE": str(path)}
+
+
+def test_config_file_overrides_environment(tmp_path):
+    environ = write_config(tmp_path, '# comment\nTEL_GPT_GEMINI_CHAT_MODEL="gemini-2.0-flash"\n\n')
+
+    assert read_config_file(environ["TEL_GPT_CONFIG_FILE"]) == {"TEL_GPT_GEMINI_CHAT_MODEL": "gemini-2.0-flash"}
+    config = BotConfig(load_environ({**environ, "TEL_GPT_GEMINI_CHAT_MODEL": "gemini-2.5-flash"}))
+    assert config.gemini_chat_model == GeminiChatModel.GEMINI_2_0_FLASH
+
+
+def test_reload_swaps_reloadable_settings(tmp_path):
+    environ = write_config(
+        tmp_path,
+        "TEL_GPT_GEMINI_CHAT_MODEL=gemini-2.0-flash\n"
+        "TEL_GPT_DISABLED_PROVIDERS=claude\n"
+        "TEL_GPT_QUESTION_ALL_TIMEOUT=30\n"
+        "TEL_GPT_DISCORD_TOKEN=new-token\n",
+    )
+    applied = []
+    config_listeners.append(applied.append)
+
+    result = reload_config(environ)
+
+    assert botConfig.gemini_chat_model == GeminiChatModel.GEMINI_2_0_FLASH
+    assert botConfig.disabled_providers == frozenset({"claude"})
+    assert botConfig.question_all_timeout == 30.0
+    assert {"gemini_chat_model", "disabled_providers", "question_all_timeout"} <= set(result.changed)
+    # トークンは再起動するまで差し替えない
+    assert "discord_token" in result.restart_required
+    assert botConfig.discord_token != "new-token"
+    assert applied == [botConfig]
+
+
+@pytest.mark.parametrize("content", [
+    "TEL_GPT_GEMINI_CHAT_MODEL=gemini-9-preview\n",
+    "TEL_GPT_IMAGE_PROVIDERS=openai,midjourney\n",
+    "TEL_GPT_TRACE_SAMPLE_RATE=2\nTEL_GPT_DISABLED_PROVIDERS=opanai\n",
+    "this line is broken\n",
+])
+def test_invalid_config_is_rejected(tmp_path, content):
+    environ = write_config(tmp_path, content)
+    before = dict(vars(botConfig))
+
+    with pytest.raises(ValueError):
+        reload_config(environ)
+
+    assert vars(botConfig) == before
+
+
+def test_image_router_keeps_health_across_reconfigure():
+    def provider(name: str) -> ImageProvider:
+        return ImageProvider(name, OpenAIImageModel.DALL_E_3, lambda **kwargs: None)
+
+    router = ImageRouter([provider("openai"), provider("stability")], single_flight=SingleFlight())
+    router.health["openai"] = ProviderHealth(consecutive_failures=2, latency=3.0)
+
+    router.configure([provider("openai"), provider("gemini")], timeout=10.0, cooldown=5.0)
+
+    assert [candidate.name for candidate in router.candidates()] == ["openai", "gemini"]
+    assert router.health["openai"].consecutive_failures == 2
+    assert (router.timeout, router.cooldown) == (10.0, 5.0)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.data.conversation_compactor import SUMMARY_PREFIX, ConversationCompactor, estimate_tokens
+from src.data.conversation_store import ConversationStore, StoredMessage
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.entities.provider_result import ProviderResult
+
+
+@pytest.fixture
+def store(tmp_path):
+    conversation_store = ConversationStore(os.path.join(tmp_path, "conversations.sqlite3"))
+    yield conversation_store
+    conversation_store.close()
+
+
+def _history(count: int, content: str) -> list[StoredMessage]:
+    now = time.time()
+    return [
+        StoredMessage(
+            thread_id=1,
+            message_id=i,
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"{content}{i}",
+            created_at=now + i,
+        )
+        for i in range(count)
+    ]
+
+
+def test_estimate_tokens():
+    # 英語は約 4 文字、日本語は約 1 文字で 1 トークン
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("こんにちは") == 5
+
+
+def test_short_conversation_is_not_compacted(store):
+    openai_api = MagicMock()
+    compactor = ConversationCompactor(openai_api, store, OpenAIChatModel.GPT_4_O_MINI, threshold_tokens=1000, keep_recent=2)
+
+    async def run():
+        store.extend(_history(4, "短い"))
+        return await compactor.build_prompts(1)
+
+    prompts = asyncio.run(run())
+
+    assert len(prompts) == 4
+    openai_api.conversation.assert_not_called()
+
+
+def test_long_conversation_is_summarized_in_background(store):
+    # 閾値を超えると古いターンが要約され、次のターンから要約と直近のメッセージだけが送信される
+    openai_api = MagicMock()
+    openai_api.conversation.return_value = ProviderResult.success("これまでの要約")
+    compactor = ConversationCompactor(openai_api, store, OpenAIChatModel.GPT_4_O_MINI, threshold_tokens=50, keep_recent=2)
+
+    async def run():
+        store.extend(_history(10, "長いメッセージです" * 3))
+        first = await compactor.build_prompts(1)
+        await asyncio.gather(*compactor._tasks.values())
+        second = await compactor.build_prompts(1)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert len(first) == 10
+    assert second[0].role == "system"
+    assert second[0].content == SUMMARY_PREFIX + "これまでの要約"
+    assert [prompt.content for prompt in second[1:]] == ["長いメッセージです長いメッセージです長いメッセージです8",
+                                                          "長いメッセージです長いメッセージです長いメッセージです9"]
+    assert openai_api.conversation.call_args[0][0] == OpenAIChatModel.GPT_4_O_MINI
+
+
+def test_summary_failure_keeps_raw_history(store):
+    openai_api = MagicMock()
+    openai_api.conversation.return_value = ProviderResult.failure(1, "error")
+    compactor = ConversationCompactor(openai_api, store, OpenAIChatModel.GPT_4_O_MINI, threshold_tokens=10, keep_recent=2)
+
+    async def run():
+        store.extend(_history(6, "メッセージ"))
+        await compactor.build_prompts(1)
+        await asyncio.gather(*compactor._tasks.values())
+        return await compactor.build_prompts(1)
+
+    prompts = asyncio.run(run())
+
+    assert len(prompts) == 6
+    assert all(prompt.role != "system" for prompt in prompts)
+
+
+def test_caches_are_bounded(store):
+    # 要約のキャッシュは最近使ったスレッドだけを保持し、終わった要約のタスクは残さない
+    openai_api = MagicMock()
+    openai_api.conversation.return_value = ProviderResult.success("これまでの要約")
+    compactor = ConversationCompactor(
+        openai_api, store, OpenAIChatModel.GPT_4_O_MINI, threshold_tokens=10, keep_recent=2, summary_capacity=2
+    )
+
+    async def run():
+        for thread_id in (1, 2, 3):
+            store.extend([replace(message, thread_id=thread_id) for message in _history(6, "メッセージ")])
+            await compactor.build_prompts(thread_id)
+        await compactor.wait()
+        return await compactor.build_prompts(1)
+
+    prompts = asyncio.run(run())
+
+    assert compactor._tasks == {}
+    assert len(compactor._summaries) == 2
+    # キャッシュから溢れたスレッドの要約は会話ストアから読み直す
+    assert prompts[0].content == SUMMARY_PREFIX + "これまでの要約"
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.data.conversation_store import ConversationStore, StoredMessage
+
+
+@pytest.fixture
+def store(tmp_path):
+    conversation_store = ConversationStore(os.path.join(tmp_path, "conversations.sqlite3"))
+    yield conversation_store
+    conversation_store.close()
+
+
+def _message(thread_id: int, message_id: int, role: str, content: str, created_at: float) -> StoredMessage:
+    return StoredMessage(
+        thread_id=thread_id,
+        message_id=message_id,
+        role=role,
+        content=content,
+        created_at=created_at,
+    )
+
+
+def test_recent_returns_messages_in_order(store):
+    # 書き込んだメッセージが古い順に直近の件数だけ返る
+    async def run():
+        now = time.time()
+        store.extend([_message(1, i, "user" if i % 2 == 0 else "assistant", f"メッセージ{i}", now + i) for i in range(5)])
+        store.append(_message(2, 100, "user", "別スレッド", now))
+        return await store.recent(1, limit=3)
+
+    prompts = asyncio.run(run())
+
+    assert [prompt.content for prompt in prompts] == ["メッセージ2", "メッセージ3", "メッセージ4"]
+    assert [prompt.role for prompt in prompts] == ["user", "assistant", "user"]
+
+
+def test_messages_persist_after_reopen(tmp_path):
+    # 再起動後も会話履歴を読み出せる
+    path = os.path.join(tmp_path, "conversations.sqlite3")
+
+    async def write():
+        store = ConversationStore(path)
+        store.append(_message(1, 1, "user", "こんにちは" * 100, time.time()))
+        await store.flush()
+        store.close()
+
+    async def read():
+        store = ConversationStore(path)
+        try:
+            return await store.recent(1, limit=10), await store.has_thread(1), await store.has_thread(2)
+        finally:
+            store.close()
+
+    asyncio.run(write())
+    prompts, has_thread, has_other_thread = asyncio.run(read())
+
+    assert prompts[0].content == "こんにちは" * 100
+    assert has_thread
+    assert not has_other_thread
+
+
+def test_retention_removes_old_and_excess_messages(tmp_path):
+    store = ConversationStore(os.path.join(tmp_path, "conversations.sqlite3"), retention_days=1, max_messages_per_thread=2)
+
+    async def run():
+        now = time.time()
+        store.append(_message(1, 1, "user", "古いメッセージ", now - 2 * 24 * 60 * 60))
+        store.extend([_message(2, 10 + i, "user", f"メッセージ{i}", now + i) for i in range(4)])
+        await store.flush()
+        store.apply_retention()
+        return await store.recent(1, limit=10), await store.recent(2, limit=10)
+
+    old_thread, thread = asyncio.run(run())
+    store.close()
+
+    assert old_thread == []
+    assert [prompt.content for prompt in thread] == ["メッセージ2", "メッセージ3"]
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import discord
+import pytest
+
+from src.data.configs import botConfig
+from src.data.deadline import (
+    INTERACTION_TOKEN_LIFETIME, INVALID_WEBHOOK_TOKEN, OUTCOME_CANCELLED, OUTCOME_DONE, OUTCOME_TIMED_OUT,
+    CommandCancellation, DeadlineExceeded, deadline_scope, provider_timeout, remaining_time,
+)
+from src.data.entities.provider_result import ProviderResult
+from src.data.metrics import metrics
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+def counter(name: str) -> int:
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def test_provider_timeout_is_clamped_to_the_deadline():
+    assert remaining_time() is None
+    assert provider_timeout() == botConfig.provider_timeout
+
+    with deadline_scope(5.0):
+        assert 4.0 < provider_timeout(default=60.0) <= 5.0
+        assert provider_timeout(default=2.0) == 2.0
+        # 内側の期限は外側の期限より延ばせない
+        with deadline_scope(30.0):
+            assert provider_timeout(default=60.0) <= 5.0
+
+
+def test_provider_timeout_raises_after_the_deadline():
+    before = counter("deadline.provider_skipped")
+
+    with deadline_scope(0.0):
+        with pytest.raises(DeadlineExceeded):
+            provider_timeout()
+
+    assert counter("deadline.provider_skipped") - before == 1
+
+
+def test_run_returns_done_and_propagates_the_deadline():
+    cancellation = CommandCancellation()
+    seen = {}
+
+    async def command():
+        seen["remaining"] = remaining_time()
+        return "ok"
+
+    outcome = asyncio.run(cancellation.run("test", command(), timeout=10.0, message_id=1))
+
+    assert outcome == OUTCOME_DONE
+    assert 0 < seen["remaining"] <= 10.0
+    assert cancellation.running_count == 0
+
+
+def test_run_re_raises_command_errors():
+    cancellation = CommandCancellation()
+
+    async def command():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(cancellation.run("test", command(), timeout=10.0))
+
+
+def test_run_times_out_and_counts():
+    cancellation = CommandCancellation()
+    before = (counter("commands.timed_out"), counter("commands.timed_out.slow"))
+
+    outcome = asyncio.run(cancellation.run("slow", asyncio.sleep(10), timeout=0.05))
+
+    assert outcome == OUTCOME_TIMED_OUT
+    assert counter("commands.timed_out") - before[0] == 1
+    assert counter("commands.timed_out.slow") - before[1] == 1
+
+
+def test_deleting_the_message_cancels_the_command():
+    cancellation = CommandCancellation()
+    before = counter("commands.cancelled.message_deleted")
+
+    async def scenario():
+        run = asyncio.create_task(cancellation.run("test", asyncio.sleep(10), timeout=10.0, message_id=1, channel_id=2))
+        await asyncio.sleep(0)
+        assert cancellation.running_count == 1
+        assert cancellation.cancel_message(99) == 0
+        assert cancellation.cancel_message(1) == 1
+        return await run
+
+    assert asyncio.run(scenario()) == OUTCOME_CANCELLED
+    assert counter("commands.cancelled.message_deleted") - before == 1
+    assert cancellation.running_count == 0
+
+
+def make_interaction(created_at: float) -> MagicMock:
+    interaction = MagicMock()
+    interaction.created_at = datetime.fromtimestamp(created_at, tz=timezone.utc)
+    interaction.user.id = 4
+    interaction.followup.send = AsyncMock()
+    interaction.channel.send = AsyncMock()
+    return interaction
+
+
+def test_send_followup_falls_back_to_the_channel_after_the_token_expires():
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    fresh = make_interaction(time.time())
+    expired = make_interaction(time.time() - INTERACTION_TOKEN_LIFETIME - 1)
+
+    asyncio.run(command.send_followup(fresh, content="hello", wait=True))
+    asyncio.run(command.send_followup(expired, content="hello", wait=True))
+
+    fresh.followup.send.assert_awaited_once_with(content="hello", wait=True)
+    fresh.channel.send.assert_not_awaited()
+    expired.followup.send.assert_not_awaited()
+    expired.channel.send.assert_awaited_once_with(content="<@4> hello")
+
+
+def test_send_followup_falls_back_when_discord_rejects_the_token():
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    interaction = make_interaction(time.time())
+    response = MagicMock(status=401, reason="Unauthorized")
+    interaction.followup.send.side_effect = discord.HTTPException(
+        response, {"code": INVALID_WEBHOOK_TOKEN, "message": "Invalid Webhook Token"}
+    )
+
+    asyncio.run(command.send_followup(interaction, content="hello"))
+
+    interaction.channel.send.assert_awaited_once_with(content="<@4> hello")
+
+
+def test_bot_thread_answer_runs_off_the_event_loop_within_the_deadline():
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    command.discord_client = MagicMock()
+    command.conversationStore = MagicMock()
+    command.conversationCompactor = MagicMock()
+    command.conversationCompactor.build_prompts = AsyncMock(return_value=[{"role": "system"}, {"role": "user"}])
+    seen = {}
+
+    def conversation(model, prompts):
+        seen["thread"] = threading.current_thread()
+        seen["remaining"] = remaining_time()
+        return ProviderResult.success("answer")
+    command.openAIApi = MagicMock()
+    command.openAIApi.conversation.side_effect = conversation
+    message = MagicMock()
+    temporary_message = MagicMock()
+    temporary_message.edit = AsyncMock()
+    message.channel.send = AsyncMock(return_value=temporary_message)
+
+    outcome = asyncio.run(CommandCancellation().run("on_message", command.answer_in_bot_thread(message), timeout=10.0))
+
+    assert outcome == OUTCOME_DONE
+    assert seen["thread"] is not threading.main_thread()
+    assert 0 < seen["remaining"] <= 10.0
+    temporary_message.edit.assert_awaited_once_with(content="answer")
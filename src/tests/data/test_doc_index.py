@@ -0,0 +1,91 @@
+import pytest
+
+from src.data.doc_index import DocIndex, build_index, select_passages, tokenize
+from src.data.tel_discord_command import TelDiscordCommand
+
+NETWORKING_DOC = """# Networking
+
+## Events
+
+SendCustomNetworkEvent calls a public method on every client.
+Use NetworkEventTarget.All to run it everywhere or NetworkEventTarget.Owner for the owner only.
+
+## Synced variables
+
+Mark fields with [UdonSynced] and call RequestSerialization after changing them.
+"""
+
+PLAYER_DOC = """# プレイヤー
+
+## 移動
+
+VRCPlayerApi.SetWalkSpeed でプレイヤーの歩く速さを変更します。
+"""
+
+SHADER = "\n".join(["Shader \"Custom/Toon\" {"] + [f"    // line {i}" for i in range(70)] + ["}"])
+
+
+@pytest.fixture
+def doc_index(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "udon").mkdir(parents=True)
+    (docs / "udon" / "networking.md").write_text(NETWORKING_DOC, encoding="utf-8")
+    (docs / "udon" / "player.md").write_text(PLAYER_DOC, encoding="utf-8")
+    (docs / "toon.shader").write_text(SHADER, encoding="utf-8")
+    (docs / "image.png").write_bytes(b"\x89PNG")
+    path = tmp_path / "index" / "udon_docs.idx"
+
+    assert build_index(str(docs), str(path)) == 5
+    index = DocIndex(str(path))
+    yield index
+    index.close()
+
+
+def test_tokenize_splits_identifiers_and_japanese():
+    assert tokenize("UdonSharpBehaviour.SendCustomEvent") == [
+        "udonsharpbehaviour", "udon", "sharp", "behaviour", "sendcustomevent", "send", "custom", "event",
+    ]
+    assert tokenize("歩く速さ、変更") == ["歩く", "く速", "速さ", "さ変", "変更"]
+
+
+def test_search_ranks_matching_section_first(doc_index):
+    results = doc_index.search("how do I use SendCustomNetworkEvent for the owner?", top_k=2)
+
+    assert results[0].passage.source == "udon/networking.md"
+    assert results[0].passage.title == "Networking > Events"
+    assert doc_index.search("歩く速さを変えたい")[0].passage.source == "udon/player.md"
+    assert doc_index.search("zzz unknown") == []
+
+
+def test_code_is_split_by_lines(doc_index):
+    titles = [doc_index.passage(doc_id).title for doc_id in range(doc_index.doc_count)]
+
+    assert "toon.shader L1-60" in titles
+    assert "toon.shader L61-72" in titles
+
+
+def test_select_passages_respects_token_budget(doc_index):
+    results = doc_index.search("RequestSerialization SendCustomNetworkEvent UdonSynced")
+
+    assert len(select_passages(results, token_budget=10_000)) == len(results)
+    assert select_passages(results, token_budget=5) == []
+
+
+def test_augment_udon_prompt(doc_index):
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    command.docIndex = None
+    assert command.augment_udon_prompt("UdonSynced とは") == "UdonSynced とは"
+
+    command.docIndex = doc_index
+    augmented = command.augment_udon_prompt("UdonSynced とは")
+    assert "[1] udon/networking.md - Networking > Synced variables" in augmented
+    assert augmented.endswith("Question:\nUdonSynced とは")
+    assert command.augment_udon_prompt("zzz") == "zzz"
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(b"not an index at all")
+
+    with pytest.raises(ValueError):
+        DocIndex(str(path))
@@ -0,0 +1,126 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import discord
+import pytest
+
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.entities.provider_result import ProviderResult
+from src.data.image_lineage import ImageLineage, ImageLineageStore
+from src.data.image_router import ImageProvider, ImageRouter
+from src.data.single_flight import SingleFlight
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+def test_lineage_is_bounded():
+    store = ImageLineageStore(capacity=2)
+
+    async def scenario():
+        for message_id in range(3):
+            store.put(ImageLineage(message_id=message_id, prompts=[f"prompt {message_id}"]))
+        return [await store.get(message_id) for message_id in range(3)]
+
+    evicted, *kept = asyncio.run(scenario())
+
+    assert evicted is None
+    assert [lineage.original_prompt for lineage in kept] == ["prompt 1", "prompt 2"]
+
+
+def test_lineage_is_persisted(tmp_path):
+    path = str(tmp_path / "image_lineage.sqlite3")
+    original = ImageLineage(message_id=1, prompts=["夕焼けの猫"], revised_prompt="a cat at sunset", seed=42,
+                            provider="openai", model="dall-e-3")
+
+    async def write():
+        store = ImageLineageStore(path=path)
+        store.put(original.revise(2, "もっと明るく", revised_prompt="a bright cat", model="dall-e-3"))
+        await store.flush()
+        store.close()
+
+    async def read():
+        store = ImageLineageStore(path=path)
+        try:
+            return await store.get(2)
+        finally:
+            store.close()
+
+    asyncio.run(write())
+    restored = asyncio.run(read())
+
+    assert restored.prompts == ["夕焼けの猫", "もっと明るく"]
+    assert restored.revised_prompt == "a bright cat"
+    assert restored.model == "dall-e-3"
+
+
+class FakeMessage:
+    def __init__(self, message_id: int = 10):
+        self.id = message_id
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeThreadChannel:
+    type = discord.ChannelType.public_thread
+    name = "スレッド名"
+
+    def __init__(self):
+        self.crawled = False
+
+    def history(self, limit: int):
+        self.crawled = limit > 1
+
+        async def empty():
+            return
+            yield
+        return empty()
+
+    async def send(self, content):
+        return FakeMessage()
+
+
+@pytest.fixture
+def command(monkeypatch) -> TelDiscordCommand:
+    # API クライアントの初期化を避けるため __init__ を呼ばずに生成する
+    instance = TelDiscordCommand.__new__(TelDiscordCommand)
+    instance.discord_client = MagicMock()
+    instance.imageLineageStore = ImageLineageStore()
+    instance.openAIApi = MagicMock()
+    instance.openAIApi.generate_image.return_value = ProviderResult.success(
+        {"image": b"png", "prompt": "a brighter cat"}, provider="openai", model="dall-e-3"
+    )
+    instance.imageRouter = ImageRouter(
+        [ImageProvider("openai", OpenAIImageModel.DALL_E_3, instance.openAIApi.generate_image)],
+        SingleFlight()
+    )
+
+    async def keep_prompt(message, prefix, prompt):
+        pass
+    monkeypatch.setattr(instance, "edit_translated_prompt", keep_prompt)
+    return instance
+
+
+def test_revision_uses_recorded_lineage(command):
+    command.imageLineageStore.put(ImageLineage(message_id=1, prompts=["夕焼けの猫", "もっと明るく"]))
+    channel = FakeThreadChannel()
+    base_message = MagicMock(spec=discord.Message)
+    base_message.id = 1
+    base_message.author = command.discord_client.user
+    base_message.embeds = [discord.Embed()]
+    message = MagicMock()
+    message.author = MagicMock()
+    message.channel = channel
+    message.mentions = [command.discord_client.user]
+    message.content = "花火を追加して"
+    message.reference.resolved = base_message
+
+    asyncio.run(command.on_message(message))
+
+    prompt = command.openAIApi.generate_image.call_args.kwargs["prompt"]
+    assert '"夕焼けの猫"' in prompt and '"もっと明るく"' in prompt and '"花火を追加して"' in prompt
+    assert not channel.crawled
+    # 再生成した画像は新しいメッセージ ID で履歴を引ける
+    lineage = asyncio.run(command.imageLineageStore.get(10))
+    assert lineage.prompts == ["夕焼けの猫", "もっと明るく", "花火を追加して"]
+    assert lineage.revised_prompt == "a brighter cat"
@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from src.data.image_normalizer import ImageNormalizeError, normalize_image
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_crops_to_square_png():
+    data = encode(Image.new("RGB", (800, 600), "red"), "JPEG")
+
+    result = Image.open(io.BytesIO(normalize_image(data)))
+
+    assert result.format == "PNG"
+    assert result.size == (600, 600)
+
+
+def test_downscales_large_images():
+    data = encode(Image.new("RGB", (3000, 2000), "blue"), "PNG")
+
+    result = Image.open(io.BytesIO(normalize_image(data, max_side=1024)))
+
+    assert result.size == (1024, 1024)
+
+
+def test_shrinks_until_under_the_byte_limit():
+    # 圧縮の効かないノイズ画像は縮小しないと上限に収まらない
+    noise = Image.frombytes("RGB", (512, 512), os.urandom(512 * 512 * 3))
+    data = encode(noise, "PNG")
+
+    result = normalize_image(data, max_bytes=400 * 1024)
+
+    assert len(result) < 400 * 1024
+    assert Image.open(io.BytesIO(result)).width < 512
+
+
+def test_rejects_non_image_data():
+    with pytest.raises(ImageNormalizeError):
+        normalize_image(b"not an image")
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+from src.data.entities.gemini_model import GeminiImageModel
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.entities.provider_result import ProviderResult
+from src.data.entities.stable_diffusion_model import StableDiffusionModel
+from src.data.image_router import FAILURE_THRESHOLD, ImageProvider, ImageRouter
+from src.data.single_flight import SingleFlight
+
+
+def image(provider: str, prompt: str = "a cat") -> ProviderResult:
+    return ProviderResult.success({"image": b"png", "prompt": prompt}, provider=provider)
+
+
+def create_router(openai, gemini, stability=None, translator=None, **kwargs) -> ImageRouter:
+    providers = [
+        ImageProvider("openai", OpenAIImageModel.DALL_E_3, openai),
+        ImageProvider("gemini", GeminiImageModel.IMAGEN_3_0_GENERATE_001, gemini),
+    ]
+    if stability is not None:
+        providers.append(ImageProvider(
+            "stability", StableDiffusionModel.SDXL_1_0, stability,
+            needs_english_prompt=True, accepts_negative_prompt=True
+        ))
+    return ImageRouter(providers, SingleFlight(), prompt_translator=translator, **kwargs)
+
+
+def test_falls_over_to_the_next_provider():
+    openai = MagicMock(return_value=ProviderResult.failure(1, "Unknown Error", provider="openai"))
+    gemini = MagicMock(return_value=image("gemini"))
+    router = create_router(openai, gemini)
+
+    result = asyncio.run(router.generate("猫", preferred="openai"))
+
+    assert result.ok and result.provider == "gemini"
+    openai.assert_called_once()
+
+
+def test_preferred_provider_is_tried_first():
+    openai = MagicMock(return_value=image("openai"))
+    gemini = MagicMock(return_value=image("gemini"))
+    router = create_router(openai, gemini)
+
+    result = asyncio.run(router.generate("猫", preferred="gemini"))
+
+    assert result.provider == "gemini"
+    openai.assert_not_called()
+
+
+def test_repeated_failures_deprioritize_provider():
+    openai = MagicMock(return_value=ProviderResult.failure(500, "Server Error", provider="openai"))
+    gemini = MagicMock(return_value=image("gemini"))
+    router = create_router(openai, gemini)
+
+    async def scenario():
+        for _ in range(FAILURE_THRESHOLD + 1):
+            await router.generate("猫", preferred="openai")
+
+    asyncio.run(scenario())
+
+    # しきい値を超えた後は指定されていても後回しにする
+    assert openai.call_count == FAILURE_THRESHOLD
+    assert [provider.name for provider in router.candidates("openai")] == ["gemini", "openai"]
+
+
+def test_rejections_do_not_affect_health():
+    openai = MagicMock(return_value=ProviderResult.failure("content_policy_violation", "コンテンツポリシー違反です."))
+    gemini = MagicMock(return_value=image("gemini"))
+    router = create_router(openai, gemini)
+
+    async def scenario():
+        for _ in range(FAILURE_THRESHOLD + 1):
+            assert (await router.generate("猫", preferred="openai")).provider == "gemini"
+
+    asyncio.run(scenario())
+
+    assert openai.call_count == FAILURE_THRESHOLD + 1
+
+
+def test_slow_provider_times_out():
+    def slow(**kwargs):
+        time.sleep(0.5)
+        return image("openai")
+    gemini = MagicMock(return_value=image("gemini"))
+    router = create_router(slow, gemini, timeout=0.05)
+
+    result = asyncio.run(router.generate("猫", preferred="openai"))
+
+    assert result.provider == "gemini"
+
+
+def test_stability_receives_translated_prompt():
+    failing = MagicMock(return_value=ProviderResult.failure(1, "error"))
+    stability = MagicMock(return_value=image("stability", "a cat"))
+    translator = MagicMock()
+
+    async def translate(prompt):
+        return ProviderResult.success("a cat")
+    translator.translate.side_effect = translate
+    router = create_router(failing, failing, stability, translator=translator)
+
+    result = asyncio.run(router.generate("猫", preferred="openai", negative_prompt="text"))
+
+    assert result.provider == "stability"
+    assert stability.call_args.kwargs == {
+        "model": StableDiffusionModel.SDXL_1_0, "prompt": "a cat", "negative_prompt": "text"
+    }
+    assert "negative_prompt" not in failing.call_args.kwargs
+
+
+def test_returns_last_error_when_every_provider_fails():
+    openai = MagicMock(return_value=ProviderResult.failure(1, "openai error"))
+    gemini = MagicMock(return_value=ProviderResult.failure(1, "gemini error"))
+    router = create_router(openai, gemini)
+
+    result = asyncio.run(router.generate("猫", preferred="openai"))
+
+    assert not result.ok and result.error.message == "gemini error"
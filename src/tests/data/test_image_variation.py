@@ -0,0 +1,116 @@
+import asyncio
+import io
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+
+from src.data.entities.provider_result import ProviderResult
+from src.data.single_flight import SingleFlight
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+def png(color: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeAttachment:
+    def __init__(self, filename: str, data: bytes, content_type: str = "image/png"):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = len(data)
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    def history(self, limit: int):
+        async def empty():
+            return
+            yield
+        return empty()
+
+    async def send(self, content):
+        message = FakeMessage()
+        self.sent.append(message)
+        return message
+
+
+@pytest.fixture
+def command() -> TelDiscordCommand:
+    # API クライアントの初期化を避けるため __init__ を呼ばずに生成する
+    instance = TelDiscordCommand.__new__(TelDiscordCommand)
+    instance.discord_client = MagicMock()
+    instance.singleFlight = SingleFlight()
+    instance.openAIApi = MagicMock()
+    return instance
+
+
+def run_mention(command: TelDiscordCommand, attachments: list) -> FakeMessage:
+    channel = FakeChannel()
+    message = MagicMock()
+    message.content = "画像を再生成して"
+    message.channel = channel
+    message.attachments = attachments
+    asyncio.run(command.on_receive_mention_from_user(message))
+    return channel.sent[0]
+
+
+def test_all_attachments_are_processed_concurrently(command):
+    # 2 つの呼び出しが同時に実行されていないと揃わない
+    barrier = threading.Barrier(2, timeout=5)
+    uploaded = []
+
+    def create_image_variation(model, image):
+        uploaded.append(Image.open(io.BytesIO(image)).size)
+        barrier.wait()
+        return ProviderResult.success({"url": f"https://example.com/{len(uploaded)}.png", "prompt": None})
+    command.openAIApi.create_image_variation.side_effect = create_image_variation
+
+    reply = run_mention(command, [
+        FakeAttachment("red.png", png("red")),
+        FakeAttachment("blue.png", png("blue")),
+    ])
+
+    # 添付画像は正方形の PNG に変換してから送信する
+    assert uploaded == [(48, 48), (48, 48)]
+    assert len(reply.edits[-1]["embeds"]) == 2
+
+
+def test_failed_attachments_are_reported(command):
+    command.openAIApi.create_image_variation.return_value = ProviderResult.success(
+        {"url": "https://example.com/1.png", "prompt": None}
+    )
+
+    reply = run_mention(command, [
+        FakeAttachment("red.png", png("red")),
+        FakeAttachment("broken.png", b"broken"),
+        FakeAttachment("notes.txt", b"text", content_type="text/plain"),
+    ])
+
+    assert len(reply.edits[-1]["embeds"]) == 1
+    assert "broken.png" in reply.edits[-1]["content"]
+    assert "notes.txt" not in reply.edits[-1]["content"]
+
+
+def test_rejects_messages_without_images(command):
+    reply = run_mention(command, [FakeAttachment("notes.txt", b"text", content_type="text/plain")])
+
+    assert reply.edits[-1] == {"content": "画像の形式が正しくありません"}
+    command.openAIApi.create_image_variation.assert_not_called()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+
+from src.data import job_worker
+from src.data.job_queue import STATUS_FAILED, JobQueue
+
+
+def test_enqueue_and_claim(tmp_path):
+    # 登録したジョブが登録順に取り出される
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"))
+    first = queue.enqueue("openai_question", {"prompt": "こんにちは"}, {"token": "a"})
+    second = queue.enqueue("gemini_question", {"prompt": "やあ"}, {"token": "b"})
+
+    job = queue.claim("worker-1")
+    assert job.id == first
+    assert job.command == "openai_question"
+    assert job.arguments == {"prompt": "こんにちは"}
+    assert job.interaction == {"token": "a"}
+    assert job.attempts == 1
+
+    assert queue.claim("worker-2").id == second
+    assert queue.claim("worker-3") is None
+
+
+def test_jobs_survive_reopen(tmp_path):
+    # キューを開き直しても (コンテナ再起動相当) ジョブが残っている
+    path = os.path.join(tmp_path, "jobs.sqlite3")
+    JobQueue(path).enqueue("openai_question", {"prompt": "test"}, {})
+
+    reopened = JobQueue(path)
+    assert reopened.pending_count() == 1
+    assert reopened.claim("worker-1").command == "openai_question"
+
+
+def test_completed_job_is_not_claimed_again(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"))
+    queue.enqueue("openai_question", {}, {})
+    job = queue.claim("worker-1")
+    assert queue.complete(job.id, "worker-1")
+
+    assert queue.claim("worker-1") is None
+    assert queue.pending_count() == 0
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    # ワーカーが落ちてリースが切れたジョブは再度取り出される
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"), lease_seconds=0.01)
+    queue.enqueue("openai_question", {}, {})
+    queue.claim("worker-1")
+    time.sleep(0.02)
+
+    job = queue.claim("worker-2")
+    assert job is not None
+    assert job.attempts == 2
+
+
+def test_job_exceeding_max_attempts_is_failed(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"), lease_seconds=0.0, max_attempts=1)
+    job_id = queue.enqueue("openai_question", {}, {})
+    queue.claim("worker-1")
+
+    assert queue.claim("worker-2") is None
+    with queue._connect() as connection:
+        status = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert status == STATUS_FAILED
+
+
+def test_renewed_lease_is_not_reclaimed(tmp_path):
+    # 実行中にリースを延長したジョブは他のワーカーに取り出されない
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"), lease_seconds=0.05)
+    queue.enqueue("openai_question", {}, {})
+    job = queue.claim("worker-1")
+    time.sleep(0.03)
+    assert queue.renew(job.id, "worker-1")
+    time.sleep(0.03)
+
+    assert queue.claim("worker-2") is None
+    # リースが切れて他のワーカーが取り出した後は延長できない
+    time.sleep(0.06)
+    assert queue.claim("worker-2").id == job.id
+    assert not queue.renew(job.id, "worker-1")
+
+
+def test_stale_worker_cannot_finish_a_reclaimed_job(tmp_path):
+    # リースが切れた後の古いワーカーは、新しいワーカーが実行中のジョブの状態を上書きできない
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"), lease_seconds=0.01)
+    job_id = queue.enqueue("openai_question", {}, {})
+    queue.claim("worker-1")
+    time.sleep(0.02)
+    queue.claim("worker-2")
+
+    assert not queue.fail(job_id, "worker-1", "timeout")
+    assert queue.pending_count() == 1
+    assert queue.complete(job_id, "worker-2")
+    assert queue.pending_count() == 0
+
+
+def test_losing_the_lease_cancels_the_running_job(tmp_path, monkeypatch):
+    queue = JobQueue(os.path.join(tmp_path, "jobs.sqlite3"), lease_seconds=0.03)
+    queue.enqueue("openai_question", {}, {})
+    job = queue.claim("worker-1")
+    cancelled = []
+
+    async def slow_job(client, command, job):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(job.id)
+            raise
+    monkeypatch.setattr(job_worker, "execute_job", slow_job)
+    # 他のワーカーに取り出されてリースを延長できなくなった状態
+    monkeypatch.setattr(queue, "renew", lambda job_id, worker: False)
+
+    asyncio.run(asyncio.wait_for(job_worker.run_job(queue, None, None, job, "worker-1"), timeout=5))
+
+    assert cancelled == [job.id]
+    # 状態は新しいワーカーに任せて更新しない
+    assert queue.pending_count() == 1
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import discord
+
+from src.data.memory_profiler import MemoryProfiler
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+def test_report_shows_growth_since_previous_snapshot():
+    profiler = MemoryProfiler(limit=5)
+    profiler.start()
+    try:
+        first = profiler.report(cache_sizes={"messages": 0})
+        retained = [bytearray(1024) for _ in range(2000)]
+        second = profiler.report()
+    finally:
+        profiler.stop()
+
+    assert "discord cache: messages=0" in first
+    assert "changes since the previous snapshot" not in first
+    assert "changes since the previous snapshot" in second
+    assert "test_memory_profiler.py" in second.split("changes since the previous snapshot")[1]
+    assert len(retained) == 2000
+
+
+def test_report_requires_tracing():
+    assert "not running" in MemoryProfiler().report()
+
+
+def make_message(reference) -> MagicMock:
+    message = MagicMock()
+    message.reference = reference
+    message.channel.fetch_message = AsyncMock(return_value="fetched")
+    return message
+
+
+def test_resolve_reference_uses_gateway_payload_then_api():
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    resolved = MagicMock(spec=discord.Message)
+    deleted = MagicMock(spec=discord.DeletedReferencedMessage)
+
+    async def scenario():
+        return [
+            await command.resolve_reference(make_message(None)),
+            await command.resolve_reference(make_message(SimpleNamespace(message_id=1, resolved=resolved))),
+            await command.resolve_reference(make_message(SimpleNamespace(message_id=1, resolved=deleted))),
+            await command.resolve_reference(make_message(SimpleNamespace(message_id=1, resolved=None))),
+        ]
+
+    assert asyncio.run(scenario()) == [None, resolved, None, "fetched"]
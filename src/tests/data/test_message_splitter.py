@@ -0,0 +1,74 @@
+import pytest
+
+from src.data.message_splitter import build_preview, split_markdown_message
+from src.tests.benchmarks.payloads import UDON_CODE_BLOCK, build_answer
+
+
+def _fence_count(chunk: str) -> int:
+    return sum(1 for line in chunk.splitlines() if line.strip().startswith("```"))
+
+
+def test_short_message_is_not_split():
+    # 制限以内のメッセージはそのまま返す
+    assert split_markdown_message("こんにちは", limit=100) == ["こんにちは"]
+
+
+@pytest.mark.parametrize("limit", [300, 500, 1800])
+def test_chunks_are_within_limit_and_fences_balanced(limit):
+    # すべてのかたまりが制限以内で、コードブロックが閉じられていること
+    message = build_answer(20 * 1024)
+    chunks = split_markdown_message(message, limit=limit)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= limit
+        assert _fence_count(chunk) % 2 == 0
+
+
+def test_long_code_block_is_reopened_with_language():
+    # 分割されたコードブロックは同じ言語指定で開き直される
+    code = "```csharp\n" + "".join(f"int value{i} = {i};\n" for i in range(200)) + "```\n"
+    chunks = split_markdown_message("説明です\n\n" + code, limit=400)
+
+    code_chunks = [chunk for chunk in chunks if "int value" in chunk]
+    assert len(code_chunks) > 1
+    for chunk in code_chunks:
+        assert chunk.startswith("```csharp\n")
+        assert chunk.endswith("```")
+
+
+def test_split_on_line_boundaries():
+    # 行の途中で分割されないこと
+    lines = [f"{i}行目の説明です。" for i in range(300)]
+    chunks = split_markdown_message("\n".join(lines), limit=200)
+
+    rejoined = [line for chunk in chunks for line in chunk.split("\n")]
+    assert rejoined == lines
+
+
+def test_long_line_is_split_at_soft_break():
+    # 改行のない長い行は句読点の位置で分割される
+    message = "これはとても長い文章です。" * 100
+    chunks = split_markdown_message(message, limit=100)
+
+    assert "".join(chunks) == message
+    for chunk in chunks[:-1]:
+        assert chunk.endswith("。")
+
+
+def test_unterminated_fence_is_closed():
+    # 閉じられていないコードブロックも各かたまりで閉じる
+    message = "```python\n" + "print('hello')\n" * 100
+    chunks = split_markdown_message(message, limit=300)
+
+    for chunk in chunks:
+        assert _fence_count(chunk) == 2
+
+
+def test_build_preview_keeps_fence_closed():
+    # プレビューは制限以内でコードブロックが閉じられている
+    message = UDON_CODE_BLOCK * 20
+    preview = build_preview(message, limit=500)
+
+    assert len(preview) <= 500
+    assert _fence_count(preview) % 2 == 0
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.data.configs import parse_tier_overrides
+from src.data.entities.claude_model import ClaudeModel
+from src.data.entities.gemini_model import GeminiChatModel
+from src.data.entities.model_tier import ModelTier
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.model_router import (
+    PROVIDER_CLAUDE,
+    PROVIDER_GEMINI,
+    PROVIDER_OPENAI,
+    ModelRouter,
+    classify_prompt,
+)
+
+
+@pytest.fixture
+def config():
+    with patch("src.data.model_router.botConfig") as mock_config:
+        mock_config.model_routing_enabled = True
+        mock_config.model_tier_overrides = {}
+        mock_config.openai_chat_model = OpenAIChatModel.GPT_4_1
+        mock_config.gemini_chat_model = GeminiChatModel.GEMINI_2_5_FLASH
+        mock_config.claude_model = ClaudeModel.CLAUDE_4_0_SONNET
+        yield mock_config
+
+
+def test_short_prompt_is_simple():
+    score, reasons = classify_prompt("今日の天気は？")
+    assert score == 0
+    assert reasons == []
+
+
+def test_code_prompt_is_hard():
+    score, reasons = classify_prompt("このコードが動きません\n```csharp\nvoid Start() { }\n```")
+    assert score >= 2
+    assert "code" in reasons
+
+
+def test_long_prompt_is_hard():
+    score, reasons = classify_prompt("あ" * 500)
+    assert "long" in reasons
+    assert score >= 2
+
+
+@pytest.mark.parametrize("provider, fast, flagship", [
+    (PROVIDER_OPENAI, OpenAIChatModel.GPT_4_O_MINI, OpenAIChatModel.GPT_4_1),
+    (PROVIDER_GEMINI, GeminiChatModel.GEMINI_2_0_FLASH, GeminiChatModel.GEMINI_2_5_FLASH),
+    (PROVIDER_CLAUDE, ClaudeModel.CLAUDE_3_5_HAIKU, ClaudeModel.CLAUDE_4_0_SONNET),
+])
+def test_route_by_complexity(config, provider, fast, flagship):
+    # 簡単な質問は高速なモデル、難しい質問はフラッグシップモデルに振り分けられる
+    router = ModelRouter()
+
+    simple = router.route("question", provider, "こんにちは")
+    hard = router.route("question", provider, "なぜこのコードでエラーになるのか詳しく教えて\n```\nint a = 0;\n```")
+
+    assert simple.tier == ModelTier.FAST
+    assert simple.model == fast
+    assert hard.tier == ModelTier.FLAGSHIP
+    assert hard.model == flagship
+
+
+def test_route_with_override(config):
+    # コマンドごとの指定がある場合は質問の内容に関係なくその階層を使う
+    config.model_tier_overrides = {"openai_question_udon": ModelTier.FLAGSHIP}
+    router = ModelRouter()
+
+    decision = router.route("openai_question_udon", PROVIDER_OPENAI, "こんにちは")
+
+    assert decision.tier == ModelTier.FLAGSHIP
+    assert decision.reasons == ["override"]
+
+
+def test_route_disabled(config):
+    config.model_routing_enabled = False
+    router = ModelRouter()
+
+    assert router.route("openai_question", PROVIDER_OPENAI, "こんにちは").model == OpenAIChatModel.GPT_4_1
+
+
+def test_parse_tier_overrides():
+    overrides = parse_tier_overrides("openai_question=flagship, claude_question=fast")
+    assert overrides == {"openai_question": ModelTier.FLAGSHIP, "claude_question": ModelTier.FAST}
+    assert parse_tier_overrides(None) == {}
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.data import tel_discord_command
+from src.data.entities.constants import Constants
+from src.data.entities.provider_result import ProviderResult
+from src.data.outbox import (
+    KIND_GITHUB_ISSUE, KIND_STATUS_MESSAGE, STATUS_FAILED, STATUS_PENDING, STATUS_SENT, Outbox,
+    PermanentDeliveryError,
+)
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(base_delay=0.0, max_attempts=3)
+    box.open(str(tmp_path / "outbox.sqlite3"))
+    yield box
+    asyncio.run(box.close())
+
+
+def make_reply(**overrides) -> dict:
+    return {
+        "application_id": 1, "token": "token", "message_id": 2, "channel_id": 3, "user_id": 4,
+        "created_at": time.time(), "prefix": "title\n", "success": "done: {result}", "failure": "failed: {error}",
+        **overrides,
+    }
+
+
+def test_enqueue_deduplicates_by_key(outbox):
+    async def scenario():
+        first = await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"}, dedup_key="key")
+        second = await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"}, dedup_key="key")
+        third = await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"})
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first.is_new and third.is_new
+    assert (second.is_new, second.id, second.status) == (False, first.id, STATUS_PENDING)
+    assert outbox.pending_count() == 2
+
+
+def test_failed_delivery_is_retried_and_reply_is_edited(outbox):
+    deliver = AsyncMock(side_effect=[RuntimeError("502 Bad Gateway"), "https://github.com/issues/1"])
+    outbox.register(KIND_GITHUB_ISSUE, deliver)
+    outbox.client = MagicMock()
+    webhook = MagicMock()
+    webhook.edit_message = AsyncMock()
+
+    async def scenario():
+        await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"}, dedup_key="key", reply=make_reply())
+        with patch("src.data.outbox.discord.Webhook.partial", return_value=webhook):
+            assert await outbox.deliver_due() == 1
+            assert outbox.pending_count() == 1
+            assert await outbox.deliver_due() == 1
+        return await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"}, dedup_key="key")
+
+    duplicate = asyncio.run(scenario())
+
+    assert deliver.await_count == 2
+    assert (duplicate.status, duplicate.result) == (STATUS_SENT, "https://github.com/issues/1")
+    webhook.edit_message.assert_awaited_once_with(2, content="title\ndone: https://github.com/issues/1")
+
+
+def test_permanent_error_gives_up_and_reports_failure(outbox):
+    outbox.register(KIND_STATUS_MESSAGE, AsyncMock(side_effect=PermanentDeliveryError("missing channel")))
+    outbox.client = MagicMock()
+    channel = MagicMock()
+    channel.send = AsyncMock()
+    outbox.client.get_channel.return_value = channel
+
+    async def scenario():
+        # トークンの期限が切れた応答はチャンネルに通知する
+        reply = make_reply(created_at=time.time() - 3600)
+        result = await outbox.enqueue(KIND_STATUS_MESSAGE, {"channel_id": 1}, dedup_key="key", reply=reply)
+        await outbox.deliver_due()
+        return result, await outbox.deliver_due(), await outbox.enqueue(KIND_STATUS_MESSAGE, {}, dedup_key="key")
+
+    _, claimed, duplicate = asyncio.run(scenario())
+
+    assert claimed == 0
+    assert duplicate.status == STATUS_FAILED
+    channel.send.assert_awaited_once_with("<@4> failed: missing channel")
+
+
+def test_batches_by_key_and_skips_paused_kinds(outbox):
+    deliver = AsyncMock(return_value="sent")
+    outbox.register(KIND_STATUS_MESSAGE, deliver, batch_by="channel_id")
+    paused = AsyncMock()
+    outbox.register(KIND_GITHUB_ISSUE, paused, is_paused=lambda: True)
+
+    async def scenario():
+        for channel_id, content in ((1, "a"), (2, "b"), (1, "c")):
+            await outbox.enqueue(KIND_STATUS_MESSAGE, {"channel_id": channel_id, "content": content})
+        await outbox.enqueue(KIND_GITHUB_ISSUE, {"title": "a"})
+        return await outbox.deliver_due()
+
+    assert asyncio.run(scenario()) == 3
+    assert [call.args[0] for call in deliver.await_args_list] == [
+        [{"channel_id": 1, "content": "a"}, {"channel_id": 1, "content": "c"}],
+        [{"channel_id": 2, "content": "b"}],
+    ]
+    paused.assert_not_awaited()
+    assert outbox.pending_count() == 1
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    crashed = Outbox(lease_seconds=-1)
+    crashed.open(path)
+    asyncio.run(crashed.enqueue(KIND_GITHUB_ISSUE, {"title": "a"}))
+    # 取り出した後に送信せずに落ちたプロセス
+    assert len(crashed._claim([KIND_GITHUB_ISSUE])) == 1
+
+    restarted = Outbox()
+    restarted.open(path)
+    deliver = AsyncMock(return_value="url")
+    restarted.register(KIND_GITHUB_ISSUE, deliver)
+
+    assert asyncio.run(restarted.deliver_due()) == 1
+    deliver.assert_awaited_once()
+    asyncio.run(crashed.close())
+    asyncio.run(restarted.close())
+
+
+def test_git_create_issue_returns_before_github_is_called(outbox, monkeypatch):
+    monkeypatch.setattr(tel_discord_command, "outbox", outbox)
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    command.githubApi = MagicMock()
+    command.githubApi.create_issue.return_value = ProviderResult.success("https://github.com/issues/2", provider="github")
+    answer = SimpleNamespace(id=10, edit=AsyncMock())
+    interaction = MagicMock()
+    interaction.response.defer = AsyncMock()
+    interaction.followup.send = AsyncMock(return_value=answer)
+    interaction.configure_mock(application_id=1, token="token", channel_id=3)
+    interaction.user.configure_mock(id=4, name="telneko")
+    interaction.created_at.timestamp.return_value = time.time()
+
+    async def scenario():
+        await command.git_create_issue(interaction, "title", "body")
+        command.githubApi.create_issue.assert_not_called()
+        outbox.register(KIND_GITHUB_ISSUE, command.deliver_issue)
+        await outbox.deliver_due()
+        await command.git_create_issue(interaction, "title", "body")
+
+    asyncio.run(scenario())
+
+    command.githubApi.create_issue.assert_called_once_with("te***", "title", "body")
+    assert interaction.followup.send.await_args.kwargs["content"].endswith(Constants.issue_queued_message)
+    answer.edit.assert_awaited_once_with(content="```title\nbody```\nIssueを作成しました: https://github.com/issues/2")
+
+
+@pytest.mark.parametrize("code, expected", [
+    (422, PermanentDeliveryError),
+    (401, PermanentDeliveryError),
+    (429, RuntimeError),
+    (502, RuntimeError),
+    (1, RuntimeError),
+])
+def test_deliver_issue_retries_only_transient_github_errors(code, expected):
+    command = TelDiscordCommand.__new__(TelDiscordCommand)
+    command.githubApi = MagicMock()
+    command.githubApi.create_issue.return_value = ProviderResult.failure(code, "GitHub API error", provider="github")
+    payload = {"author": "te***", "title": "title", "message": "body"}
+
+    with pytest.raises(expected):
+        asyncio.run(command.deliver_issue([payload]))
@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.entities.provider_result import ProviderResult
+from src.data.prompt_translator import PromptTranslator, is_sd_ready_prompt
+from src.data.single_flight import SingleFlight
+
+
+@pytest.mark.parametrize("prompt", [
+    "a cat sitting on a windowsill, watercolor",
+    "(masterpiece:1.2), 1girl, silver hair, <lora:style:0.8>",
+    "ＣＡＴ， ｃｕｔｅ",
+    "sunset 🌅 over the sea",
+])
+def test_sd_ready_prompt(prompt):
+    assert is_sd_ready_prompt(prompt)
+
+
+@pytest.mark.parametrize("prompt", [
+    "窓辺に座っている猫",
+    "cute な猫",
+    "",
+    "1234, 5678",
+])
+def test_prompt_needs_translation(prompt):
+    assert not is_sd_ready_prompt(prompt)
+
+
+@pytest.fixture
+def openai_api():
+    api = MagicMock()
+    api.conversation.return_value = ProviderResult.success("a cat sitting by the window")
+    return api
+
+
+def create_translator(openai_api, **kwargs) -> PromptTranslator:
+    return PromptTranslator(
+        openai_api=openai_api,
+        single_flight=SingleFlight(),
+        model=OpenAIChatModel.GPT_4_O_MINI,
+        **kwargs
+    )
+
+
+def test_english_prompt_passes_through(openai_api):
+    translator = create_translator(openai_api)
+
+    result = asyncio.run(translator.translate(" a cat, watercolor "))
+
+    assert result.payload == "a cat, watercolor"
+    openai_api.conversation.assert_not_called()
+
+
+def test_translation_is_cached(openai_api):
+    translator = create_translator(openai_api, max_tokens=100)
+
+    first = asyncio.run(translator.translate("窓辺の猫"))
+    # 空白などの違いは同じプロンプトとして扱う
+    second = asyncio.run(translator.translate(" 窓辺の猫\n"))
+
+    assert first.payload == second.payload == "a cat sitting by the window"
+    assert not first.cache_hit and second.cache_hit
+    assert openai_api.conversation.call_count == 1
+    args, kwargs = openai_api.conversation.call_args
+    assert args[0] == OpenAIChatModel.GPT_4_O_MINI
+    assert kwargs["max_tokens"] == 100
+
+
+def test_cache_expires(openai_api):
+    translator = create_translator(openai_api, cache_ttl=0)
+
+    asyncio.run(translator.translate("窓辺の猫"))
+    asyncio.run(translator.translate("窓辺の猫"))
+
+    assert openai_api.conversation.call_count == 2
+
+
+def test_error_is_not_cached(openai_api):
+    openai_api.conversation.return_value = ProviderResult.failure(1, "error")
+    translator = create_translator(openai_api)
+
+    assert not asyncio.run(translator.translate("窓辺の猫")).ok
+    asyncio.run(translator.translate("窓辺の猫"))
+
+    assert openai_api.conversation.call_count == 2
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from src.data.entities.entity import Usage
+from src.data.entities.provider_result import ProviderResult, measure_total
+from src.data.single_flight import SingleFlight
+
+
+def test_success_has_payload():
+    result = ProviderResult.success("回答", usage=Usage(prompt_tokens=3), provider="openai", model="gpt-4o")
+
+    assert result.ok
+    assert result.payload == "回答"
+    assert result.usage.prompt_tokens == 3
+    assert result.error is None
+
+
+def test_failure_has_error():
+    result = ProviderResult.failure("content_policy_violation", "コンテンツポリシー違反です.")
+
+    assert not result.ok
+    assert result.payload is None
+    assert (result.error.code, result.error.message) == ("content_policy_violation", "コンテンツポリシー違反です.")
+
+
+def test_result_is_slotted():
+    result = ProviderResult.success("回答")
+
+    assert not hasattr(result, "__dict__")
+
+
+def test_measure_total_records_elapsed_time():
+    @measure_total
+    def call():
+        return ProviderResult.success("回答")
+
+    assert call().timings.total > 0
+
+
+def test_single_flight_marks_coalesced_results():
+    release = threading.Event()
+
+    def provider():
+        release.wait(timeout=5)
+        return ProviderResult.success("回答")
+
+    async def scenario():
+        single_flight = SingleFlight()
+        first = asyncio.create_task(single_flight.run(("question", None, "q", ()), provider))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(single_flight.run(("question", None, "q", ()), provider))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await first, await second
+
+    first, second = asyncio.run(scenario())
+
+    assert not first.coalesced and second.coalesced
+    assert first.payload == second.payload == "回答"
+    assert first.timings.queued >= 0
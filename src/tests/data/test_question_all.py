@@ -0,0 +1,108 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.data.configs import botConfig
+from src.data.entities.provider_result import ProviderResult
+from src.data.model_router import ModelRouter
+from src.data.single_flight import SingleFlight
+from src.data.tel_discord_command import TelDiscordCommand
+
+
+class FakeMessage:
+    def __init__(self, embed):
+        self.edits = []
+
+    async def edit(self, embed=None, **kwargs):
+        # 編集された時点の各フィールドの名前を記録する
+        self.edits.append([field.name for field in embed.fields])
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+        self.files = []
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        if file is not None:
+            self.files.append(file)
+        message = FakeMessage(embed)
+        self.messages.append(message)
+        return message
+
+
+class FakeResponse:
+    async def defer(self):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.created_at = datetime.now(timezone.utc)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+def provider(delay: float, result: dict):
+    api = MagicMock()
+
+    def question(**kwargs):
+        time.sleep(delay)
+        return result
+    api.question.side_effect = question
+    return api
+
+
+@pytest.fixture
+def command() -> TelDiscordCommand:
+    # API クライアントの初期化を避けるため __init__ を呼ばずに生成する
+    instance = TelDiscordCommand.__new__(TelDiscordCommand)
+    instance.singleFlight = SingleFlight()
+    instance.modelRouter = ModelRouter()
+    return instance
+
+
+def test_answers_are_shown_as_they_arrive(command):
+    command.openAIApi = provider(0.3, ProviderResult.success("OpenAI の回答"))
+    command.geminiApi = provider(0.0, ProviderResult.success("Gemini の回答"))
+    command.langchainClaudeApi = provider(0.1, ProviderResult.failure(1, "Claude API Error"))
+    interaction = FakeInteraction()
+
+    start = time.perf_counter()
+    asyncio.run(command.question_all(interaction, "猫について教えて"))
+
+    # 3 つのプロバイダを同時に呼ぶため、最も遅いプロバイダの時間程度で終わる
+    assert time.perf_counter() - start < 0.55
+    edits = interaction.followup.messages[0].edits
+    assert len(edits) == 3
+    # 速い Gemini が最初に、エラーの Claude が次に反映され、遅い OpenAI を待たない
+    assert edits[0][0] == "OpenAI" and edits[0][1].startswith("Gemini (") and edits[0][2] == "Claude"
+    assert edits[1][2].startswith("Claude (")
+    assert all(name.endswith("s") for name in edits[2])
+    assert interaction.followup.files == []
+
+
+def test_slow_provider_times_out(command, monkeypatch):
+    monkeypatch.setattr(botConfig, "question_all_timeout", 0.05)
+    command.openAIApi = provider(0.3, ProviderResult.success("OpenAI の回答"))
+    command.geminiApi = provider(0.0, ProviderResult.success("Gemini の回答"))
+    command.langchainClaudeApi = provider(0.0, ProviderResult.success("Claude の回答"))
+    interaction = FakeInteraction()
+
+    asyncio.run(command.question_all(interaction, "猫について教えて"))
+
+    assert len(interaction.followup.messages[0].edits) == 3
+
+
+def test_long_answers_are_attached(command):
+    command.openAIApi = provider(0.0, ProviderResult.success("あ" * 2000))
+    command.geminiApi = provider(0.0, ProviderResult.success("Gemini の回答"))
+    command.langchainClaudeApi = provider(0.0, ProviderResult.success("Claude の回答"))
+    interaction = FakeInteraction()
+
+    asyncio.run(command.question_all(interaction, "猫について教えて"))
+
+    assert len(interaction.followup.files) == 1
@@ -0,0 +1,49 @@
+import discord
+
+from src.data.configs import botConfig
+from src.data.sharding import build_intents, client_options, shard_id_for_guild, split_shard_groups
+
+
+def test_shard_id_for_guild():
+    # Discord のシャーディング規則に従ってシャードIDが決まる
+    guild_id = 81384788765712384
+    assert shard_id_for_guild(guild_id, 4) == (guild_id >> 22) % 4
+
+
+def test_shard_id_without_guild_or_sharding():
+    # DM やシャーディング無効時はシャード 0
+    assert shard_id_for_guild(None, 4) == 0
+    assert shard_id_for_guild(81384788765712384, None) == 0
+
+
+def test_split_shard_groups():
+    # すべてのシャードがちょうど 1 回ずつ割り当てられる
+    groups = split_shard_groups(shard_count=10, process_count=3)
+
+    assert len(groups) == 3
+    assert sorted(shard_id for group in groups for shard_id in group) == list(range(10))
+    assert 0 in groups[0]
+
+
+def test_split_shard_groups_more_processes_than_shards():
+    # プロセス数がシャード数より多い場合はシャード数に合わせる
+    assert split_shard_groups(shard_count=2, process_count=8) == [[0], [1]]
+
+
+def test_minimal_intents_only_receive_used_events():
+    intents = build_intents("minimal")
+
+    assert intents.guilds and intents.guild_messages and intents.message_content
+    assert not (intents.guild_typing or intents.guild_reactions or intents.voice_states or intents.members)
+
+
+def test_client_options_disable_unused_caches(monkeypatch):
+    monkeypatch.setattr(botConfig, "max_messages", None)
+    monkeypatch.setattr(botConfig, "member_cache_enabled", False)
+    monkeypatch.setattr(botConfig, "chunk_guilds_at_startup", False)
+
+    options = client_options(build_intents("default"))
+
+    assert options["max_messages"] is None
+    assert options["member_cache_flags"].value == discord.MemberCacheFlags.none().value
+    assert options["chunk_guilds_at_startup"] is False
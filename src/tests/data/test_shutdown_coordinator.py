@@ -0,0 +1,80 @@
+import asyncio
+
+from src.data.shutdown_coordinator import ShutdownCoordinator
+
+
+def test_shutdown_waits_for_in_flight_commands():
+    async def scenario():
+        coordinator = ShutdownCoordinator(drain_timeout=5.0, progress_interval=0.05)
+        steps = []
+        coordinator.add_cleanup("sync", lambda: steps.append("sync"))
+
+        async def async_cleanup():
+            steps.append("async")
+        coordinator.add_cleanup("async", async_cleanup)
+
+        async def command():
+            async with coordinator.track("openai_question"):
+                await asyncio.sleep(0.2)
+                steps.append("command")
+
+        task = asyncio.create_task(command())
+        await asyncio.sleep(0)
+        assert coordinator.in_flight_count == 1
+
+        await coordinator.shutdown("test")
+        assert coordinator.is_draining
+        assert task.done() and not task.cancelled()
+        return steps
+
+    # 実行中のコマンドが終わってから後始末が登録順に実行される
+    assert asyncio.run(scenario()) == ["command", "sync", "async"]
+
+
+def test_shutdown_cancels_commands_after_deadline():
+    async def scenario():
+        coordinator = ShutdownCoordinator(drain_timeout=0.1, progress_interval=0.05)
+
+        async def command():
+            async with coordinator.track("stablediffusion_generate_image"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(command())
+        await asyncio.sleep(0)
+        await coordinator.shutdown("test")
+        return task, coordinator.in_flight_count
+
+    task, in_flight_count = asyncio.run(scenario())
+    assert task.cancelled()
+    assert in_flight_count == 0
+
+
+def test_shutdown_runs_once():
+    async def scenario():
+        coordinator = ShutdownCoordinator(drain_timeout=1.0)
+        calls = []
+        coordinator.add_cleanup("stop notification", lambda: calls.append("notified"))
+
+        # シグナルが複数回届いても停止処理は 1 度だけ実行される
+        first = coordinator.request_shutdown("SIGTERM")
+        second = coordinator.request_shutdown("SIGINT")
+        assert first is second
+        await coordinator.shutdown("client stopped")
+        return calls
+
+    assert asyncio.run(scenario()) == ["notified"]
+
+
+def test_failed_cleanup_does_not_stop_others():
+    async def scenario():
+        coordinator = ShutdownCoordinator(drain_timeout=1.0)
+        calls = []
+
+        def broken():
+            raise RuntimeError("boom")
+        coordinator.add_cleanup("broken", broken)
+        coordinator.add_cleanup("discord client", lambda: calls.append("closed"))
+        await coordinator.shutdown("test")
+        return calls
+
+    assert asyncio.run(scenario()) == ["closed"]
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.metrics import metrics
+from src.data.single_flight import SingleFlight, normalize_prompt, request_key
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Ｕｄｏｎ   Sharp\nとは？ ") == normalize_prompt("udon sharp とは?")
+    assert normalize_prompt(None) == ""
+
+
+def test_request_key_ignores_formatting_but_not_parameters():
+    model = OpenAIChatModel.GPT_4_1
+    assert request_key("openai_question", model, "Hello  World") == request_key("openai_question", model, "hello world")
+    assert request_key("openai_question", model, "cat") != request_key("openai_question", OpenAIChatModel.GPT_4_O_MINI, "cat")
+    assert request_key("sd", model, "cat", negative_prompt="dog") != request_key("sd", model, "cat")
+
+
+def test_identical_requests_share_one_call():
+    calls = []
+
+    def provider(prompt: str) -> dict:
+        calls.append(prompt)
+        time.sleep(0.1)
+        return {"response": f"answer:{prompt}"}
+
+    async def scenario():
+        single_flight = SingleFlight()
+        key = request_key("openai_question", OpenAIChatModel.GPT_4_1, "cat")
+        other_key = request_key("openai_question", OpenAIChatModel.GPT_4_1, "dog")
+        results = await asyncio.gather(
+            single_flight.run(key, provider, prompt="cat"),
+            single_flight.run(key, provider, prompt="cat"),
+            single_flight.run(key, provider, prompt="cat"),
+            single_flight.run(other_key, provider, prompt="dog"),
+        )
+        return results, single_flight.in_flight_count
+
+    before = metrics.snapshot()["counters"].get("single_flight.saved_calls", 0)
+    results, in_flight_count = asyncio.run(scenario())
+
+    assert sorted(calls) == ["cat", "dog"]
+    assert results[:3] == [{"response": "answer:cat"}] * 3
+    assert in_flight_count == 0
+    assert metrics.snapshot()["counters"]["single_flight.saved_calls"] - before == 2
+
+
+def test_provider_call_runs_off_the_event_loop():
+    loop_thread = threading.get_ident()
+
+    def provider() -> int:
+        return threading.get_ident()
+
+    async def scenario():
+        return await SingleFlight().run(("command",), provider)
+
+    assert asyncio.run(scenario()) != loop_thread
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    def provider() -> dict:
+        time.sleep(0.1)
+        return {"response": "ok"}
+
+    async def scenario():
+        single_flight = SingleFlight()
+        first = asyncio.create_task(single_flight.run(("command",), provider))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(single_flight.run(("command",), provider))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == {"response": "ok"}
+
+
+def test_duplicate_submission():
+    single_flight = SingleFlight()
+    key = (1234, "openai_question", (("prompt", "cat"),))
+    with single_flight.submission(key) as first:
+        with single_flight.submission(key) as second:
+            assert first is True
+            assert second is False
+    # 完了後は再度実行できる
+    with single_flight.submission(key) as third:
+        assert third is True
@@ -0,0 +1,109 @@
+import asyncio
+
+import requests
+
+from src.data.common_method import translate_text
+from src.data.configs import botConfig
+from src.data.entities.claude_model import ClaudeModel
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.entities.stable_diffusion_model import StableDiffusionModel
+from src.data.github_api import GithubAPI
+from src.data.langchain_claude_api import LangchainClaudeAPI
+from src.data.openai_api import OpenAIAPI
+from src.data.stability_api import StabilityAPI
+from src.data.stub_provider_server import StubBehavior, StubProviderServer
+
+
+def run_against_stub(server: StubProviderServer, monkeypatch, scenario):
+    """
+    スタブサーバーを起動し、接続先を向けた同期クライアントをワーカースレッドで実行する
+    """
+
+    async def main():
+        base_url = await server.start()
+        monkeypatch.setattr(botConfig, "openai_base_url", f"{base_url}/v1")
+        monkeypatch.setattr(botConfig, "anthropic_base_url", base_url)
+        monkeypatch.setattr(botConfig, "stability_base_url", base_url)
+        monkeypatch.setattr(botConfig, "deepl_base_url", base_url)
+        monkeypatch.setattr(botConfig, "github_api_base_url", base_url)
+        # スタブサーバーは認証しないため、本物のキーがない環境でもクライアントを作成できるようにする
+        for name in ("openai_api_key", "claude_api_key", "stability_api_key", "deepl_api_key", "github_pat"):
+            monkeypatch.setattr(botConfig, name, "stub-key")
+        try:
+            return await asyncio.to_thread(scenario, base_url)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_clients_run_against_stub(monkeypatch):
+    server = StubProviderServer(StubBehavior(latency=0.0, completion_tokens=20))
+
+    def scenario(base_url):
+        openai_api = OpenAIAPI()
+        try:
+            return {
+                "openai": openai_api.question(OpenAIChatModel.GPT_4_1, "こんにちは", ""),
+                "image": openai_api.generate_image(OpenAIImageModel.DALL_E_3, "猫"),
+                "claude": LangchainClaudeAPI().question(ClaudeModel.CLAUDE_4_0_SONNET, "こんにちは", "system"),
+                "stability": StabilityAPI().generate_image(StableDiffusionModel.SDXL_1_0, "a cat"),
+                "github": GithubAPI().create_issue("tester", "title", "body"),
+                "deepl": translate_text("hello"),
+            }
+        finally:
+            openai_api.close()
+
+    results = run_against_stub(server, monkeypatch, scenario)
+
+    assert results["openai"].payload.startswith("これはスタブサーバーの回答です。")
+    assert results["openai"].usage.completion_tokens == 20
+    assert results["image"].payload["image"].startswith(b"\x89PNG")
+    assert results["claude"].ok, results["claude"].error
+    assert results["stability"].payload["image"].startswith(b"\x89PNG")
+    assert results["github"].payload.startswith("https://github.com/telneko/TelGPT-DiscordBot/issues/")
+    assert results["deepl"] == "hello"
+
+
+def test_chat_completions_stream_server_sent_events(monkeypatch):
+    server = StubProviderServer(StubBehavior(latency=0.0, completion_tokens=10))
+
+    def scenario(base_url):
+        response = requests.post(f"{base_url}/v1/chat/completions", json={
+            "model": "gpt-4.1",
+            "messages": [{"role": "user", "content": "hi"}],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        })
+        return response.headers["Content-Type"], response.text
+
+    content_type, text = run_against_stub(server, monkeypatch, scenario)
+
+    events = [line[len("data: "):] for line in text.split("\n\n") if line]
+    assert content_type.startswith("text/event-stream")
+    assert events[-1] == "[DONE]"
+    assert '"completion_tokens":10' in events[-2].replace(" ", "")
+
+
+def test_errors_are_injected_in_provider_format(monkeypatch):
+    server = StubProviderServer(overrides={"openai": StubBehavior(latency=0.0, rate_limit_ratio=1.0)}, seed=1)
+
+    def scenario(base_url):
+        openai_api = OpenAIAPI()
+        openai_api.openAIClient = openai_api.openAIClient.with_options(max_retries=0)
+        try:
+            return (
+                openai_api.question(OpenAIChatModel.GPT_4_1, "こんにちは", ""),
+                requests.post(f"{base_url}/_stub/behavior", json={"openai": {"rate_limit_ratio": 0.0}}).json(),
+                openai_api.question(OpenAIChatModel.GPT_4_1, "こんにちは", ""),
+            )
+        finally:
+            openai_api.close()
+
+    limited, behavior, recovered = run_against_stub(server, monkeypatch, scenario)
+
+    assert not limited.ok
+    assert behavior["overrides"]["openai"]["rate_limit_ratio"] == 0.0
+    assert recovered.ok
+    assert server.stats["openai.429"] == 1
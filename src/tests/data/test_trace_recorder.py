@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from src.data.configs import botConfig
+from src.data.entities.entity import Usage
+from src.data.entities.provider_result import ProviderResult, measure_total
+from src.data.single_flight import SingleFlight
+from src.data.trace_recorder import TraceRecorder, describe_text, load_traces
+from src.data.trace_replay import run_replay, synthesize_text
+
+
+@measure_total
+def fake_question(prompt: str) -> ProviderResult:
+    return ProviderResult.success(
+        "回答です", usage=Usage(prompt_tokens=12, completion_tokens=3), provider="openai", model="gpt-4o"
+    )
+
+
+def test_trace_does_not_keep_prompt_text(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    recorder = TraceRecorder()
+    recorder.open(path)
+
+    async def scenario():
+        with recorder.trace("openai_question", {"prompt": "秘密のパスワードは hunter2", "count": 3}):
+            await asyncio.to_thread(fake_question, "秘密のパスワードは hunter2")
+        await recorder.close()
+
+    asyncio.run(scenario())
+
+    with open(path, encoding="utf-8") as file:
+        content = file.read()
+    assert "hunter2" not in content
+    record = json.loads(content)
+    assert record["arguments"] == {"prompt": describe_text("秘密のパスワードは hunter2")}
+    assert record["outcome"] == "ok"
+
+
+def test_provider_calls_are_recorded(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    recorder = TraceRecorder()
+    recorder.open(path)
+    single_flight = SingleFlight()
+
+    async def scenario():
+        with recorder.trace("openai_question", {"prompt": "こんにちは"}):
+            await asyncio.gather(
+                single_flight.run("same", fake_question, "こんにちは"),
+                single_flight.run("same", fake_question, "こんにちは"),
+            )
+        await recorder.close()
+
+    asyncio.run(scenario())
+    (trace,) = load_traces(path)
+
+    assert [call.coalesced for call in trace.calls] == [False, True]
+    leader = trace.calls[0]
+    assert (leader.provider, leader.model, leader.prompt_tokens) == ("openai", "gpt-4o", 12)
+    assert leader.payload_bytes == len("回答です".encode("utf-8"))
+
+
+def test_sampled_out_interactions_are_not_recorded(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    recorder = TraceRecorder()
+    recorder.open(str(path), sample_rate=0.0)
+
+    async def scenario():
+        with recorder.trace("openai_question", {"prompt": "こんにちは"}) as trace:
+            assert trace is None
+        await recorder.close()
+
+    asyncio.run(scenario())
+
+    assert not path.exists()
+
+
+def test_synthesized_text_matches_features():
+    features = describe_text("Unity の ```csharp\nvoid Start() {}\n``` が動きません。どうすれば良いですか")
+
+    text = synthesize_text(features, salt=7)
+
+    assert len(text) == features["chars"]
+    assert describe_text(text)["has_code"]
+    assert abs(describe_text(text)["non_ascii_ratio"] - features["non_ascii_ratio"]) < 0.1
+
+
+def test_replay_reports_throughput(tmp_path, monkeypatch):
+    trace_path = str(tmp_path / "traces.jsonl")
+    with open(trace_path, "w", encoding="utf-8") as file:
+        for index in range(4):
+            file.write(json.dumps({
+                "command": "openai_question",
+                "started_at": 1000.0 + index,
+                "arguments": {"prompt": describe_text("Unity の質問です")},
+                "calls": [{
+                    "provider": "openai", "model": "gpt-4o", "ok": True, "error_code": None, "offset": 2.0,
+                    "latency": 2.0, "queued": 0.0, "prompt_tokens": 10, "completion_tokens": 20,
+                    "cached_tokens": 0, "images": 0, "payload_bytes": 300, "cache_hit": False, "coalesced": False,
+                }],
+            }) + "\n")
+        file.write(json.dumps({"command": "help", "started_at": 1005.0}) + "\n")
+    monkeypatch.setattr(botConfig, "conversation_store_path", str(tmp_path / "conversations.sqlite3"))
+    monkeypatch.setattr(botConfig, "usage_ledger_path", str(tmp_path / "usage.sqlite3"))
+    monkeypatch.setattr(botConfig, "image_lineage_path", None)
+    monkeypatch.setattr(botConfig, "trace_path", None)
+    monkeypatch.setattr(botConfig, "outbox_path", str(tmp_path / "outbox.sqlite3"))
+
+    report = asyncio.run(run_replay(load_traces(trace_path), speed=100.0))
+
+    summary = report.summary()
+    assert (summary["replayed"], summary["errors"], summary["skipped"]) == (4, 0, 1)
+    # 2 秒の応答が 100 倍速で 20ms 程度になる
+    assert 0.015 <= min(report.latencies) < 1.0
+    assert summary["commands"]["openai_question"]["count"] == 4
+    assert summary["sustainable"]
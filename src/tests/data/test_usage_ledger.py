@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sqlite3
+
+import pytest
+
+from src.data.configs import botConfig
+from src.data.entities.entity import Usage
+from src.data.entities.openai_chat_model import OpenAIChatModel
+from src.data.entities.openai_image_model import OpenAIImageModel
+from src.data.usage_ledger import UsageLedger, estimate_cost, usage_scope
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    usage_ledger = UsageLedger()
+    usage_ledger.open(os.path.join(tmp_path, "usage.sqlite3"))
+    yield usage_ledger
+    asyncio.run(usage_ledger.close())
+
+
+def test_estimate_cost():
+    # キャッシュされたトークンは割引価格で計算する
+    usage = Usage(prompt_tokens=1_000_000, completion_tokens=1_000_000, cached_tokens=500_000)
+    assert estimate_cost("gpt-4o-mini", usage) == pytest.approx(0.075 + 0.0375 + 0.60)
+    assert estimate_cost("dall-e-3", Usage(images=2)) == pytest.approx(0.08)
+    assert estimate_cost("unknown-model", usage) == 0.0
+
+
+def test_usage_is_aggregated_and_flushed_in_batches(ledger):
+    async def scenario():
+        with usage_scope(user_id=1, guild_id=10, command="openai_question"):
+            ledger.record("openai", OpenAIChatModel.GPT_4_O_MINI, Usage(prompt_tokens=100, completion_tokens=50))
+            ledger.record("openai", OpenAIChatModel.GPT_4_O_MINI, Usage(prompt_tokens=200, completion_tokens=50))
+            # ワーカースレッドにもユーザーとギルドが引き継がれる
+            await asyncio.to_thread(ledger.record, "openai", OpenAIImageModel.DALL_E_3, Usage(images=1))
+        before_flush = await ledger.totals_today(user_id=1)
+        await ledger.flush()
+        with usage_scope(user_id=2, guild_id=10, command="openai_question"):
+            ledger.record("openai", OpenAIChatModel.GPT_4_O_MINI, Usage(prompt_tokens=100, completion_tokens=50))
+        return before_flush, await ledger.totals_today(user_id=1), await ledger.totals_today(guild_id=10)
+
+    before_flush, user_totals, guild_totals = asyncio.run(scenario())
+
+    assert before_flush == user_totals
+    assert user_totals.calls == 3
+    assert user_totals.prompt_tokens == 300
+    assert user_totals.images == 1
+    # フラッシュ済みの値と未書き込みの値を合計する
+    assert guild_totals.calls == 4
+    assert guild_totals.prompt_tokens == 400
+
+    # 同じキーの使用量は 1 行にまとめて書き込まれる
+    rows = sqlite3.connect(ledger.path).execute("SELECT COUNT(*) FROM usage").fetchone()
+    assert rows == (2,)
+
+
+def test_quota(ledger, monkeypatch):
+    monkeypatch.setattr(botConfig, "user_daily_quota_usd", 0.01)
+    monkeypatch.setattr(botConfig, "guild_daily_quota_usd", 0.05)
+
+    async def scenario():
+        results = [await ledger.check_quota(1, 10)]
+        with usage_scope(user_id=1, guild_id=10, command="openai_generate_image"):
+            ledger.record("openai", OpenAIImageModel.DALL_E_3, Usage(images=1))
+        results.append(await ledger.check_quota(1, 10))
+        results.append(await ledger.check_quota(2, 10))
+        with usage_scope(user_id=2, guild_id=10, command="openai_generate_image"):
+            ledger.record("openai", OpenAIImageModel.DALL_E_3, Usage(images=1))
+        await ledger.flush()
+        results.append(await ledger.check_quota(3, 10))
+        results.append(await ledger.check_quota(3, None))
+        return results
+
+    no_usage, user_exceeded, other_user, guild_exceeded, direct_message = asyncio.run(scenario())
+
+    assert no_usage is None
+    assert user_exceeded is not None
+    assert other_user is None
+    assert guild_exceeded is not None and guild_exceeded != user_exceeded
+    assert direct_message is None
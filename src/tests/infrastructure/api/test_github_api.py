@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 import json
 import requests
 
+from src.data.entities.provider_result import ProviderResult
 from src.domain.models.constants import Constants
 from src.infrastructure.api.github_api import GithubAPI
 
@@ -31,9 +32,10 @@ def test_create_issue_success(mock_requests):
         message="This is a test issue"
     )
     
-    # 結果を検証
-    assert "response" in result
-    assert result["response"] == "https://github.com/test/repo/issues/1"
+    # 結果を検証 (src/data と同じ ProviderResult を返す)
+    assert isinstance(result, ProviderResult)
+    assert result.ok
+    assert result.payload == "https://github.com/test/repo/issues/1"
     
     # 正しい引数でAPIが呼び出されたかチェック
     mock_requests.post.assert_called_once()
@@ -60,9 +62,9 @@ def test_create_issue_api_error(mock_requests):
         message="This is a test issue"
     )
     
-    assert "error" in result
-    assert result["error"]["code"] == 401
-    assert "GitHub API error" in result["error"]["message"]
+    assert not result.ok
+    assert result.error.code == 401
+    assert "GitHub API error" in result.error.message
 
 
 def test_create_issue_exception(mock_requests):
@@ -76,6 +78,6 @@ def test_create_issue_exception(mock_requests):
         message="This is a test issue"
     )
     
-    assert "error" in result
-    assert result["error"]["code"] == 1
-    assert "Unknown Error" in result["error"]["message"]
+    assert not result.ok
+    assert result.error.code == 1
+    assert "Unknown Error" in result.error.message
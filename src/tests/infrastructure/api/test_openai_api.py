@@ -23,9 +23,9 @@ def test_handle_bad_request_error_content_policy_violation():
     
     result = handle_bad_request_error(error)
     
-    assert "error" in result
-    assert result["error"]["code"] == "content_policy_violation"
-    assert "コンテンツポリシー違反" in result["error"]["message"]
+    assert not result.ok
+    assert result.error.code == "content_policy_violation"
+    assert "コンテンツポリシー違反" in result.error.message
 
 
 def test_handle_bad_request_error_other():
@@ -36,9 +36,9 @@ def test_handle_bad_request_error_other():
     
     result = handle_bad_request_error(error)
     
-    assert "error" in result
-    assert result["error"]["code"] == "other_error"
-    assert "Error Code:" in result["error"]["message"]
+    assert not result.ok
+    assert result.error.code == "other_error"
+    assert "Error Code:" in result.error.message
 
 
 def test_question_success(mock_openai_client):
@@ -64,8 +64,8 @@ def test_question_success(mock_openai_client):
     )
     
     # 結果を検証
-    assert "response" in result
-    assert result["response"] == "This is a test response"
+    assert result.ok
+    assert result.payload == "This is a test response"
     
     # 正しい変数でAPIが呼び出されたかチェック
     mock_completions.create.assert_called_once()
@@ -98,8 +98,8 @@ def test_question_api_error(mock_openai_client):
         system_setting="You are a helpful assistant."
     )
     
-    assert "error" in result
-    assert result["error"]["code"] == "bad_request"
+    assert not result.ok
+    assert result.error.code == "bad_request"
 
 
 def test_conversation_success(mock_openai_client):
@@ -128,8 +128,8 @@ def test_conversation_success(mock_openai_client):
     )
     
     # 結果を検証
-    assert "response" in result
-    assert result["response"] == "Conversation response"
+    assert result.ok
+    assert result.payload == "Conversation response"
     
     # 正しい変数でAPIが呼び出されたかチェック
     mock_completions.create.assert_called_once()
@@ -159,9 +159,9 @@ def test_generate_image_success(mock_openai_client):
     )
     
     # 結果を検証
-    assert "response" in result
-    assert result["response"]["url"] == "https://example.com/image.png"
-    assert result["response"]["prompt"] == "Revised prompt"
+    assert result.ok
+    assert result.payload["url"] == "https://example.com/image.png"
+    assert result.payload["prompt"] == "Revised prompt"
     
     # 正しい変数でAPIが呼び出されたかチェック
     mock_images.generate.assert_called_once_with(
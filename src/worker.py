@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from data.configs import botConfig
+
+# ワーカープール
+#
+# TEL_GPT_WORKER_MODE=1 のゲートウェイ (app.py) がジョブキューに登録したコマンドを、
+# TEL_GPT_WORKER_COUNT 個のワーカープロセスで実行する。
+# ゲートウェイとは別に起動するため、ワーカー数はゲートウェイと独立して増減できる。
+
+# ワーカープロセスが異常終了した場合に再起動するまでの待ち時間 (秒)
+RESTART_DELAY = 5.0
+
+
+def run_worker_process(name: str):
+    """
+    ワーカーを起動する (子プロセスで実行)
+    """
+    from data.job_worker import run_worker
+    asyncio.run(run_worker(name))
+
+
+def start_process(context, name: str):
+    process = context.Process(target=run_worker_process, args=(name,), name=name)
+    process.start()
+    print(f"Started {name} (pid: {process.pid})")
+    return process
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    names = [f"telgpt-worker-{index}" for index in range(botConfig.worker_count)]
+    processes = {name: start_process(context, name) for name in names}
+
+    is_stopping = False
+
+    def stop(sig, frame):
+        nonlocal is_stopping
+        print(f"Signal {sig} received, stopping workers...")
+        is_stopping = True
+        # 各ワーカーは実行中のジョブを終えてから停止する
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    def reload(sig, frame):
+        # 設定の再読み込みは各子プロセスが行う
+        print(f"Signal {sig} received, reloading config of workers...")
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    # 異常終了したワーカーは再起動する. 実行中だったジョブはリース切れ後に他のワーカーが再実行する
+    while not is_stopping:
+        time.sleep(1)
+        for name, process in list(processes.items()):
+            if not process.is_alive() and not is_stopping:
+                print(f"{name} exited with code {process.exitcode}, restarting...")
+                time.sleep(RESTART_DELAY)
+                processes[name] = start_process(context, name)
+
+    for process in processes.values():
+        process.join()
+
+
+# メインエントリーポイント
+if __name__ == "__main__":
+    main()